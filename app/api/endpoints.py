@@ -1,110 +1,311 @@
 import os
 import shutil
+import time
 import uuid
-from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks
-from fastapi.responses import FileResponse
+from typing import List, Optional
+from urllib.parse import quote
+from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 
 from app.core.config import settings
-from app.core.template_loader import template_loader
-from app.core.merger import MergerEngine
-from app.engine.rag_engine import rag_engine
+from app.core.executor import run_blocking
+from app.core.http_client import http_pool
+from app.core.preset_registry import preset_registry
+from app.core.tracing import span, trace_request
 from app.engine.llm_engine import llm_engine
-from app.engine.renderer import renderer
-from app.models.schema import DocumentDSL
+from app.engine.rag_engine import rag_engine
+from app.engine.source_loader import InvalidDocxError, check_docx
+from app.engine.style_fastpath import style_fastpath
+from app.models.schema import JobRecord, JobStatus
+from app.services.batch import SUPPORTED_SOURCE_EXTS, BatchSource, extract_zip_sources, source_ext_of, stream_batch
+from app.services.job_runner import job_runner
+from app.services.pipeline import resolve_style, run_pipeline, run_restyle
+from app.services.storage import job_store
 
 router = APIRouter()
 
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+STREAM_CHUNK_SIZE = 64 * 1024
+
 def cleanup_temp_file(path: str):
     """后台任务：清理临时文件"""
     if os.path.exists(path):
         os.remove(path)
 
+def _save_upload(upload: UploadFile, path: str):
+    """将上传文件落盘 (阻塞，需放入线程池执行)"""
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+
+def _iter_buffer(buffer):
+    """分块读出渲染缓冲区，读完即关闭"""
+    try:
+        while chunk := buffer.read(STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        buffer.close()
+
+def _attachment_headers(filename: str, size: Optional[int] = None) -> dict:
+    """下载响应头；非 ASCII 文件名按 RFC 5987 编码。size 未知 (边生成边推送) 时不带 Content-Length"""
+    quoted = quote(filename)
+    if quoted != filename:
+        disposition = f"attachment; filename*=utf-8''{quoted}"
+    else:
+        disposition = f'attachment; filename="{filename}"'
+    headers = {"Content-Disposition": disposition}
+    if size is not None:
+        headers["Content-Length"] = str(size)
+    return headers
+
+async def _save_inputs(task_id: str, source_file: UploadFile, rule_file: UploadFile = None):
+    """
+    Step 1: File Handling。
+    保存源文件与规则文件 (如果有)，返回 (source_path, source_ext, rule_path)
+    """
+    source_ext = source_file.filename.split('.')[-1]
+    source_path = os.path.join(settings.UPLOAD_DIR, f"{task_id}_source.{source_ext}")
+    await run_blocking(_save_upload, source_file, source_path)
+
+    rule_path = None
+    if rule_file:
+        rule_path = os.path.join(settings.UPLOAD_DIR, f"{task_id}_rule.pdf")
+        await run_blocking(_save_upload, rule_file, rule_path)
+    return source_path, source_ext, rule_path
+
+async def _save_batch_sources(batch_id: str, source_files: List[UploadFile]) -> List[BatchSource]:
+    """批量草稿落盘；.zip 上传会被解包，只保留支持的草稿类型"""
+    sources: List[BatchSource] = []
+    for upload in source_files:
+        ext = source_ext_of(upload.filename or "")
+        if ext == "zip":
+            zip_path = os.path.join(settings.UPLOAD_DIR, f"{batch_id}_{len(sources)}_upload.zip")
+            await run_blocking(_save_upload, upload, zip_path)
+            try:
+                sources.extend(await run_blocking(extract_zip_sources, zip_path, batch_id, len(sources)))
+            finally:
+                await run_blocking(cleanup_temp_file, zip_path)
+        elif ext in SUPPORTED_SOURCE_EXTS:
+            path = os.path.join(settings.UPLOAD_DIR, f"{batch_id}_{len(sources)}_source.{ext}")
+            await run_blocking(_save_upload, upload, path)
+            sources.append(BatchSource(name=upload.filename, path=path, ext=ext))
+    return sources
+
+@router.get("/presets", summary="已加载的学校预设列表")
+async def list_presets():
+    return {"presets": preset_registry.list_presets()}
+
+@router.get("/stats", summary="快速通道与缓存命中统计")
+async def get_stats():
+    # 统计接口不触发引擎初始化：尚未使用过的引擎返回 None
+    llm_ready = llm_engine.is_initialized
+    rag_ready = rag_engine.is_initialized
+    return {
+        "style_fastpath": style_fastpath.stats(),
+        "layout_cache": llm_engine.layout_cache.stats() if llm_ready and llm_engine.layout_cache else None,
+        "embedding_cache": rag_engine.embedding_function.stats() if rag_ready else None,
+        "retrieval_cache": rag_engine.retrieval_stats() if rag_ready else None,
+        "http": http_pool.stats(),
+    }
+
 @router.post("/generate", summary="核心生成接口")
 async def generate_paper(
     background_tasks: BackgroundTasks,
     source_file: UploadFile = File(..., description="论文草稿 (.md/.txt/.docx)"),
     rule_file: UploadFile = File(None, description="学校排版规范PDF (可选)"),
     school_id: str = Form(..., description="学校标识 (如 shenyang_chem)"),
-    user_prompt: str = Form("", description="用户自然语言指令 (User Override)")
+    user_prompt: str = Form("", description="用户自然语言指令 (User Override)"),
+    bypass_cache: bool = Form(False, description="跳过 C-Model 响应缓存，强制重新解析")
 ):
     task_id = str(uuid.uuid4())
-    
-    # --- Step 1: File Handling ---
-    # 保存源文件
-    source_ext = source_file.filename.split('.')[-1]
-    source_path = os.path.join(settings.UPLOAD_DIR, f"{task_id}_source.{source_ext}")
-    with open(source_path, "wb") as buffer:
-        shutil.copyfileobj(source_file.file, buffer)
-        
-    # 保存规则文件 (如果有)
-    has_custom_rules = False
-    if rule_file:
-        rule_path = os.path.join(settings.UPLOAD_DIR, f"{task_id}_rule.pdf")
-        with open(rule_path, "wb") as buffer:
-            shutil.copyfileobj(rule_file.file, buffer)
-        
-        # Ingest to RAG (Level 2 Source)
-        template_loader.ingest_user_rule_file(rule_path, school_id)
-        has_custom_rules = True
-        background_tasks.add_task(cleanup_temp_file, rule_path)
-
-    # --- Step 2: Knowledge Retrieval (The Hybrid Loader) ---
-    # L3: Static JSON
-    json_preset = template_loader.get_preset_rules(school_id)
-    
-    # L2: RAG Context
-    rag_context = ""
-    if has_custom_rules or json_preset is None:
-        # 如果有上传新规，或者没找到静态预设，就去查向量库
-        # 构造一个通用的 query 来把所有格式要点查出来
-        rag_context = rag_engine.search_rules("字体 字号 行距 标题格式 页边距", school_id)
-
-    # --- Step 3: LLM Orchestration ---
-    # 3.1 C-Model: 解析样式
-    # 如果有 RAG 上下文或用户指令，才需要调用解析模型
-    rag_extracted_config = {}
-    if rag_context or user_prompt:
-        rag_extracted_config = llm_engine.parse_layout_config(rag_context, user_prompt)
-    
-    # 3.2 B-Model: 润色内容 (简化版：直接读文本)
-    # TODO: 生产环境需要根据文件类型(docx/md)做精细化 Loader
-    with open(source_path, 'r', encoding='utf-8', errors='ignore') as f:
-        raw_text = f.read()
-    
-    # 这里的 user_prompt 实际上包含了样式指令，我们暂不把它传给 Polisher，只传给 Parser
-    # Polisher 只负责让话变得好听
-    content_blocks = llm_engine.polish_content(raw_text)
-
-    # --- Step 4: The Merger (Logic Core) ---
-    # 执行四级合并：UserPrompt (in parser result) > RAG > JSON > Default
-    # 注意：LLM Parser 其实已经把 user_prompt 和 rag_context 融合在 rag_extracted_config 里了
-    # 但为了架构严谨，我们通常把 LLM 解析出的结果视为 Level 2 + Level 1 的混合体
-    
-    final_style_config = MergerEngine.merge(
-        user_prompt_dict=None, # 用户指令已经被 LLM 消化在 rag_extracted_config 里了
-        rag_extracted_dict=rag_extracted_config,
-        json_preset_dict=json_preset
-    )
+    # 各阶段耗时记入 Trace：以 Server-Timing 响应头返回，并按 task_id 输出一行 JSON 日志
+    with trace_request(task_id, "generate") as trace:
+        with span("upload_saved"):
+            source_path, source_ext, rule_path = await _save_inputs(task_id, source_file, rule_file)
+
+        temp_paths = [path for path in (source_path, rule_path) if path]
+
+        try:
+            # Step 2-6: 检索 -> C-Model / B-Model -> 合并 -> 内存渲染 (不落盘)
+            buffer, size = await run_pipeline(
+                task_id=task_id,
+                source_path=source_path,
+                source_ext=source_ext,
+                school_id=school_id,
+                user_prompt=user_prompt,
+                rule_path=rule_path,
+                bypass_cache=bypass_cache
+            )
+        except InvalidDocxError as e:
+            for path in temp_paths:
+                await run_blocking(cleanup_temp_file, path)
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception:
+            # 出错时不会执行 BackgroundTasks，直接清理
+            for path in temp_paths:
+                await run_blocking(cleanup_temp_file, path)
+            raise
 
-    # --- Step 5: Construct DSL ---
-    dsl = DocumentDSL(
-        meta={"task_id": task_id, "school_id": school_id},
-        style_config=final_style_config,
-        content_blocks=content_blocks
+        # Cleanup source & rule
+        for path in temp_paths:
+            background_tasks.add_task(cleanup_temp_file, path)
+
+        headers = _attachment_headers(f"Paper_{school_id}.docx", size)
+        if trace is not None:
+            headers["Server-Timing"] = trace.server_timing()
+            headers["X-Task-Id"] = task_id
+        return StreamingResponse(
+            _iter_buffer(buffer),
+            media_type=DOCX_MEDIA_TYPE,
+            headers=headers
+        )
+
+@router.post("/restyle", summary="已完成论文原地重排 (.docx，不改动内容)")
+async def restyle_paper(
+    background_tasks: BackgroundTasks,
+    source_file: UploadFile = File(..., description="已写好的论文 (.docx)"),
+    rule_file: UploadFile = File(None, description="学校排版规范PDF (可选)"),
+    school_id: str = Form(..., description="学校标识 (如 shenyang_chem)"),
+    user_prompt: str = Form("", description="用户自然语言指令 (User Override)"),
+    bypass_cache: bool = Form(False, description="跳过 C-Model 响应缓存，强制重新解析")
+):
+    if source_ext_of(source_file.filename or "") != "docx":
+        raise HTTPException(status_code=400, detail="Restyle only accepts .docx papers")
+
+    task_id = str(uuid.uuid4())
+    with trace_request(task_id, "restyle") as trace:
+        with span("upload_saved"):
+            source_path, _, rule_path = await _save_inputs(task_id, source_file, rule_file)
+
+        temp_paths = [path for path in (source_path, rule_path) if path]
+
+        try:
+            buffer, size = await run_restyle(
+                source_path=source_path,
+                school_id=school_id,
+                user_prompt=user_prompt,
+                rule_path=rule_path,
+                bypass_cache=bypass_cache
+            )
+        except InvalidDocxError as e:
+            for path in temp_paths:
+                await run_blocking(cleanup_temp_file, path)
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception:
+            for path in temp_paths:
+                await run_blocking(cleanup_temp_file, path)
+            raise
+
+        for path in temp_paths:
+            background_tasks.add_task(cleanup_temp_file, path)
+
+        headers = _attachment_headers(f"Restyled_{school_id}.docx", size)
+        if trace is not None:
+            headers["Server-Timing"] = trace.server_timing()
+            headers["X-Task-Id"] = task_id
+        return StreamingResponse(
+            _iter_buffer(buffer),
+            media_type=DOCX_MEDIA_TYPE,
+            headers=headers
+        )
+
+@router.post("/batch", summary="批量生成 (共用一次样式解析)")
+async def generate_batch(
+    source_files: List[UploadFile] = File(..., description="多份论文草稿 (.md/.txt/.docx) 或包含草稿的 .zip"),
+    rule_file: UploadFile = File(None, description="学校排版规范PDF (可选)"),
+    school_id: str = Form(..., description="学校标识 (如 shenyang_chem)"),
+    user_prompt: str = Form("", description="用户自然语言指令 (对整批生效)"),
+    bypass_cache: bool = Form(False, description="跳过 C-Model 响应缓存，强制重新解析")
+):
+    batch_id = str(uuid.uuid4())
+    rule_path = None
+    sources: List[BatchSource] = []
+    try:
+        sources = await _save_batch_sources(batch_id, source_files)
+        if not sources:
+            raise HTTPException(status_code=400, detail=f"No supported drafts ({', '.join(SUPPORTED_SOURCE_EXTS)}) in upload")
+        if len(sources) > settings.BATCH_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"Too many drafts: {len(sources)} > {settings.BATCH_MAX_FILES}")
+        # 结果以流式 ZIP 返回，开始推送后无法再返回 400：损坏的 .docx 草稿在此提前拒绝
+        for source in sources:
+            if source.ext == "docx":
+                try:
+                    await run_blocking(check_docx, source.path)
+                except InvalidDocxError as e:
+                    raise HTTPException(status_code=400, detail=f"{source.name}: {e}")
+
+        if rule_file:
+            rule_path = os.path.join(settings.UPLOAD_DIR, f"{batch_id}_rule.pdf")
+            await run_blocking(_save_upload, rule_file, rule_path)
+
+        # 整批只做一次 预设加载 -> 检索 -> C-Model -> 合并
+        style_config = await resolve_style(school_id, user_prompt, rule_path, bypass_cache)
+    except Exception:
+        for source in sources:
+            await run_blocking(cleanup_temp_file, source.path)
+        raise
+    finally:
+        if rule_path:
+            await run_blocking(cleanup_temp_file, rule_path)
+
+    # ZIP 边生成边推送；草稿文件在流结束后由 stream_batch 清理
+    return StreamingResponse(
+        stream_batch(batch_id, sources, school_id, style_config),
+        media_type="application/zip",
+        headers=_attachment_headers(f"Papers_{school_id}.zip")
     )
 
-    # --- Step 6: Rendering ---
-    output_filename = f"{task_id}_output.docx"
-    output_path = os.path.join(settings.UPLOAD_DIR, output_filename)
-    
-    renderer.render(dsl, output_path)
+@router.post("/jobs", status_code=202, summary="提交异步排版任务")
+async def create_job(
+    source_file: UploadFile = File(..., description="论文草稿 (.md/.txt/.docx)"),
+    rule_file: UploadFile = File(None, description="学校排版规范PDF (可选)"),
+    school_id: str = Form(..., description="学校标识 (如 shenyang_chem)"),
+    user_prompt: str = Form("", description="用户自然语言指令 (User Override)"),
+    bypass_cache: bool = Form(False, description="跳过 C-Model 响应缓存，强制重新解析")
+):
+    job_id = str(uuid.uuid4())
+    source_path, source_ext, rule_path = await _save_inputs(job_id, source_file, rule_file)
+
+    now = time.time()
+    job = await job_runner.submit(JobRecord(
+        id=job_id,
+        school_id=school_id,
+        user_prompt=user_prompt,
+        bypass_cache=bypass_cache,
+        source_path=source_path,
+        source_ext=source_ext,
+        rule_path=rule_path,
+        created_at=now,
+        updated_at=now
+    ))
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/jobs/{job_id}", summary="查询任务状态与阶段")
+async def get_job(job_id: str):
+    job = await run_blocking(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "stage": job.stage,
+        "school_id": job.school_id,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+@router.get("/jobs/{job_id}/result", summary="下载任务结果")
+async def get_job_result(job_id: str):
+    job = await run_blocking(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == JobStatus.FAILED:
+        raise HTTPException(status_code=409, detail=f"Job failed: {job.error}")
+    if job.status != JobStatus.SUCCEEDED or not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=409, detail=f"Job is not finished (status: {job.status.value})")
 
-    # Cleanup source
-    background_tasks.add_task(cleanup_temp_file, source_path)
-    # Cleanup output eventually (not immediately, wait for download)
-    
     return FileResponse(
-        output_path, 
-        filename=f"Paper_{school_id}.docx", 
-        media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-    ) 
+        job.result_path,
+        filename=f"Paper_{job.school_id}.docx",
+        media_type=DOCX_MEDIA_TYPE
+    )
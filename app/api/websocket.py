@@ -1 +1,70 @@
- 
+import asyncio
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from app.core.config import settings
+from app.core.executor import run_blocking
+from app.models.schema import JobStatus
+from app.services.progress import TERMINAL_STAGES, progress_hub
+from app.services.storage import job_store
+
+router = APIRouter()
+
+# 自定义关闭码 (4000-4999 为应用保留区间)
+WS_CLOSE_JOB_NOT_FOUND = 4404
+
+
+def _final_event(job) -> dict:
+    return {
+        "job_id": job.id,
+        "stage": "done" if job.status == JobStatus.SUCCEEDED else "failed",
+        "error": job.error
+    }
+
+
+@router.websocket("/ws/jobs/{job_id}")
+async def job_progress(websocket: WebSocket, job_id: str):
+    """
+    任务阶段进度推送。
+    连接后先回放已发生的事件，再实时推送后续事件 (upload_saved / rag_retrieved / style_parsed /
+    chunk_polished / content_polished / rendered ...)，收到 done 或 failed 后服务端主动关闭。
+    任务由其他实例执行时本进程收不到事件：每隔 JOB_WS_POLL_SECONDS 从任务表读取阶段，结束后同样关闭。
+    """
+    await websocket.accept()
+
+    job = await run_blocking(job_store.get, job_id)
+    if job is None:
+        await websocket.close(code=WS_CLOSE_JOB_NOT_FOUND, reason="Job not found")
+        return
+
+    queue = progress_hub.subscribe(job_id)
+    try:
+        if queue.empty() and job.status in (JobStatus.SUCCEEDED, JobStatus.FAILED):
+            # 历史已被淘汰 (或进程重启过) 的已结束任务：只回报最终状态
+            await websocket.send_json(_final_event(job))
+        else:
+            last_stage = None
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.JOB_WS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    job = await run_blocking(job_store.get, job_id)
+                    if job is None:
+                        # 等待期间任务已被清理
+                        await websocket.close(code=WS_CLOSE_JOB_NOT_FOUND, reason="Job not found")
+                        return
+                    if job.status in (JobStatus.SUCCEEDED, JobStatus.FAILED):
+                        event = _final_event(job)
+                    elif job.stage != last_stage:
+                        event = {"job_id": job.id, "stage": job.stage}
+                    else:
+                        continue
+                last_stage = event["stage"]
+                await websocket.send_json(event)
+                if event["stage"] in TERMINAL_STAGES:
+                    break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        progress_hub.unsubscribe(job_id, queue)
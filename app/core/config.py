@@ -6,8 +6,8 @@ class Settings(BaseSettings):
     # --- Basic API Configuration (Zhipu via OpenAI SDK) ---
     # 智谱 GLM-4 的兼容 API 地址
     OPENAI_BASE_URL: str = "https://open.bigmodel.cn/api/paas/v4/"
-    # 这里填写智谱的 API Key
-    ZHIPUAI_API_KEY: str
+    # 这里填写智谱的 API Key (导入应用时不强制，首次调用模型时校验)
+    ZHIPUAI_API_KEY: str = ""
 
     # --- Model Constants ---
     # B-Model: 负责高质量润色 (学术能力强)
@@ -22,10 +22,138 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "./data/uploads"
     RULES_DIR: str = "./data/rules"
     TEMPLATE_SOURCE_DIR: str = "./data/templates_source"
+    CACHE_DIR: str = "./data/cache"
+    RESULT_DIR: str = "./data/results"
+    JOB_DB_PATH: str = "./data/jobs.sqlite3"
+    INGEST_DB_PATH: str = "./data/ingest.sqlite3"
+
+    # --- HTTP Client ---
+    # 模型与 Embedding 调用共享的连接池：连接数上限、keep-alive 连接数与空闲过期时间 (秒)
+    HTTP_MAX_CONNECTIONS: int = 64
+    HTTP_MAX_KEEPALIVE: int = 32
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP_TIMEOUT_SECONDS: float = 120.0
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    # 429 / 5xx / 连接错误的重试：指数退避 + 抖动，优先遵循 Retry-After
+    HTTP_MAX_RETRIES: int = 3
+    HTTP_BACKOFF_BASE_SECONDS: float = 0.5
+    HTTP_BACKOFF_MAX_SECONDS: float = 20.0
+    # 请求对冲：超过该时长仍无响应时并行补发一次，取先返回者 (0 = 关闭，会增加调用量)
+    HTTP_HEDGE_DELAY_MS: int = 0
+
+    # --- Metrics ---
+    # 模型调用耗时 / token / 重试 / 降级 / 缓存命中指标，GET /metrics 以 Prometheus 格式导出
+    METRICS_ENABLED: bool = True
+    # school 标签的不同取值上限，超出部分记为 other
+    METRICS_MAX_SCHOOLS: int = 200
+
+    # --- Tracing ---
+    # 阶段耗时 Trace：Server-Timing 响应头 + 每个请求 / 任务一行 JSON 日志 (logger: apf.trace)
+    TRACING_ENABLED: bool = True
+    # 抽样剖析 (默认关闭)：按比例对请求启用 cProfile，总耗时超过阈值时把 .prof 写入 TRACE_PROFILE_DIR
+    TRACE_PROFILE_SAMPLE_RATE: float = 0.0
+    TRACE_PROFILE_THRESHOLD_MS: float = 5000.0
+    TRACE_PROFILE_DIR: str = "./data/profiles"
+
+    # --- Startup ---
+    # True: 启动时预先初始化 LLM / RAG 引擎 (首个请求无冷启动)；False: 首次使用时再初始化
+    PREWARM_ENGINES: bool = False
+
+    # --- Concurrency ---
+    # 单个 worker 内同时在途的模型请求上限 (C-Model / B-Model / Embedding 共享)
+    LLM_MAX_CONCURRENCY: int = 32
+    # 阻塞型步骤 (PDF 解析、docx 渲染、文件读写) 使用的有界线程池大小
+    CPU_WORKERS: int = 4
+
+    # --- B-Model Chunking ---
+    # 长文分窗润色：每个窗口的 token 预算、同一篇文档的并发扇出、单窗口失败重试次数
+    POLISH_CHUNKED: bool = True
+    POLISH_CHUNK_TOKENS: int = 2000
+    POLISH_CHUNK_CONCURRENCY: int = 4
+    POLISH_CHUNK_RETRIES: int = 1
+    # 流水线模式：B-Model 边生成边解析，渲染器按批消费已闭合的块
+    POLISH_STREAMING: bool = False
+    RENDER_STREAM_BATCH: int = 16
+
+    # --- Embeddings ---
+    # 后端：zhipu (智谱 embedding-3) / local (本地确定性哈希向量，离线基准测试用)
+    EMBED_BACKEND: str = "zhipu"
+    LOCAL_EMBED_DIM: int = 256
+    # 每次请求的文本条数 (智谱单次上限 64)；同时在途的批次数
+    EMBED_BATCH_SIZE: int = 64
+    EMBED_CONCURRENCY: int = 4
+    # 持久化 Embedding 缓存，Key = (模型名, 文本哈希)
+    EMBED_CACHE_ENABLED: bool = True
+    EMBED_CACHE_MAX_ENTRIES: int = 200000
+
+    # --- Retrieval Cache ---
+    # 检索结果 LRU 条目上限 (Key = school_id, query, k, 入库清单时间, 集合版本)，0 表示关闭
+    RETRIEVAL_CACHE_SIZE: int = 1024
+
+    # --- Rule Ingestion ---
+    # PDF 分页提取的进程数；每个子任务负责的页数 (页数不超过该值时不启用进程池)
+    PDF_EXTRACT_WORKERS: int = 4
+    PDF_PAGES_PER_TASK: int = 16
+    # 规则切片的目标字符数与相邻切片重叠字符数
+    RULE_CHUNK_CHARS: int = 800
+    RULE_CHUNK_OVERLAP: int = 120
+    # True: 向量化入库放到后台，本次请求直接用内存切片做词法检索
+    RULE_INGEST_BACKGROUND: bool = True
+
+    # --- Structural Segmenter ---
+    # .md/.txt 草稿先做本地结构识别，仅置信度低于阈值的片段交给 B-Model
+    SEGMENTER_ENABLED: bool = True
+    SEGMENTER_MIN_CONFIDENCE: float = 0.8
+
+    # --- C-Model Response Cache ---
+    # 相同 (RAG 上下文, 用户指令, 字体配置) 的解析结果直接复用，不再请求模型
+    LAYOUT_CACHE_ENABLED: bool = True
+    LAYOUT_CACHE_MAX_ENTRIES: int = 5000
+    LAYOUT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # --- Style Compiler ---
+    # 四级合并结果缓存条目数；块级覆盖样式的驻留缓存条目数
+    STYLE_CACHE_SIZE: int = 256
+    STYLE_OVERRIDE_CACHE_SIZE: int = 1024
+
+    # --- Preset Registry ---
+    # data/rules 热加载的 mtime 轮询间隔 (秒)，<= 0 表示关闭热加载
+    PRESET_RELOAD_INTERVAL: float = 2.0
+    # 无手写预设的学校：把排版手册的 C-Model 抽取结果编译成 data/rules/_compiled/{school_id}.json，
+    # 之后作为 Level 3 复用，手册变更时自动作废
+    PROFILE_COMPILE_ENABLED: bool = True
+
+    # --- Renderer ---
+    # True: 样式表模式 (命名段落样式 + 仅对块级覆盖写直接格式)；False: 逐 Run 直接格式
+    RENDER_NAMED_STYLES: bool = True
+    # 内存渲染缓冲区上限 (字节)，超过后溢出到系统临时文件
+    RENDER_SPOOL_MAX_BYTES: int = 16 * 1024 * 1024
+
+    # --- Async Jobs ---
+    # 本地任务 worker 数；已完成任务 (及其结果文件) 的保留时长 (秒)
+    JOB_WORKERS: int = 4
+    JOB_RETENTION_SECONDS: int = 24 * 3600
+    # 任务租约时长 (秒)：runner 每 1/3 租约续期一次；实例崩溃后其任务最多等一个租约即被其他实例接管
+    JOB_LEASE_SECONDS: int = 60
+    # 过期任务清理间隔 (秒)
+    JOB_PURGE_INTERVAL_SECONDS: int = 600
+    # 进度 WebSocket 无事件时轮询任务表的间隔 (秒)：任务在其他实例执行时只能从库里看到阶段与最终状态
+    JOB_WS_POLL_SECONDS: float = 2.0
+
+    # --- Batch ---
+    # 单次批量请求最多接受的草稿数；同时润色/渲染的草稿数
+    BATCH_MAX_FILES: int = 200
+    BATCH_CONCURRENCY: int = 4
 
     # --- Security ---
     BACKEND_CORS_ORIGINS: List[str] = ["*"]
 
+    def require_api_key(self) -> str:
+        """需要调用智谱接口时再校验 Key，未配置时给出明确错误"""
+        if not self.ZHIPUAI_API_KEY:
+            raise RuntimeError("ZHIPUAI_API_KEY is not configured (set it in .env or the environment)")
+        return self.ZHIPUAI_API_KEY
+
     # Load from .env file
     model_config = SettingsConfigDict(
         env_file=".env", 
@@ -41,4 +169,6 @@ settings = Settings()
 os.makedirs(settings.CHROMA_PERSIST_DIRECTORY, exist_ok=True)
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 os.makedirs(settings.RULES_DIR, exist_ok=True)
-os.makedirs(settings.TEMPLATE_SOURCE_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(settings.TEMPLATE_SOURCE_DIR, exist_ok=True)
+os.makedirs(settings.CACHE_DIR, exist_ok=True)
+os.makedirs(settings.RESULT_DIR, exist_ok=True)
\ No newline at end of file
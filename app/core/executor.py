@@ -0,0 +1,86 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, Set, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# 有界线程池：承载 PyPDF2 / python-docx / 文件读写等阻塞步骤，避免卡住事件循环
+cpu_executor = ThreadPoolExecutor(
+    max_workers=settings.CPU_WORKERS,
+    thread_name_prefix="apf-cpu"
+)
+
+# 模型调用并发闸门：限制单个 worker 同时发往智谱的请求数。
+# Semaphore 首次使用即绑定事件循环，按运行中的循环分别创建 (测试 / 多次 lifespan / 多线程各自的循环互不影响)
+_llm_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_llm_limiters_lock = threading.Lock()
+
+
+def get_llm_limiter() -> asyncio.Semaphore:
+    """当前事件循环的模型调用闸门 (必须在协程内调用)"""
+    loop = asyncio.get_running_loop()
+    with _llm_limiters_lock:
+        limiter = _llm_limiters.get(loop)
+        if limiter is None:
+            limiter = _llm_limiters[loop] = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        return limiter
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在有界线程池中执行阻塞函数，并在事件循环中等待结果 (携带当前 contextvars，如指标的学校标签)"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(cpu_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+# 进程池：承载可并行的纯 CPU 步骤 (PDF 分页提取)；首次使用时才创建，spawn 方式避免 fork 带走线程锁
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+
+# 后台任务：持有引用防止被 GC 回收，异常只记日志
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _on_background_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+
+def spawn_background(coro: Awaitable[Any], name: str) -> asyncio.Task:
+    """启动不阻塞当前请求的后台协程 (如规则向量入库)"""
+    task = asyncio.ensure_future(coro)
+    task.set_name(name)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_done)
+    return task
@@ -0,0 +1,257 @@
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 可重试的状态码：限流与网关/服务端临时故障
+RETRY_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+# 可重试的传输层异常：连接失败、读超时、连接被对端提前关闭
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout, httpx.RemoteProtocolError)
+
+
+def _is_replayable(request: httpx.Request) -> bool:
+    """只有请求体已完整缓存在内存中 (OpenAI SDK 的 JSON 请求) 才能安全重发"""
+    return isinstance(request.stream, httpx.ByteStream)
+
+
+class RetryPolicy:
+    """指数退避 + 抖动；服务端给出 Retry-After 时以其为准 (不超过 max_delay)"""
+
+    def __init__(self, max_retries: int, base_delay: float, max_delay: float):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    @staticmethod
+    def retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+        """解析 Retry-After：秒数或 HTTP 日期"""
+        value = response.headers.get("Retry-After") if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                parsed = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            return max(0.0, parsed.timestamp() - time.time())
+
+    def delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        backoff = min(self.base_delay * (2 ** attempt), self.max_delay)
+        return backoff * random.uniform(0.5, 1.0)
+
+
+class RetryTransport(httpx.BaseTransport):
+    """同步传输层：对可重试的状态码 / 传输异常按 RetryPolicy 自动重试"""
+
+    def __init__(self, transport: httpx.BaseTransport, policy: RetryPolicy):
+        self._transport = transport
+        self.policy = policy
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        max_retries = self.policy.max_retries if _is_replayable(request) else 0
+        attempt = 0
+        while True:
+            try:
+                response = self._transport.handle_request(request)
+            except RETRY_EXCEPTIONS as e:
+                if attempt >= max_retries:
+                    raise
+                wait = self.policy.delay(attempt)
+                reason = type(e).__name__
+            else:
+                if attempt >= max_retries or response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                wait = self.policy.delay(attempt, response)
+                reason = str(response.status_code)
+                response.close()
+            logger.warning(f"{request.method} {request.url.path} -> {reason}, retry {attempt + 1}/{max_retries} in {wait:.2f}s")
+            self.policy.retries += 1
+            metrics.record_retry("http", reason)
+            attempt += 1
+            time.sleep(wait)
+
+    def swap_transport(self, transport: httpx.BaseTransport) -> httpx.BaseTransport:
+        """换上新的底层传输层，返回旧的 (由调用方关闭)"""
+        old, self._transport = self._transport, transport
+        return old
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """
+    异步传输层：重试策略同 RetryTransport，另支持请求对冲 (hedging)：
+    请求在 hedge_delay 秒内仍未返回响应头时，并行发出一个相同请求，采用先返回者，取消另一个。
+    对冲会增加模型调用量，默认关闭 (HTTP_HEDGE_DELAY_MS=0)。
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: RetryPolicy, hedge_delay: float = 0.0):
+        self._transport = transport
+        self.policy = policy
+        self.hedge_delay = hedge_delay
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        if self.hedge_delay <= 0 or not _is_replayable(request):
+            return await self._transport.handle_async_request(request)
+
+        primary = asyncio.ensure_future(self._transport.handle_async_request(request))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        hedge = asyncio.ensure_future(self._transport.handle_async_request(request))
+        pending = {primary, hedge}
+        winner: Optional[asyncio.Future] = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+            if winner is None:
+                # 两路都失败：抛出主请求的异常，交给外层重试
+                return primary.result()
+            if winner is hedge:
+                self.hedge_wins += 1
+            return winner.result()
+        finally:
+            for task in (primary, hedge):
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    # 同时完成的落选响应：关闭以归还连接
+                    await task.result().aclose()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        max_retries = self.policy.max_retries if _is_replayable(request) else 0
+        attempt = 0
+        while True:
+            try:
+                response = await self._send(request)
+            except RETRY_EXCEPTIONS as e:
+                if attempt >= max_retries:
+                    raise
+                wait = self.policy.delay(attempt)
+                reason = type(e).__name__
+            else:
+                if attempt >= max_retries or response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                wait = self.policy.delay(attempt, response)
+                reason = str(response.status_code)
+                await response.aclose()
+            logger.warning(f"{request.method} {request.url.path} -> {reason}, retry {attempt + 1}/{max_retries} in {wait:.2f}s")
+            self.policy.retries += 1
+            metrics.record_retry("http", reason)
+            attempt += 1
+            await asyncio.sleep(wait)
+
+    def swap_transport(self, transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+        old, self._transport = self._transport, transport
+        return old
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class HTTPClientPool:
+    """
+    模型与 Embedding 调用共享的 HTTP 连接池 (同步 / 异步各一个 httpx 客户端，首次使用时创建)。
+    keep-alive、连接数上限、超时与重试策略统一由 Settings 中的 HTTP_* 配置。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._sync_transport: Optional[RetryTransport] = None
+        self._async_transport: Optional[AsyncRetryTransport] = None
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        )
+
+    @staticmethod
+    def _timeout() -> httpx.Timeout:
+        return httpx.Timeout(settings.HTTP_TIMEOUT_SECONDS, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+
+    @staticmethod
+    def _policy() -> RetryPolicy:
+        return RetryPolicy(
+            max_retries=settings.HTTP_MAX_RETRIES,
+            base_delay=settings.HTTP_BACKOFF_BASE_SECONDS,
+            max_delay=settings.HTTP_BACKOFF_MAX_SECONDS
+        )
+
+    def get_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._sync_transport = RetryTransport(httpx.HTTPTransport(limits=self._limits()), self._policy())
+                self._client = httpx.Client(transport=self._sync_transport, timeout=self._timeout())
+            return self._client
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None:
+                self._async_transport = AsyncRetryTransport(
+                    httpx.AsyncHTTPTransport(limits=self._limits()),
+                    self._policy(),
+                    hedge_delay=settings.HTTP_HEDGE_DELAY_MS / 1000
+                )
+                self._async_client = httpx.AsyncClient(transport=self._async_transport, timeout=self._timeout())
+            return self._async_client
+
+    async def aclose(self):
+        """
+        停机释放连接：关闭底层连接池并换上新的空连接池，客户端对象本身保持可用。
+        ChatOpenAI / OpenAIEmbeddings 持有的是客户端引用，lifespan 重启 (TestClient 复用、reload) 后无需重建引擎；
+        新连接在下一次请求时于当前事件循环中建立。
+        """
+        with self._lock:
+            old_sync = old_async = None
+            if self._sync_transport is not None:
+                old_sync = self._sync_transport.swap_transport(httpx.HTTPTransport(limits=self._limits()))
+            if self._async_transport is not None:
+                old_async = self._async_transport.swap_transport(httpx.AsyncHTTPTransport(limits=self._limits()))
+        if old_sync is not None:
+            old_sync.close()
+        if old_async is not None:
+            await old_async.aclose()
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        if self._sync_transport is None and self._async_transport is None:
+            return None
+        sync_retries = self._sync_transport.policy.retries if self._sync_transport else 0
+        async_transport = self._async_transport
+        return {
+            "retries": sync_retries + (async_transport.policy.retries if async_transport else 0),
+            "hedges": async_transport.hedges if async_transport else 0,
+            "hedge_wins": async_transport.hedge_wins if async_transport else 0,
+        }
+
+
+# 单例导出
+http_pool = HTTPClientPool()
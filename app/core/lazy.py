@@ -0,0 +1,46 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class LazySingleton(Generic[T]):
+    """
+    延迟初始化的单例代理：首次访问属性时才调用 factory 构造真实对象 (线程安全)。
+    模块导入时只创建代理，LangChain / Chroma 等重量级依赖推迟到第一次使用 (或启动预热) 时加载。
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def get_instance(self) -> T:
+        instance: Optional[T] = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    object.__setattr__(self, "_instance", self._factory())
+                    logger.info(f"Initialized {self._name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+                instance = self._instance
+        return instance
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self.get_instance(), item)
+
+    def __setattr__(self, key: str, value: Any):
+        setattr(self.get_instance(), key, value)
+
+    def __repr__(self) -> str:
+        state = "initialized" if self.is_initialized else "pending"
+        return f"<LazySingleton {self._name} ({state})>"
@@ -1,6 +1,13 @@
 import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, Any, Optional
-from app.models.schema import GlobalStyleConfig
+
+from app.core.config import settings
+from app.models.schema import GlobalStyleConfig, FontStyle
 
 # Level 4: System Default (兜底配置 - 中文论文通用)
 SYSTEM_DEFAULT_CONFIG = {
@@ -26,7 +33,8 @@ class MergerEngine:
             if isinstance(value, dict) and key in target and isinstance(target[key], dict):
                 MergerEngine._deep_update(target[key], value)
             elif value is not None:
-                target[key] = value
+                # 拷贝嵌套结构，避免合并结果与调用方 (如预设缓存) 共享可变对象
+                target[key] = copy.deepcopy(value) if isinstance(value, (dict, list)) else value
         return target
 
     @staticmethod
@@ -36,9 +44,29 @@ class MergerEngine:
         json_preset_dict: Optional[Dict[str, Any]] = None
     ) -> GlobalStyleConfig:
         """
-        执行四级合并策略。
+        执行四级合并策略 (带编译缓存)。
         Priority: User (L1) > RAG (L2) > JSON (L3) > Default (L4)
+        相同输入直接返回已编译的不可变 GlobalStyleConfig。
+        """
+        return style_compiler.compile(user_prompt_dict, rag_extracted_dict, json_preset_dict)
+
+    @staticmethod
+    def resolve_block_style(base_style: Optional[FontStyle], override: Optional[FontStyle]) -> Optional[FontStyle]:
         """
+        解析块级样式：Global Style < Override Style。
+        FontStyle 不可变且可哈希，相同 (base, override) 组合共享同一个解析结果。
+        """
+        if override is None:
+            return base_style
+        return _resolve_block_style(base_style, override)
+
+    @staticmethod
+    def _merge_uncached(
+        user_prompt_dict: Optional[Dict[str, Any]] = None,
+        rag_extracted_dict: Optional[Dict[str, Any]] = None,
+        json_preset_dict: Optional[Dict[str, Any]] = None
+    ) -> GlobalStyleConfig:
+        """四级合并的实际计算过程"""
         # 1. Start with System Defaults
         final_config = copy.deepcopy(SYSTEM_DEFAULT_CONFIG)
 
@@ -59,4 +87,62 @@ class MergerEngine:
             if isinstance(value, dict) and "align" in value and isinstance(value["align"], str):
                 value["align"] = value["align"].upper()
         # -------------------------------------------------------------
-        return GlobalStyleConfig(**final_config) 
+        return GlobalStyleConfig(**final_config)
+
+
+@lru_cache(maxsize=settings.STYLE_OVERRIDE_CACHE_SIZE)
+def _resolve_block_style(base_style: Optional[FontStyle], override: FontStyle) -> FontStyle:
+    """块级覆盖的驻留缓存 (Interning)"""
+    if base_style is None:
+        return override
+    return base_style.model_copy(update=override.model_dump(exclude_none=True))
+
+
+class StyleCompiler:
+    """
+    样式编译器：按输入指纹缓存四级合并结果。
+    指纹为三层输入的规范化 JSON 哈希；缓存有界，按 LRU 淘汰。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, GlobalStyleConfig]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(*layers: Optional[Dict[str, Any]]) -> str:
+        payload = json.dumps(layers, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def compile(
+        self,
+        user_prompt_dict: Optional[Dict[str, Any]] = None,
+        rag_extracted_dict: Optional[Dict[str, Any]] = None,
+        json_preset_dict: Optional[Dict[str, Any]] = None
+    ) -> GlobalStyleConfig:
+        key = self.fingerprint(user_prompt_dict, rag_extracted_dict, json_preset_dict)
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return compiled
+
+        compiled = MergerEngine._merge_uncached(user_prompt_dict, rag_extracted_dict, json_preset_dict)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = compiled
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# 单例导出
+style_compiler = StyleCompiler(max_entries=settings.STYLE_CACHE_SIZE)
@@ -0,0 +1,256 @@
+import bisect
+import functools
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# Prometheus 文本格式 (0.0.4)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 模型调用耗时分桶 (秒)：覆盖缓存命中级别到长文润色级别
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 当前请求所属学校：流水线入口绑定，模型调用处读取作为 school 标签
+_current_school: ContextVar[str] = ContextVar("apf_metrics_school", default="-")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: LabelValues, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [各分桶计数 (非累计，最后一格为 +Inf), 总和]
+        self._values: Dict[LabelValues, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: LabelValues, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {round(total, 6)}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+@functools.lru_cache(maxsize=None)
+def _usage_collector_class():
+    """LangChain 回调：从模型响应中收集 token 用量 (LangChain 延迟导入)"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class UsageCollector(BaseCallbackHandler):
+        def __init__(self):
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+        def on_llm_end(self, response, **kwargs: Any):
+            found = False
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        self.prompt_tokens += usage.get("input_tokens", 0)
+                        self.completion_tokens += usage.get("output_tokens", 0)
+                        found = True
+            token_usage = (response.llm_output or {}).get("token_usage") if not found else None
+            if token_usage:
+                self.prompt_tokens += token_usage.get("prompt_tokens", 0)
+                self.completion_tokens += token_usage.get("completion_tokens", 0)
+
+    return UsageCollector
+
+
+class CallTracker:
+    """
+    单次模型调用的计量上下文：退出时记录耗时 / 结果 / token 用量。
+    config 需传给 chain.invoke / ainvoke / astream，以便回调收集 token 用量。
+    """
+
+    def __init__(self, registry: "MetricsRegistry", kind: str, model: str, school: str):
+        self._registry = registry
+        self.kind = kind
+        self.model = model
+        self.school = school
+        self._usage = _usage_collector_class()()
+        self.config: Optional[Dict[str, Any]] = {"callbacks": [self._usage]}
+        self._started = 0.0
+
+    def __enter__(self) -> "CallTracker":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registry = self._registry
+        outcome = "ok" if exc_type is None else "error"
+        registry.model_latency.observe((self.kind, self.model, self.school, outcome), time.perf_counter() - self._started)
+        if self._usage.prompt_tokens:
+            registry.model_tokens.inc((self.kind, self.model, self.school, "prompt"), self._usage.prompt_tokens)
+        if self._usage.completion_tokens:
+            registry.model_tokens.inc((self.kind, self.model, self.school, "completion"), self._usage.completion_tokens)
+        return False
+
+
+class _NoopTracker:
+    """指标关闭时使用：不计时、不挂回调"""
+    config = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_TRACKER = _NoopTracker()
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表 (无第三方依赖)，以 Prometheus 文本格式导出。
+    METRICS_ENABLED=false 时所有记录方法直接返回，调用点几乎没有额外开销。
+    """
+
+    def __init__(self, enabled: bool, max_schools: int):
+        self.enabled = enabled
+        self.max_schools = max_schools
+        self._schools: set = set()
+        self._schools_lock = threading.Lock()
+
+        self.model_latency = Histogram(
+            "apf_model_request_duration_seconds", "Latency of C-Model, B-Model and embedding calls.",
+            ("kind", "model", "school", "outcome"), LATENCY_BUCKETS
+        )
+        self.model_tokens = Counter(
+            "apf_model_tokens_total", "Prompt and completion tokens reported by the model API.",
+            ("kind", "model", "school", "type")
+        )
+        self.embedded_texts = Counter(
+            "apf_embedding_texts_total", "Texts sent to the embedding backend (cache misses only).",
+            ("model", "school")
+        )
+        self.retries = Counter(
+            "apf_retries_total", "Retried requests by layer and reason.",
+            ("source", "reason")
+        )
+        self.fallbacks = Counter(
+            "apf_fallbacks_total", "Degraded results returned after a model call failed.",
+            ("kind", "school", "reason")
+        )
+        self.cache_lookups = Counter(
+            "apf_cache_lookups_total", "Cache lookups by cache and result.",
+            ("cache", "result")
+        )
+        self._metrics = (
+            self.model_latency, self.model_tokens, self.embedded_texts,
+            self.retries, self.fallbacks, self.cache_lookups
+        )
+
+    def bind_school(self, school_id: str):
+        """在当前上下文绑定学校标签；不同学校数超过上限后归入 other，控制标签基数"""
+        if not self.enabled:
+            return
+        with self._schools_lock:
+            if school_id not in self._schools and len(self._schools) >= self.max_schools:
+                school_id = "other"
+            else:
+                self._schools.add(school_id)
+        _current_school.set(school_id)
+
+    @staticmethod
+    def current_school() -> str:
+        return _current_school.get()
+
+    def track_call(self, kind: str, model: str, school: Optional[str] = None):
+        """用法: with metrics.track_call("c_model", model) as call: chain.invoke(inputs, config=call.config)"""
+        if not self.enabled:
+            return _NOOP_TRACKER
+        return CallTracker(self, kind, model, school or _current_school.get())
+
+    def record_embedding(self, model: str, texts: int, school: Optional[str] = None):
+        if self.enabled and texts:
+            self.embedded_texts.inc((model, school or _current_school.get()), texts)
+
+    def record_retry(self, source: str, reason: str):
+        if self.enabled:
+            self.retries.inc((source, reason))
+
+    def record_fallback(self, kind: str, reason: str):
+        if self.enabled:
+            self.fallbacks.inc((kind, _current_school.get(), reason))
+
+    def record_cache(self, cache: str, hits: int = 0, misses: int = 0):
+        if not self.enabled:
+            return
+        if hits:
+            self.cache_lookups.inc((cache, "hit"), hits)
+        if misses:
+            self.cache_lookups.inc((cache, "miss"), misses)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 单例导出
+metrics = MetricsRegistry(settings.METRICS_ENABLED, settings.METRICS_MAX_SCHOOLS)
@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.merger import MergerEngine
+from app.models.schema import GlobalStyleConfig
+
+logger = logging.getLogger(__name__)
+
+# 编译档案文件格式版本：格式变化时旧档案自动作废
+COMPILED_PROFILE_VERSION = 1
+COMPILED_DIR_NAME = "_compiled"
+# school_id 会直接用作文件名，只接受安全字符
+_SAFE_SCHOOL_ID = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def normalize_school_id(school_id: str) -> str:
+    """与预设文件名对应的查找键：去掉首尾空白及字母数字、_、- 以外的字符 (路径分隔符等)"""
+    return "".join(c for c in school_id.strip() if c.isalnum() or c in ('_', '-'))
+
+
+class PresetEntry(BaseModel):
+    """一份已解析、已校验的 Level 3 静态预设 (手写或由排版手册编译生成)"""
+    school_id: str
+    path: str
+    mtime: float
+    rules: Dict[str, Any]
+    style: GlobalStyleConfig
+    # 编译档案：来源手册的文件哈希，以及生成时的 C-Model / 字体映射指纹
+    compiled: bool = False
+    source_hash: Optional[str] = None
+    fingerprint: Optional[str] = None
+
+
+class PresetRegistry:
+    """
+    预设注册表：启动时把 RULES_DIR 下所有 *.json (手写预设) 与 RULES_DIR/_compiled/*.json
+    (排版手册编译档案) 一次性解析进内存。手写预设优先于编译档案。
+    后台线程轮询文件 mtime，变更的预设热加载；请求路径上的查找为 O(1) 字典访问，不做任何 I/O。
+    """
+
+    def __init__(self, rules_dir: str, poll_interval: float):
+        self.rules_dir = rules_dir
+        self.compiled_dir = os.path.join(rules_dir, COMPILED_DIR_NAME)
+        self.poll_interval = poll_interval
+        # Copy-on-write：刷新时整体替换字典，读路径无需加锁
+        self._presets: Dict[str, PresetEntry] = {}
+        self._compiled: Dict[str, PresetEntry] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._loaded = False
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def _load_file(self, school_id: str, path: str, mtime: float) -> Optional[PresetEntry]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                rules = json.load(f)
+            if not isinstance(rules, dict):
+                raise ValueError("preset root must be a JSON object")
+            # 用一次完整合并做校验 (顺带预热样式编译缓存)
+            style = MergerEngine.merge(json_preset_dict=rules)
+            return PresetEntry(school_id=school_id, path=path, mtime=mtime, rules=rules, style=style)
+        except Exception as e:
+            logger.error(f"Failed to load JSON preset {path}: {e}")
+            return None
+
+    def _load_compiled(self, school_id: str, path: str, mtime: float) -> Optional[PresetEntry]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            meta = data.get("_compiled") or {}
+            if meta.get("format_version") != COMPILED_PROFILE_VERSION:
+                logger.info(f"Ignoring compiled profile {path} with outdated format")
+                return None
+            rules = data["rules"]
+            style = MergerEngine.merge(json_preset_dict=rules)
+            return PresetEntry(
+                school_id=school_id, path=path, mtime=mtime, rules=rules, style=style,
+                compiled=True, source_hash=meta.get("source_hash"), fingerprint=meta.get("fingerprint")
+            )
+        except Exception as e:
+            logger.error(f"Failed to load compiled profile {path}: {e}")
+            return None
+
+    @staticmethod
+    def _scan(directory: str) -> List[os.DirEntry]:
+        try:
+            return [e for e in os.scandir(directory) if e.is_file() and e.name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def refresh(self) -> bool:
+        """扫描 RULES_DIR 与编译档案目录，仅重新解析 mtime 变化的文件；返回是否有变更"""
+        with self._refresh_lock:
+            presets = dict(self._presets)
+            compiled = dict(self._compiled)
+            mtimes: Dict[str, float] = {}
+            changed = False
+
+            for target, directory, loader, kind in (
+                (presets, self.rules_dir, self._load_file, "static preset"),
+                (compiled, self.compiled_dir, self._load_compiled, "compiled profile"),
+            ):
+                seen = set()
+                for entry in self._scan(directory):
+                    school_id = entry.name[:-len(".json")]
+                    seen.add(school_id)
+                    mtime = entry.stat().st_mtime
+                    mtimes[entry.path] = mtime
+                    if self._mtimes.get(entry.path) == mtime:
+                        continue
+
+                    changed = True
+                    loaded = loader(school_id, entry.path, mtime)
+                    if loaded is not None:
+                        target[school_id] = loaded
+                        logger.info(f"Loaded {kind} for {school_id}")
+                    # 解析失败时保留上一个可用版本
+
+                for school_id in set(target) - seen:
+                    changed = True
+                    del target[school_id]
+                    logger.info(f"Removed {kind} for {school_id}")
+
+            self._presets = presets
+            self._compiled = compiled
+            self._mtimes = mtimes
+            self._loaded = True
+            return changed
+
+    def get(self, school_id: str) -> Optional[Dict[str, Any]]:
+        """O(1) 查找预设规则 (手写优先，其次编译档案)；未找到返回 None"""
+        entry = self.get_entry(school_id)
+        return entry.rules if entry else None
+
+    def get_entry(self, school_id: str) -> Optional[PresetEntry]:
+        """school_id 先规范化；精确匹配未命中时再按大小写不敏感匹配 (只遍历内存中的预设)"""
+        if not self._loaded:
+            self.refresh()
+        key = normalize_school_id(school_id)
+        entry = self._presets.get(key) or self._compiled.get(key)
+        if entry is None and key:
+            folded = key.casefold()
+            entry = next(
+                (e for table in (self._presets, self._compiled) for name, e in table.items() if name.casefold() == folded),
+                None
+            )
+        return entry
+
+    def _compiled_path(self, school_id: str) -> Optional[str]:
+        if not _SAFE_SCHOOL_ID.match(school_id):
+            return None
+        return os.path.join(self.compiled_dir, f"{school_id}.json")
+
+    def save_compiled(
+        self,
+        school_id: str,
+        rules: Dict[str, Any],
+        source_hash: Optional[str],
+        fingerprint: str
+    ) -> bool:
+        """
+        写入编译档案 (先写临时文件再原子替换) 并立即刷新注册表。
+        school_id 不能安全用作文件名时不落盘，返回 False。
+        """
+        path = self._compiled_path(school_id)
+        if path is None:
+            logger.warning(f"Not compiling profile for unsafe school id {school_id!r}")
+            return False
+
+        os.makedirs(self.compiled_dir, exist_ok=True)
+        payload = {
+            "_compiled": {
+                "format_version": COMPILED_PROFILE_VERSION,
+                "source_hash": source_hash,
+                "fingerprint": fingerprint,
+                "compiled_at": time.time(),
+            },
+            "rules": rules,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        self.refresh()
+        return True
+
+    def invalidate_compiled(self, school_id: str, source_hash: Optional[str]):
+        """手册变更：删除来源哈希与 source_hash 不一致的编译档案"""
+        path = self._compiled_path(school_id)
+        if path is None or not os.path.exists(path):
+            return
+        entry = self._compiled.get(school_id)
+        if entry is not None and entry.source_hash == source_hash:
+            return
+        os.remove(path)
+        logger.info(f"Invalidated compiled profile for {school_id}")
+        self.refresh()
+
+    def list_presets(self) -> List[Dict[str, Any]]:
+        if not self._loaded:
+            self.refresh()
+        # 手写预设覆盖同名编译档案
+        entries = {**self._compiled, **self._presets}
+        return [
+            {
+                "school_id": entry.school_id,
+                "file": os.path.relpath(entry.path, self.rules_dir),
+                "updated_at": entry.mtime,
+                "compiled": entry.compiled,
+                "sections": sorted(k for k, v in entry.rules.items() if isinstance(v, dict)),
+            }
+            for entry in sorted(entries.values(), key=lambda e: e.school_id)
+        ]
+
+    def _watch_loop(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Preset hot reload failed: {e}")
+
+    def start_watching(self):
+        """启动 mtime 轮询线程 (poll_interval <= 0 时不启用热加载)"""
+        self.refresh()
+        if self.poll_interval <= 0 or self._watcher is not None:
+            return
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=self._watch_loop, name="apf-preset-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.poll_interval + 1)
+            self._watcher = None
+
+
+# 单例导出
+preset_registry = PresetRegistry(settings.RULES_DIR, settings.PRESET_RELOAD_INTERVAL)
@@ -1,11 +1,18 @@
-import os
-import json
-from typing import Dict, Any, Optional
-from PyPDF2 import PdfReader
-from langchain_core.documents import Document
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Any, List, Optional, Set, Tuple
 
 from app.core.config import settings
+from app.core.executor import get_process_pool
+from app.core.preset_registry import PresetEntry, preset_registry
 from app.engine.rag_engine import rag_engine
+from app.engine.rule_extractor import RuleChunk, chunk_pages, extract_pages
+from app.models.schema import RuleManifest
+from app.services.storage import rule_manifest_store
+
+logger = logging.getLogger(__name__)
 
 class TemplateLoader:
     """
@@ -13,62 +20,140 @@ class TemplateLoader:
     职责：管理静态 JSON 规则与动态 PDF 规则的加载/入库。
     """
 
+    def __init__(self):
+        # 同一学校的入库串行执行，避免并发请求重复嵌入或交错替换
+        self._ingest_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _ingest_lock(self, school_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._ingest_locks.setdefault(school_id, threading.Lock())
+
     @staticmethod
     def get_preset_rules(school_id: str) -> Optional[Dict[str, Any]]:
         """
         尝试加载 Level 3 静态预设 (JSON)。
-        路径: data/rules/{school_id}.json
+        路径: data/rules/{school_id}.json，由 PresetRegistry 预加载并热更新，此处为纯内存查找。
         """
-        # 安全处理文件名
-        safe_name = "".join([c for c in school_id if c.isalnum() or c in ('_', '-')])
-        json_path = os.path.join(settings.RULES_DIR, f"{safe_name}.json")
+        return preset_registry.get(school_id)
 
-        if not os.path.exists(json_path):
-            print(f"DEBUG: No static preset found for {school_id}")
-            return None
+    @staticmethod
+    def get_preset_entry(school_id: str) -> Optional[PresetEntry]:
+        """同 get_preset_rules，但返回带来源信息的条目 (可区分手写预设与编译档案)"""
+        return preset_registry.get_entry(school_id)
 
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                print(f"DEBUG: Loaded static preset for {school_id}")
-                return data
-        except Exception as e:
-            print(f"ERROR: Failed to load JSON preset: {e}")
-            return None
+    @staticmethod
+    def _file_hash(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while block := f.read(1024 * 1024):
+                digest.update(block)
+        return digest.hexdigest()
 
     @staticmethod
-    def ingest_user_rule_file(file_path: str, school_id: str) -> bool:
+    def _chunk_id(school_id: str, chunk: str) -> str:
+        """确定性切片 ID：同一学校的相同文本总是落在同一个向量 ID 上"""
+        return f"{school_id}:{hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:32]}"
+
+    @staticmethod
+    def _is_current(manifest: Optional[RuleManifest], file_hash: str, stored_ids: Set[str]) -> bool:
+        # 清单一致且切片仍在向量库中 (向量库可能被单独清空过) 才算已入库
+        return manifest is not None and manifest.file_hash == file_hash and stored_ids.issuperset(manifest.chunk_ids)
+
+    def check_rule_file(self, file_path: str, school_id: str) -> Tuple[str, bool]:
+        """返回 (文件哈希, 是否已是该学校当前入库的手册)"""
+        file_hash = self._file_hash(file_path)
+        current = self._is_current(rule_manifest_store.get(school_id), file_hash, rag_engine.get_ids(school_id))
+        return file_hash, current
+
+    @staticmethod
+    def extract_rule_chunks(file_path: str) -> List[RuleChunk]:
         """
-        处理用户上传的排版规范文件 (PDF)。
-        1. 提取文本
-        2. 切片
-        3. 存入 ChromaDB (Level 2 Source)
+        提取并切分排版手册：
+        1. 页数较多时按页段在进程池中并行提取，按页序线性拼接
+        2. 按章节/条款标题切片，带重叠与页码
+        文件损坏或不是 PDF 时记录错误并返回空列表，本次排版不使用该手册。
         """
         if not file_path.endswith(".pdf"):
-            print("WARNING: Only PDF rule files are currently supported for RAG.")
-            return False
+            logger.warning("Only PDF rule files are currently supported for RAG.")
+            return []
+
+        try:
+            pages = extract_pages(file_path, get_process_pool(), settings.PDF_PAGES_PER_TASK)
+        except Exception as e:
+            logger.error(f"Failed to extract rule file {file_path}: {e}")
+            return []
+        return chunk_pages(pages, settings.RULE_CHUNK_CHARS, settings.RULE_CHUNK_OVERLAP)
 
+    def ingest_chunks(self, rule_chunks: List[RuleChunk], school_id: str, file_hash: str) -> bool:
+        """
+        切片入库 (幂等)：
+        只嵌入向量库中尚不存在的切片，删除旧版本手册遗留的切片 (替换而非追加)，并记录入库清单。
+        """
         try:
-            # 1. 简单的 PDF 文本提取
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-
-            # 2. 简单的切片 (按固定字符数，实际生产可用 RecursiveCharacterTextSplitter)
-            chunk_size = 1000
-            chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-            
-            # 3. 构造 LangChain Document 对象
-            documents = [Document(page_content=chunk) for chunk in chunks]
-
-            # 4. 调用 RAG 引擎入库
-            rag_engine.add_documents(documents, school_id)
-            return True
+            with self._ingest_lock(school_id):
+                stored_ids = rag_engine.get_ids(school_id)
+                if self._is_current(rule_manifest_store.get(school_id), file_hash, stored_ids):
+                    logger.info(f"Rule file for {school_id} unchanged, skipping ingestion")
+                    return True
+
+                # 同一手册内的重复切片 (页眉、重复条款) 只保留一份
+                chunks: Dict[str, RuleChunk] = {}
+                for chunk in rule_chunks:
+                    chunks.setdefault(self._chunk_id(school_id, chunk.text), chunk)
+
+                new_ids = [chunk_id for chunk_id in chunks if chunk_id not in stored_ids]
+                stale_ids = [chunk_id for chunk_id in stored_ids if chunk_id not in chunks]
+
+                # 构造 LangChain Document 对象 (带章节与页码)，调用 RAG 引擎入库
+                if new_ids:
+                    from langchain_core.documents import Document
+
+                    documents = [
+                        Document(
+                            page_content=chunks[chunk_id].text,
+                            metadata=chunks[chunk_id].model_dump(exclude={"text"})
+                        )
+                        for chunk_id in new_ids
+                    ]
+                    rag_engine.add_documents(documents, school_id, ids=new_ids)
+                rag_engine.delete_documents(stale_ids)
+
+                rule_manifest_store.put(RuleManifest(
+                    school_id=school_id,
+                    file_hash=file_hash,
+                    chunk_ids=list(chunks),
+                    ingested_at=time.time()
+                ))
+                # 手册已替换：基于旧手册编译的样式档案作废
+                preset_registry.invalidate_compiled(school_id, file_hash)
+                logger.info(
+                    f"Ingested rule file for {school_id}: {len(new_ids)} new, "
+                    f"{len(chunks) - len(new_ids)} reused, {len(stale_ids)} removed"
+                )
+                return True
 
         except Exception as e:
-            print(f"ERROR: Failed to ingest rule file: {e}")
+            logger.error(f"Failed to ingest rule file: {e}")
+            return False
+
+    def ingest_user_rule_file(self, file_path: str, school_id: str) -> bool:
+        """
+        处理用户上传的排版规范文件 (PDF)，同步完成 哈希比对 -> 提取切片 -> 入库。
+        文件哈希与入库清单一致时直接跳过。
+        """
+        try:
+            file_hash, current = self.check_rule_file(file_path, school_id)
+            if current:
+                logger.info(f"Rule file for {school_id} unchanged, skipping ingestion")
+                return True
+            rule_chunks = self.extract_rule_chunks(file_path)
+        except Exception as e:
+            logger.error(f"Failed to ingest rule file: {e}")
+            return False
+        if not rule_chunks:
             return False
+        return self.ingest_chunks(rule_chunks, school_id, file_hash)
 
 # 单例导出
 template_loader = TemplateLoader() 
@@ -0,0 +1,175 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+# 结构化日志：每个请求 / 任务一行 JSON，便于日志系统按 task_id 检索与聚合
+trace_logger = logging.getLogger("apf.trace")
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("apf_trace", default=None)
+
+# Server-Timing 指标名只能是 token 字符
+_TOKEN_PATTERN = re.compile(r"[^A-Za-z0-9_.-]")
+
+# 同一时刻只允许一个采样剖析 (cProfile 按线程生效，且不能嵌套启用)
+_profile_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "start_ms", "duration_ms", "attrs")
+
+    def __init__(self, name: str, start_ms: float, duration_ms: float, attrs: Dict[str, Any]):
+        self.name = name
+        self.start_ms = start_ms
+        self.duration_ms = duration_ms
+        self.attrs = attrs
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "start_ms": self.start_ms, "duration_ms": self.duration_ms, **self.attrs}
+
+
+class Trace:
+    """
+    一次请求 / 任务的阶段耗时记录。阶段可以并发 (样式解析与内容润色重叠)，
+    start_ms 为相对请求开始的偏移。
+    """
+
+    def __init__(self, trace_id: str, name: str):
+        self.trace_id = trace_id
+        self.name = name
+        self.spans: List[Span] = []
+        self.profile_path: Optional[str] = None
+        self._started = time.perf_counter()
+
+    def _offset_ms(self, at: float) -> float:
+        return round((at - self._started) * 1000, 1)
+
+    @property
+    def total_ms(self) -> float:
+        return self._offset_ms(time.perf_counter())
+
+    def add_span(self, name: str, duration_ms: float, **attrs: Any):
+        """记录一个刚结束的阶段 (耗时由调用方测得)"""
+        start_ms = max(0.0, round(self.total_ms - duration_ms, 1))
+        self.spans.append(Span(name, start_ms, duration_ms, attrs))
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """包裹一个阶段；yield 出的 dict 可在阶段内追加属性"""
+        started = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.spans.append(Span(
+                name, self._offset_ms(started), round((time.perf_counter() - started) * 1000, 1), attrs
+            ))
+
+    def server_timing(self) -> str:
+        """Server-Timing 响应头：每个阶段一项，外加 total"""
+        entries = [
+            f"{_TOKEN_PATTERN.sub('_', span.name)};dur={span.duration_ms}"
+            for span in self.spans
+        ]
+        entries.append(f"total;dur={self.total_ms}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {
+            "trace": self.name,
+            "task_id": self.trace_id,
+            "total_ms": self.total_ms,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+        if self.profile_path:
+            record["profile"] = self.profile_path
+        return record
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record_span(name: str, duration_ms: float, **attrs: Any):
+    """向当前上下文的 Trace 追加阶段；没有进行中的 Trace 时什么也不做"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, duration_ms, **attrs)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    trace = _current_trace.get()
+    if trace is None:
+        yield attrs
+        return
+    with trace.span(name, **attrs) as span_attrs:
+        yield span_attrs
+
+
+def _start_profiler() -> Optional[cProfile.Profile]:
+    """按 TRACE_PROFILE_SAMPLE_RATE 抽样启用 cProfile；已有剖析在进行时跳过"""
+    rate = settings.TRACE_PROFILE_SAMPLE_RATE
+    if rate <= 0 or random.random() >= rate or not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 其他剖析工具 (调试器、覆盖率) 已占用
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def _finish_profiler(profiler: cProfile.Profile, trace: Trace):
+    try:
+        profiler.disable()
+        if trace.total_ms < settings.TRACE_PROFILE_THRESHOLD_MS:
+            return
+        os.makedirs(settings.TRACE_PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.TRACE_PROFILE_DIR, f"{trace.name}-{trace.trace_id}.prof")
+        profiler.dump_stats(path)
+        trace.profile_path = path
+        logger.info(f"Slow {trace.name} {trace.trace_id} ({trace.total_ms:.0f} ms), profile saved to {path}")
+    finally:
+        _profile_lock.release()
+
+
+@contextmanager
+def trace_request(trace_id: str, name: str) -> Iterator[Optional[Trace]]:
+    """
+    为一次请求 / 任务开启 Trace：期间 record_span / span 记录到该 Trace，结束时输出一行 JSON 日志。
+    抽样命中时整段启用 cProfile (只覆盖事件循环线程，同一循环上的其他请求也会计入)，
+    总耗时超过 TRACE_PROFILE_THRESHOLD_MS 才落盘。
+    TRACING_ENABLED=false 时 yield None。
+    """
+    if not settings.TRACING_ENABLED:
+        yield None
+        return
+
+    trace = Trace(trace_id, name)
+    token = _current_trace.set(trace)
+    profiler = _start_profiler()
+    failed = False
+    try:
+        yield trace
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _current_trace.reset(token)
+        if profiler is not None:
+            _finish_profiler(profiler, trace)
+        record = trace.to_dict()
+        record["status"] = "failed" if failed else "ok"
+        trace_logger.info(json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,258 @@
+import array
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.core.executor import get_llm_limiter, run_blocking
+from app.core.http_client import http_pool
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9]+|[^\sA-Za-z0-9]")
+
+
+class LocalHashEmbeddings(Embeddings):
+    """
+    本地确定性 Embedding (哈希技巧)：字 / 词与相邻二元组哈希到固定维度后归一化。
+    不依赖网络，同一文本永远得到同一向量，用于离线基准测试与本地开发。
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.model_name = f"local-hash-{dim}"
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = _WORD_PATTERN.findall(text.lower())
+        features = tokens + [a + b for a, b in zip(tokens, tokens[1:])]
+        vector = [0.0] * self.dim
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class EmbeddingCache:
+    """
+    Embedding 持久化缓存 (SQLite)。Key = hash(模型名, 文本)，向量以 float32 存储。
+    条目数超过上限时按最近访问时间 (LRU) 清理。
+    """
+
+    def __init__(self, db_path: str, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embedding_cache_accessed ON embedding_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\x1f{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite 单条语句参数上限为 999，分批查询
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE key IN ({', '.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array.array("f", blob).tolist()
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embedding_cache SET accessed_at = ? WHERE key IN ({', '.join('?' * len(rows))})",
+                        [time.time(), *(key for key, _ in rows)]
+                    )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        metrics.record_cache("embedding", hits=len(found), misses=len(unique) - len(found))
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, vector, accessed_at) VALUES (?, ?, ?)",
+                [(key, array.array("f", vector).tobytes(), now) for key, vector in items.items()]
+            )
+            self._conn.execute(
+                "DELETE FROM embedding_cache WHERE key IN ("
+                " SELECT key FROM embedding_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": size,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    带缓存与批处理的 Embedding 客户端：
+    - 先查缓存，只把未命中的文本 (去重后) 发给后端；
+    - 未命中文本按 batch_size 分组，最多 concurrency 组同时在途；
+    - 异步路径的远程调用受全局模型调用闸门 (get_llm_limiter) 约束。
+    """
+
+    def __init__(
+        self,
+        backend: Embeddings,
+        model_name: str,
+        cache: Optional[EmbeddingCache],
+        batch_size: int,
+        concurrency: int
+    ):
+        self.backend = backend
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+
+    def _lookup(self, texts: List[str]):
+        keys = [EmbeddingCache.make_key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(keys) if self.cache else {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        return keys, found, missing
+
+    def _batches(self, missing: Dict[str, str]) -> List[List[str]]:
+        pending = list(missing)
+        return [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+
+    def _store(self, found: Dict[str, List[float]], batch_keys: List[str], vectors):
+        fresh = dict(zip(batch_keys, vectors))
+        found.update(fresh)
+        if self.cache:
+            self.cache.put_many(fresh)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        batches = self._batches(missing)
+        # 批次可能在线程池中执行，先取出当前上下文的学校标签
+        school = metrics.current_school()
+
+        def embed_batch(batch_keys: List[str]):
+            metrics.record_embedding(self.model_name, len(batch_keys), school)
+            with metrics.track_call("embedding", self.model_name, school):
+                return self.backend.embed_documents([missing[key] for key in batch_keys])
+
+        if len(batches) == 1:
+            self._store(found, batches[0], embed_batch(batches[0]))
+        elif batches:
+            # 独立线程池：调用方本身可能就在 cpu_executor 中
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="apf-embed") as pool:
+                for batch_keys, vectors in zip(batches, pool.map(embed_batch, batches)):
+                    self._store(found, batch_keys, vectors)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await run_blocking(self._lookup, texts)
+        fanout = asyncio.Semaphore(self.concurrency)
+
+        async def embed_batch(batch_keys: List[str]):
+            async with fanout, get_llm_limiter():
+                metrics.record_embedding(self.model_name, len(batch_keys))
+                with metrics.track_call("embedding", self.model_name):
+                    return await self.backend.aembed_documents([missing[key] for key in batch_keys])
+
+        batches = self._batches(missing)
+        results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        for batch_keys, vectors in zip(batches, results):
+            await run_blocking(self._store, found, batch_keys, vectors)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        return self.cache.stats() if self.cache else None
+
+
+def build_embeddings() -> CachedEmbeddings:
+    """
+    按 EMBED_BACKEND 构造 Embedding 客户端：
+    zhipu -> 智谱 embedding-3 (OpenAI 兼容接口)；local -> 本地哈希向量 (离线)。
+    """
+    if settings.EMBED_BACKEND == "local":
+        backend = LocalHashEmbeddings(settings.LOCAL_EMBED_DIM)
+        model_name = backend.model_name
+    elif settings.EMBED_BACKEND == "zhipu":
+        # 使用 OpenAI 适配器连接智谱 Embedding
+        from langchain_openai import OpenAIEmbeddings
+
+        backend = OpenAIEmbeddings(
+            model=settings.MODEL_EMBED,
+            openai_api_key=settings.require_api_key(),
+            openai_api_base=settings.OPENAI_BASE_URL,
+            check_embedding_ctx_length=False,
+            chunk_size=settings.EMBED_BATCH_SIZE,
+            max_retries=0,
+            http_client=http_pool.get_client(),
+            http_async_client=http_pool.get_async_client()
+        )
+        model_name = settings.MODEL_EMBED
+    else:
+        raise ValueError(f"Unknown EMBED_BACKEND: {settings.EMBED_BACKEND}")
+
+    cache = None
+    if settings.EMBED_CACHE_ENABLED:
+        cache = EmbeddingCache(
+            os.path.join(settings.CACHE_DIR, "embedding_cache.sqlite3"),
+            max_entries=settings.EMBED_CACHE_MAX_ENTRIES
+        )
+    return CachedEmbeddings(
+        backend,
+        model_name=model_name,
+        cache=cache,
+        batch_size=settings.EMBED_BATCH_SIZE,
+        concurrency=settings.EMBED_CONCURRENCY
+    )
@@ -1,27 +1,145 @@
+import asyncio
+import hashlib
 import json
 import logging
 import os
-from typing import List, Dict, Any, Optional
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Any, Optional
 from app.core.config import settings
-from langchain_core.output_parsers import StrOutputParser
+from app.core.executor import get_llm_limiter, run_blocking
+from app.core.http_client import http_pool
+from app.core.metrics import metrics
+from app.core.lazy import LazySingleton
+from app.core.merger import MergerEngine
+from app.engine.llm_cache import LayoutResponseCache
+from app.engine.segmenter import structural_segmenter
+from app.engine.stream_parser import IncrementalBlockParser
+from app.engine.text_splitter import split_into_windows
+from app.models.schema import ContentBlock, ContentType
 
 logger = logging.getLogger(__name__)
 
+# 窗口完成回调：await on_window_done(index=, windows=, blocks=, duration_ms=)
+WindowCallback = Callable[..., Awaitable[None]]
+
+LAYOUT_PROMPT_TEMPLATE = """
+        You are an expert academic formatting engine. Extract style rules based on the context and user request.
+        
+        Context from Rule Manual:
+        {context}
+
+        User Request:
+        {user_prompt}
+
+        Task: Return a JSON object defining the style rules.
+
+        *** FONT & SIZE MAPPING TABLE (CRITICAL) ***
+        Please STRICTLY refer to the following JSON table for converting Chinese names to System codes:
+        
+        {font_mapping_context}
+
+        *** RULE FOR UNKNOWN FONTS ***
+        If the user asks for a font NOT in the table above, output its English name directly (e.g., "Helvetica").
+
+        Format example:
+        {{
+            "heading_1": {{ "font_name": "SimHei", "font_size": 16.0, "align": "CENTER", "line_spacing": 1.5, "is_bold": true }},
+            "body_text": {{ "font_name": "KaiTi", "font_size": 12.0, "align": "JUSTIFY", "line_spacing": 1.5 }}
+        }}
+        
+        Return ONLY valid JSON.
+        """
+
+POLISH_PROMPT_TEMPLATE = """
+        You are an academic paper formatting assistant. Your task is to split the input text into logical blocks.
+
+        Rules:
+        1. Identify headings, captions, and body text.
+        2. **CRITICAL**: Escape double quotes inside text with backslash (\\"). Example: "She said \\"Hello\\""
+        3. Return ONLY valid JSON.
+
+        Output JSON format:
+        {{
+            "blocks": [
+                {{ "type": "heading_1", "text": "Chapter 1" }},
+                {{ "type": "body_text", "text": "Content here..." }}
+            ]
+        }}
+
+        Input Text:
+        {raw_text}
+        """
+
+class InvalidLayoutConfig(ValueError):
+    """C-Model 返回的 JSON 无法通过 GlobalStyleConfig 校验"""
+
+
 class LLMEngine:
     def __init__(self):
-        # 1. 初始化模型
-        self.llm = ChatOpenAI(
-            model="glm-4",
-            api_key=settings.ZHIPUAI_API_KEY,
-            base_url="https://open.bigmodel.cn/api/paas/v4/",
-            temperature=0.1,
-            model_kwargs={"response_format": {"type": "json_object"}}
-        )
-        
+        # LangChain / OpenAI SDK 较重，推迟到引擎首次使用时导入
+        from langchain_openai import ChatOpenAI
+        from langchain.prompts import ChatPromptTemplate
+
+        # 0. Prompt 模板只编译一次
+        self.layout_prompt = ChatPromptTemplate.from_template(LAYOUT_PROMPT_TEMPLATE)
+        self.polish_prompt = ChatPromptTemplate.from_template(POLISH_PROMPT_TEMPLATE)
+
+        # 1. 初始化模型 (赋值时同时组装 Chain)：C-Model 解析排版规则，B-Model 润色内容
+        # 连接池与重试由共享 HTTP 客户端负责，SDK 自身不再重试；
+        # 非 OpenAI 官方地址时 langchain 默认不请求流式 token 用量，显式开启 (流式 B-Model 调用才能计入 token 指标)
+        def chat_model(model: str):
+            return ChatOpenAI(
+                model=model,
+                api_key=settings.require_api_key(),
+                base_url=settings.OPENAI_BASE_URL,
+                temperature=0.1,
+                model_kwargs={"response_format": {"type": "json_object"}},
+                max_retries=0,
+                stream_usage=True,
+                http_client=http_pool.get_client(),
+                http_async_client=http_pool.get_async_client()
+            )
+
+        self.parse_llm = chat_model(settings.MODEL_PARSE)
+        self.polish_llm = chat_model(settings.MODEL_POLISH)
+
         # 2. 自动加载字体配置文件 (使用绝对路径修复)
         self.font_config = self._load_font_config()
+        # 字体配置版本：映射表变化后旧的 C-Model 缓存自动失效
+        self.font_config_version = hashlib.sha256(self.font_config.encode("utf-8")).hexdigest()[:16]
+
+        # 3. C-Model 响应缓存
+        self.layout_cache: Optional[LayoutResponseCache] = None
+        if settings.LAYOUT_CACHE_ENABLED:
+            self.layout_cache = LayoutResponseCache(
+                os.path.join(settings.CACHE_DIR, "layout_cache.sqlite3"),
+                max_entries=settings.LAYOUT_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.LAYOUT_CACHE_TTL_SECONDS
+            )
+
+    @property
+    def parse_llm(self):
+        return self._parse_llm
+
+    @parse_llm.setter
+    def parse_llm(self, value):
+        """替换 C-Model 时重新组装 Chain (prompt | llm | parser)"""
+        from langchain_core.output_parsers import StrOutputParser
+
+        self._parse_llm = value
+        self.layout_chain = self.layout_prompt | value | StrOutputParser()
+
+    @property
+    def polish_llm(self):
+        return self._polish_llm
+
+    @polish_llm.setter
+    def polish_llm(self, value):
+        """替换 B-Model 时重新组装 Chain"""
+        from langchain_core.output_parsers import StrOutputParser
+
+        self._polish_llm = value
+        self.polish_chain = self.polish_prompt | value | StrOutputParser()
 
     def _load_font_config(self) -> str:
         """
@@ -60,59 +178,137 @@ class LLMEngine:
             logger.error(f"Failed to load font config: {e}")
             return "Error loading font mapping."
 
-    def parse_layout_config(self, context: str, user_prompt: str) -> Dict[str, Any]:
+    @staticmethod
+    def _strip_code_fence(response_str: str) -> str:
+        """去掉模型偶尔包裹的 ```json ... ``` 代码围栏"""
+        cleaned_response = response_str.strip()
+        if cleaned_response.startswith("```json"):
+            cleaned_response = cleaned_response[7:]
+        if cleaned_response.endswith("```"):
+            cleaned_response = cleaned_response[:-3]
+        return cleaned_response
+
+    @staticmethod
+    def _parse_blocks(response_str: str, raw_text: str) -> List[Dict[str, Any]]:
+        """将 B-Model 的 JSON 输出解析为块列表，结构不符时退化为单个正文块"""
+        data = json.loads(LLMEngine._strip_code_fence(response_str))
+
+        if isinstance(data, list):
+            return data
+        elif isinstance(data, dict) and "blocks" in data:
+            return data["blocks"]
+        else:
+            return [{"type": "body_text", "text": raw_text}]
+
+    @staticmethod
+    def _model_label(llm) -> str:
+        return getattr(llm, "model_name", type(llm).__name__)
+
+    @property
+    def parse_model_label(self) -> str:
+        """C-Model 的实际模型名 (响应缓存 Key、编译档案指纹与指标标签共用)"""
+        return self._model_label(self.parse_llm)
+
+    @property
+    def polish_model_label(self) -> str:
+        """B-Model 的实际模型名 (指标标签)"""
+        return self._model_label(self.polish_llm)
+
+    @staticmethod
+    def _fallback_reason(error: Exception) -> str:
+        if isinstance(error, json.JSONDecodeError):
+            return "invalid_json"
+        if isinstance(error, InvalidLayoutConfig):
+            return "invalid_schema"
+        return "call_failed"
+
+    def _load_layout_config(self, response_str: str) -> Dict[str, Any]:
+        """解析并校验 C-Model 输出：必须是能与默认配置合并为 GlobalStyleConfig 的对象，校验通过才允许写入缓存"""
+        config = json.loads(self._strip_code_fence(response_str))
+        if not isinstance(config, dict):
+            raise InvalidLayoutConfig(f"Expected a JSON object, got {type(config).__name__}")
+        try:
+            MergerEngine.merge(rag_extracted_dict=config)
+        except Exception as e:
+            raise InvalidLayoutConfig(str(e)) from e
+        return config
+
+    def _layout_cache_key(self, inputs: Dict[str, str], use_cache: bool) -> Optional[str]:
+        """计算 C-Model 缓存 Key；缓存关闭或调用方要求绕过时返回 None"""
+        if not use_cache or self.layout_cache is None:
+            return None
+        return LayoutResponseCache.make_key(
+            self.layout_prompt.format(**inputs),
+            self.parse_model_label,
+            self.font_config_version
+        )
+
+    def parse_layout_config(self, context: str, user_prompt: str, use_cache: bool = True) -> Dict[str, Any]:
         """
         C-Model: 提取排版参数
+        use_cache=False 时绕过响应缓存，强制请求模型
         """
         logger.debug("Calling C-Model for Layout Parsing...")
-        
-        prompt_template = """
-        You are an expert academic formatting engine. Extract style rules based on the context and user request.
-        
-        Context from Rule Manual:
-        {context}
-
-        User Request:
-        {user_prompt}
 
-        Task: Return a JSON object defining the style rules.
+        chain = self.layout_chain
+        inputs = {
+            "context": context,
+            "user_prompt": user_prompt,
+            "font_mapping_context": self.font_config
+        }
 
-        *** FONT & SIZE MAPPING TABLE (CRITICAL) ***
-        Please STRICTLY refer to the following JSON table for converting Chinese names to System codes:
+        cache_key = self._layout_cache_key(inputs, use_cache)
+        if cache_key:
+            cached = self.layout_cache.get(cache_key)
+            metrics.record_cache("layout", hits=int(cached is not None), misses=int(cached is None))
+            if cached is not None:
+                logger.debug("C-Model cache hit")
+                return cached
         
-        {font_mapping_context}
-
-        *** RULE FOR UNKNOWN FONTS ***
-        If the user asks for a font NOT in the table above, output its English name directly (e.g., "Helvetica").
+        try:
+            with metrics.track_call("c_model", self.parse_model_label) as call:
+                response_str = chain.invoke(inputs, config=call.config)
+            config = self._load_layout_config(response_str)
+            if cache_key:
+                self.layout_cache.put(cache_key, config)
+            return config
+        except Exception as e:
+            logger.error(f"Layout Parsing failed: {e}")
+            metrics.record_fallback("c_model", self._fallback_reason(e))
+            return {}
 
-        Format example:
-        {{
-            "heading_1": {{ "font_name": "SimHei", "font_size": 16.0, "align": "CENTER", "line_spacing": 1.5, "is_bold": true }},
-            "body_text": {{ "font_name": "KaiTi", "font_size": 12.0, "align": "JUSTIFY", "line_spacing": 1.5 }}
-        }}
-        
-        Return ONLY valid JSON.
+    async def aparse_layout_config(self, context: str, user_prompt: str, use_cache: bool = True) -> Dict[str, Any]:
         """
-        
-        prompt = ChatPromptTemplate.from_template(prompt_template)
-        chain = prompt | self.llm | StrOutputParser()
-        
+        C-Model (async): 与 parse_layout_config 等价，基于 ainvoke，不阻塞事件循环
+        """
+        logger.debug("Calling C-Model for Layout Parsing (async)...")
+
+        chain = self.layout_chain
+        inputs = {
+            "context": context,
+            "user_prompt": user_prompt,
+            "font_mapping_context": self.font_config
+        }
+
+        cache_key = self._layout_cache_key(inputs, use_cache)
+        if cache_key:
+            cached = await run_blocking(self.layout_cache.get, cache_key)
+            metrics.record_cache("layout", hits=int(cached is not None), misses=int(cached is None))
+            if cached is not None:
+                logger.debug("C-Model cache hit")
+                return cached
+
         try:
-            response_str = chain.invoke({
-                "context": context, 
-                "user_prompt": user_prompt,
-                "font_mapping_context": self.font_config
-            })
-            
-            cleaned_response = response_str.strip()
-            if cleaned_response.startswith("```json"):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-                
-            return json.loads(cleaned_response)
+            async with get_llm_limiter():
+                with metrics.track_call("c_model", self.parse_model_label) as call:
+                    response_str = await chain.ainvoke(inputs, config=call.config)
+            config = self._load_layout_config(response_str)
+            if cache_key:
+                await run_blocking(self.layout_cache.put, cache_key, config)
+            return config
         except Exception as e:
             logger.error(f"Layout Parsing failed: {e}")
+            metrics.record_fallback("c_model", self._fallback_reason(e))
             return {}
 
     def polish_content(self, raw_text: str, rules: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
@@ -120,50 +316,179 @@ class LLMEngine:
         B-Model: 结构化润色
         """
         logger.debug("Calling B-Model for Polishing...")
-        
-        prompt_template = """
-        You are an academic paper formatting assistant. Your task is to split the input text into logical blocks.
 
-        Rules:
-        1. Identify headings, captions, and body text.
-        2. **CRITICAL**: Escape double quotes inside text with backslash (\\"). Example: "She said \\"Hello\\""
-        3. Return ONLY valid JSON.
+        chain = self.polish_chain
 
-        Output JSON format:
-        {{
-            "blocks": [
-                {{ "type": "heading_1", "text": "Chapter 1" }},
-                {{ "type": "body_text", "text": "Content here..." }}
-            ]
-        }}
+        try:
+            with metrics.track_call("b_model", self.polish_model_label) as call:
+                response_str = chain.invoke({"raw_text": raw_text}, config=call.config)
+            return self._parse_blocks(response_str, raw_text)
+        except Exception as e:
+            logger.error(f"LLM Polishing failed (returning raw text): {e}")
+            metrics.record_fallback("b_model", "raw_text")
+            return [{"type": "body_text", "text": raw_text}]
 
-        Input Text:
-        {raw_text}
+    async def apolish_content(self, raw_text: str, rules: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        B-Model (async): 与 polish_content 等价，基于 ainvoke，不阻塞事件循环
         """
+        logger.debug("Calling B-Model for Polishing (async)...")
 
-        prompt = ChatPromptTemplate.from_template(prompt_template)
-        chain = prompt | self.llm | StrOutputParser()
+        chain = self.polish_chain
 
         try:
-            response_str = chain.invoke({"raw_text": raw_text})
-            
-            cleaned_response = response_str.strip()
-            if cleaned_response.startswith("```json"):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-
-            data = json.loads(cleaned_response)
-            
-            if isinstance(data, list):
-                return data
-            elif isinstance(data, dict) and "blocks" in data:
-                return data["blocks"]
-            else:
-                return [{"type": "body_text", "text": raw_text}]
-
+            async with get_llm_limiter():
+                with metrics.track_call("b_model", self.polish_model_label) as call:
+                    response_str = await chain.ainvoke({"raw_text": raw_text}, config=call.config)
+            return self._parse_blocks(response_str, raw_text)
         except Exception as e:
             logger.error(f"LLM Polishing failed (returning raw text): {e}")
+            metrics.record_fallback("b_model", "raw_text")
             return [{"type": "body_text", "text": raw_text}]
 
-llm_engine = LLMEngine()
\ No newline at end of file
+    async def apolish_content_chunked(self, raw_text: str, on_window_done: Optional[WindowCallback] = None) -> List[ContentBlock]:
+        """
+        B-Model (分窗并发): 按段落/标题边界切成 token 预算内的窗口并发润色，
+        结果按原顺序拼回 ContentBlock。单个窗口失败只重试/降级该窗口。
+        on_window_done 在每个窗口完成时回调，用于进度上报。
+        """
+        windows = split_into_windows(raw_text, settings.POLISH_CHUNK_TOKENS)
+        logger.debug(f"Calling B-Model for Polishing ({len(windows)} windows)...")
+
+        chain = self.polish_chain
+        fanout = asyncio.Semaphore(settings.POLISH_CHUNK_CONCURRENCY)
+
+        async def polish_window(index: int, window: str) -> List[ContentBlock]:
+            started = time.perf_counter()
+            blocks = None
+            async with fanout:
+                for attempt in range(settings.POLISH_CHUNK_RETRIES + 1):
+                    try:
+                        async with get_llm_limiter():
+                            with metrics.track_call("b_model", self.polish_model_label) as call:
+                                response_str = await chain.ainvoke({"raw_text": window}, config=call.config)
+                        blocks = [ContentBlock(**block) for block in self._parse_blocks(response_str, window)]
+                        break
+                    except Exception as e:
+                        logger.warning(f"Polishing window {index} failed (attempt {attempt + 1}): {e}")
+                        if attempt < settings.POLISH_CHUNK_RETRIES:
+                            metrics.record_retry("b_model", self._fallback_reason(e))
+
+            if blocks is None:
+                logger.error(f"Polishing window {index} gave up, falling back to local segmentation")
+                metrics.record_fallback("b_model", "local_segmentation")
+                blocks = [segment.block for segment in structural_segmenter.segment(window)]
+            if on_window_done is not None:
+                await on_window_done(
+                    index=index, windows=len(windows), blocks=len(blocks),
+                    duration_ms=round((time.perf_counter() - started) * 1000, 1)
+                )
+            return blocks
+
+        results = await asyncio.gather(*(polish_window(i, w) for i, w in enumerate(windows)))
+        return [block for window_blocks in results for block in window_blocks]
+
+    async def astructure_content(self, raw_text: str, on_window_done: Optional[WindowCallback] = None) -> List[ContentBlock]:
+        """
+        本地结构识别 + B-Model 补位：
+        高置信片段 (Markdown 标题、章节编号、图表题注等) 直接成块，只有低置信片段送去润色。
+        """
+        plan = structural_segmenter.plan(structural_segmenter.segment(raw_text))
+        spans = [item for item in plan if isinstance(item, str)]
+        logger.debug(f"Segmenter left {len(spans)} low-confidence spans for the B-Model")
+        if not spans:
+            return list(plan)
+
+        polished = iter(await asyncio.gather(*(self.apolish_content_chunked(span, on_window_done) for span in spans)))
+        blocks: List[ContentBlock] = []
+        for item in plan:
+            if isinstance(item, str):
+                blocks.extend(next(polished))
+            else:
+                blocks.append(item)
+        return blocks
+
+    @staticmethod
+    def _to_content_block(data: Dict[str, Any]) -> ContentBlock:
+        """流式块的容错转换：类型非法时按正文处理，不丢文字"""
+        try:
+            return ContentBlock(**data)
+        except Exception:
+            return ContentBlock(type=ContentType.BODY_TEXT, text=str(data.get("text", "")))
+
+    async def astream_content_blocks(self, raw_text: str, on_window_done: Optional[WindowCallback] = None) -> AsyncIterator[ContentBlock]:
+        """
+        B-Model (流式): 基于模型 token 流 + 增量 JSON 解析，每闭合一个块就立即产出。
+        各窗口并发生成、按原顺序产出；窗口在产出任何块之前失败可重试，最终降级为本地分段。
+        """
+        windows = split_into_windows(raw_text, settings.POLISH_CHUNK_TOKENS)
+        logger.debug(f"Streaming B-Model Polishing ({len(windows)} windows)...")
+
+        chain = self.polish_chain
+        fanout = asyncio.Semaphore(settings.POLISH_CHUNK_CONCURRENCY)
+        queues = [asyncio.Queue() for _ in windows]
+
+        async def stream_window(index: int, window: str):
+            queue = queues[index]
+            emitted = 0
+            started = time.perf_counter()
+            try:
+                async with fanout:
+                    for attempt in range(settings.POLISH_CHUNK_RETRIES + 1):
+                        parser = IncrementalBlockParser()
+                        try:
+                            async with get_llm_limiter():
+                                with metrics.track_call("b_model", self.polish_model_label) as call:
+                                    async for token in chain.astream({"raw_text": window}, config=call.config):
+                                        for data in parser.feed(token):
+                                            queue.put_nowait(self._to_content_block(data))
+                                            emitted += 1
+                            if emitted:
+                                break
+                            logger.warning(f"Streaming window {index} produced no blocks (attempt {attempt + 1})")
+                            reason = "empty_stream"
+                        except Exception as e:
+                            if emitted:
+                                # 已产出的块无法撤回，保留部分结果
+                                logger.error(f"Streaming window {index} broke after {emitted} blocks: {e}")
+                                metrics.record_fallback("b_model", "partial_stream")
+                                break
+                            logger.warning(f"Streaming window {index} failed (attempt {attempt + 1}): {e}")
+                            reason = self._fallback_reason(e)
+                        if attempt < settings.POLISH_CHUNK_RETRIES:
+                            metrics.record_retry("b_model", reason)
+
+                if not emitted:
+                    logger.error(f"Streaming window {index} gave up, falling back to local segmentation")
+                    metrics.record_fallback("b_model", "local_segmentation")
+                    for segment in structural_segmenter.segment(window):
+                        queue.put_nowait(segment.block)
+                        emitted += 1
+                if on_window_done is not None:
+                    await on_window_done(
+                        index=index, windows=len(windows), blocks=emitted,
+                        duration_ms=round((time.perf_counter() - started) * 1000, 1)
+                    )
+            finally:
+                queue.put_nowait(None)
+
+        tasks = [asyncio.create_task(stream_window(i, w)) for i, w in enumerate(windows)]
+        try:
+            for queue in queues:
+                while (block := await queue.get()) is not None:
+                    yield block
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream_structured_content(self, raw_text: str, on_window_done: Optional[WindowCallback] = None) -> AsyncIterator[ContentBlock]:
+        """astructure_content 的流式版本：高置信块立即产出，低置信片段走流式 B-Model"""
+        plan = structural_segmenter.plan(structural_segmenter.segment(raw_text))
+        for item in plan:
+            if isinstance(item, str):
+                async for block in self.astream_content_blocks(item, on_window_done):
+                    yield block
+            else:
+                yield item
+
+llm_engine: LLMEngine = LazySingleton(LLMEngine, "llm_engine")
\ No newline at end of file
@@ -1,42 +1,141 @@
-from typing import List
-# 使用 OpenAI 适配器连接智谱 Embedding
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
 
 from app.core.config import settings
+from app.core.executor import run_blocking
+from app.core.lazy import LazySingleton
+from app.core.metrics import metrics
+from app.services.storage import rule_manifest_store
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+# (school_id, query, k, 清单入库时间, 本进程集合版本)
+CacheKey = Tuple[str, str, int, float, int]
 
 class RAGEngine:
     def __init__(self):
-        # 初始化 Embedding (智谱 embedding-3)
-        self.embedding_function = OpenAIEmbeddings(
-            model=settings.MODEL_EMBED,         
-            openai_api_key=settings.ZHIPUAI_API_KEY,
-            openai_api_base=settings.OPENAI_BASE_URL,
-            check_embedding_ctx_length=False
-        )
+        # Chroma / Embedding 客户端较重，推迟到引擎首次使用时导入
+        from langchain_chroma import Chroma
+        from app.engine.embeddings import build_embeddings
+
+        # 初始化 Embedding (默认智谱 embedding-3，带持久化缓存与批处理)
+        self.embedding_function = build_embeddings()
         
-        # 初始化 ChromaDB (本地持久化)
+        # 初始化 ChromaDB (本地持久化)；不同后端向量维度不同，非默认后端使用独立集合
+        collection_name = "school_rules"
+        if settings.EMBED_BACKEND != "zhipu":
+            collection_name = f"school_rules_{settings.EMBED_BACKEND}"
         self.vector_store = Chroma(
-            collection_name="school_rules",
+            collection_name=collection_name,
             embedding_function=self.embedding_function,
             persist_directory=settings.CHROMA_PERSIST_DIRECTORY
         )
 
-    def add_documents(self, documents: List[Document], school_id: str):
-        """添加文档并打上 school_id 标签"""
+        # 检索结果缓存：规则集只在入库/删除时变化。本进程的写操作递增集合版本使旧结果失效；
+        # 其他 worker 进程的入库通过共享的入库清单 (ingested_at) 体现在 Key 中
+        self.version = 0
+        self.retrieval_hits = 0
+        self.retrieval_misses = 0
+        self._retrieval_cache: "OrderedDict[CacheKey, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _bump_version(self):
+        with self._cache_lock:
+            self.version += 1
+            self._retrieval_cache.clear()
+
+    def _cache_key(self, query: str, school_id: str, k: int) -> CacheKey:
+        """读取共享入库清单 (SQLite 主键查询)，清单变化后旧 Key 不再命中"""
+        manifest = rule_manifest_store.get(school_id)
+        return (school_id, query, k, manifest.ingested_at if manifest else 0.0, self.version)
+
+    def _cache_get(self, key: CacheKey) -> Optional[str]:
+        with self._cache_lock:
+            value = self._retrieval_cache.get(key)
+            if value is None:
+                self.retrieval_misses += 1
+            else:
+                self._retrieval_cache.move_to_end(key)
+                self.retrieval_hits += 1
+        metrics.record_cache("retrieval", hits=int(value is not None), misses=int(value is None))
+        return value
+
+    def _cache_put(self, key: CacheKey, value: str):
+        if settings.RETRIEVAL_CACHE_SIZE <= 0:
+            return
+        with self._cache_lock:
+            # 检索期间版本已变化：结果可能过期，不缓存
+            if key[-1] != self.version:
+                return
+            self._retrieval_cache[key] = value
+            while len(self._retrieval_cache) > settings.RETRIEVAL_CACHE_SIZE:
+                self._retrieval_cache.popitem(last=False)
+
+    def add_documents(self, documents: List["Document"], school_id: str, ids: Optional[List[str]] = None):
+        """添加文档并打上 school_id 标签；传入 ids 时以其作为向量 ID (重复入库会覆盖而不是追加)"""
         for doc in documents:
             doc.metadata["school_id"] = school_id
-        self.vector_store.add_documents(documents)
+        self.vector_store.add_documents(documents, ids=ids)
+        self._bump_version()
+
+    def get_ids(self, school_id: str) -> Set[str]:
+        """某学校在向量库中的全部切片 ID (不取向量和正文)"""
+        return set(self.vector_store.get(where={"school_id": school_id}, include=[])["ids"])
+
+    def delete_documents(self, ids: List[str]):
+        if ids:
+            self.vector_store.delete(ids=ids)
+            self._bump_version()
 
     def search_rules(self, query: str, school_id: str, k: int = 4) -> str:
         """检索特定学校的规则"""
+        key = self._cache_key(query, school_id, k)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
         results = self.vector_store.similarity_search(
             query, 
             k=k,
             filter={"school_id": school_id}
         )
-        return "\n\n".join([doc.page_content for doc in results])
+        context = "\n\n".join([doc.page_content for doc in results])
+        self._cache_put(key, context)
+        return context
+
+    async def asearch_rules(self, query: str, school_id: str, k: int = 4) -> str:
+        """
+        检索特定学校的规则 (async)。
+        命中检索缓存时直接返回；否则 Query 向量化走原生 aembed_query (命中缓存时无网络往返)，
+        本地 Chroma 检索放进线程池。
+        """
+        key = await run_blocking(self._cache_key, query, school_id, k)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        query_embedding = await self.embedding_function.aembed_query(query)
+        results = await run_blocking(
+            self.vector_store.similarity_search_by_vector,
+            query_embedding,
+            k=k,
+            filter={"school_id": school_id}
+        )
+        context = "\n\n".join([doc.page_content for doc in results])
+        self._cache_put(key, context)
+        return context
+
+    def retrieval_stats(self) -> Dict[str, Any]:
+        total = self.retrieval_hits + self.retrieval_misses
+        return {
+            "hits": self.retrieval_hits,
+            "misses": self.retrieval_misses,
+            "hit_rate": round(self.retrieval_hits / total, 4) if total else 0.0,
+            "entries": len(self._retrieval_cache),
+            "version": self.version,
+        }
     
     def as_retriever(self, school_id: str):
         """暴露给 LangChain Chain 使用"""
@@ -45,4 +144,4 @@ class RAGEngine:
         )
 
 # 单例导出
-rag_engine = RAGEngine() 
+rag_engine: RAGEngine = LazySingleton(RAGEngine, "rag_engine") 
@@ -1,11 +1,42 @@
 import os
+import re
+import tempfile
 from docx import Document
 from docx.shared import Pt, RGBColor, Inches
+from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
+from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from typing import Tuple
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from app.models.schema import DocumentDSL, ContentType, FontStyle, Alignment
+from app.core.config import settings
+from app.core.merger import MergerEngine
+from app.models.schema import DocumentDSL, ContentBlock, ContentType, FontStyle, Alignment, GlobalStyleConfig
+
+# 样式表模式下 GlobalStyleConfig 各条目对应的 Word 段落样式 (名称, 大纲级别)
+NAMED_STYLES = {
+    ContentType.HEADING_1: ("APF Heading 1", 0),
+    ContentType.HEADING_2: ("APF Heading 2", 1),
+    ContentType.HEADING_3: ("APF Heading 3", 2),
+    ContentType.BODY_TEXT: ("APF Body Text", None),
+    ContentType.CAPTION: ("APF Caption", None),
+}
+
+TEXT_BLOCK_TYPES = (ContentType.HEADING_1, ContentType.HEADING_2, ContentType.HEADING_3, ContentType.BODY_TEXT, ContentType.CAPTION)
+
+# Markdown 表格的分隔行 (|---|:---:|)
+TABLE_SEPARATOR_PATTERN = re.compile(r"^[\s|:\-]+$")
+
+
+@lru_cache(maxsize=settings.STYLE_OVERRIDE_CACHE_SIZE)
+def _style_delta(base_style: Optional[FontStyle], active_style: FontStyle) -> Optional[FontStyle]:
+    """已解析样式中与命名样式不同的字段；完全相同时返回 None"""
+    changed = {
+        field: value for field, value in active_style.model_dump().items()
+        if value is not None and value != getattr(base_style, field, None)
+    }
+    return FontStyle(**changed) if changed else None
 
 class DocxRenderer:
     """
@@ -25,108 +56,234 @@ class DocxRenderer:
         except:
             return (0, 0, 0)
 
-    def _apply_paragraph_format(self, paragraph, style: FontStyle):
-        """应用段落级样式 (对齐、缩进、行距)"""
+    def _apply_paragraph_format(self, paragraph_format, style: FontStyle):
+        """应用段落级样式 (对齐、缩进、行距)；段落与段落样式共用同一套 ParagraphFormat 接口"""
         if not style:
             return
 
         # 1. 对齐
         if style.align == Alignment.CENTER:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
         elif style.align == Alignment.RIGHT:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+            paragraph_format.alignment = WD_ALIGN_PARAGRAPH.RIGHT
         elif style.align == Alignment.JUSTIFY:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+            paragraph_format.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
         elif style.align == Alignment.LEFT:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+            paragraph_format.alignment = WD_ALIGN_PARAGRAPH.LEFT
 
         # 2. 行距
         if style.line_spacing:
-            paragraph.paragraph_format.line_spacing = style.line_spacing
+            paragraph_format.line_spacing = style.line_spacing
         
         # 3. 段间距
         if style.space_before:
-            paragraph.paragraph_format.space_before = Pt(style.space_before)
+            paragraph_format.space_before = Pt(style.space_before)
         if style.space_after:
-            paragraph.paragraph_format.space_after = Pt(style.space_after)
+            paragraph_format.space_after = Pt(style.space_after)
 
-    def _apply_run_format(self, run, style: FontStyle):
-        """应用字符级样式 (字体、大小、颜色、粗体)"""
+    def _apply_font_format(self, font, element, style: FontStyle):
+        """
+        应用字符级样式 (字体、大小、颜色、粗体)。
+        element 为承载 rPr 的 XML 节点 (w:r 或 w:style)，用于写入东亚字体。
+        """
         if not style:
             return
 
         # 1. 字体大小
         if style.size:
-            run.font.size = Pt(style.size)
+            font.size = Pt(style.size)
 
         # 2. 粗体/斜体
         if style.bold is not None:
-            run.font.bold = style.bold
+            font.bold = style.bold
         if style.italic is not None:
-            run.font.italic = style.italic
+            font.italic = style.italic
 
         # 3. 颜色
         if style.color:
-            run.font.color.rgb = RGBColor(*self._hex_to_rgb(style.color))
+            font.color.rgb = RGBColor(*self._hex_to_rgb(style.color))
 
         # 4. 字体设置 (核心：中西文兼容)
         if style.family:
-            run.font.name = style.family
+            font.name = style.family
             # 强制设置东亚字体 (针对中文)
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), style.family)
+            element.get_or_add_rPr().get_or_add_rFonts().set(qn('w:eastAsia'), style.family)
+
+    def _apply_run_format(self, run, style: FontStyle):
+        """应用字符级样式到单个 Run"""
+        self._apply_font_format(run.font, run._element, style)
+
+    def _build_style_sheet(self, doc, style_config: GlobalStyleConfig) -> Dict[ContentType, str]:
+        """
+        样式表模式：每个 GlobalStyleConfig 条目在 styles.xml 中生成一个命名段落样式，每篇文档只建一次。
+        global_default 写入 Normal，其余样式以 Normal 为基准继承。
+        """
+        normal = doc.styles["Normal"]
+        default_style = style_config.global_default
+        self._apply_paragraph_format(normal.paragraph_format, default_style)
+        self._apply_font_format(normal.font, normal.element, default_style)
+
+        style_sheet = {}
+        for content_type, (style_name, outline_level) in NAMED_STYLES.items():
+            # 重排已由本引擎生成过的文档时，旧的同名样式整体替换
+            existing = next((s for s in doc.styles if s.name == style_name), None)
+            if existing is not None:
+                doc.styles.element.remove(existing.element)
+            paragraph_style = doc.styles.add_style(style_name, WD_STYLE_TYPE.PARAGRAPH)
+            paragraph_style.base_style = normal
+            paragraph_style.quick_style = True
+
+            font_style = getattr(style_config, content_type.value, None)
+            self._apply_paragraph_format(paragraph_style.paragraph_format, font_style)
+            self._apply_font_format(paragraph_style.font, paragraph_style.element, font_style)
+
+            # 标题写入大纲级别，Word 导航窗格与自动目录可直接识别
+            if outline_level is not None:
+                outline = OxmlElement('w:outlineLvl')
+                outline.set(qn('w:val'), str(outline_level))
+                paragraph_style.element.get_or_add_pPr().insert_element_before(
+                    outline, 'w:divId', 'w:cnfStyle', 'w:rPr', 'w:sectPr', 'w:pPrChange'
+                )
+            style_sheet[content_type] = paragraph_style.style_id
+        return style_sheet
+
+    def _render_image_hook(self, doc, block):
+        # 简单处理图片占位符
+        p = doc.add_paragraph()
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = p.add_run(f"[图片占位符: {block.source_data}]")
+        run.font.color.rgb = RGBColor(255, 0, 0)
+
+    def _render_table_hook(self, doc, block):
+        """表格块：text 每行一行、单元格以 | 分隔 (与草稿加载器输出的表格文本一致)；无内容时输出占位符"""
+        rows = [
+            [cell.strip() for cell in line.strip().strip("|").split("|")]
+            for line in block.text.splitlines()
+            if line.strip() and not TABLE_SEPARATOR_PATTERN.match(line)
+        ]
+        if not rows:
+            p = doc.add_paragraph()
+            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            run = p.add_run(f"[表格占位符: {block.source_data}]")
+            run.font.color.rgb = RGBColor(255, 0, 0)
+            return
+        table = doc.add_table(rows=len(rows), cols=max(len(cells) for cells in rows))
+        table.style = "Table Grid"
+        for row, cells in zip(table.rows, rows):
+            for cell, text in zip(row.cells, cells):
+                cell.text = text
+
+    def _render_text_named(self, doc, block: ContentBlock, style_sheet: Dict[ContentType, str], style_config: GlobalStyleConfig):
+        """
+        样式表模式：块只引用样式 ID。
+        有 style_override 时与直接格式模式解析出同一个样式，只把与命名样式不同的字段写成直接格式。
+        """
+        p = doc.add_paragraph()
+        # 直接写 w:pStyle，跳过 python-docx 按样式名逐次扫描 styles.xml 的查找
+        p._p.style = style_sheet[block.type]
+        run = p.add_run(block.text)
+        if block.style_override:
+            base_style = getattr(style_config, block.type.value, None)
+            delta = _style_delta(base_style, MergerEngine.resolve_block_style(base_style, block.style_override))
+            if delta:
+                self._apply_paragraph_format(p.paragraph_format, delta)
+                self._apply_run_format(run, delta)
+
+    def _render_text_direct(self, doc, block: ContentBlock, style_config: GlobalStyleConfig):
+        """直接格式模式：逐段落、逐 Run 写入完整格式"""
+        # --- 确定当前块使用的样式 ---
+        # 逻辑：Global Style < Override Style
+        
+        # 1. 获取该类型的全局默认样式
+        base_style = getattr(style_config, block.type.value, None)
+        
+        # 2. 检查是否有块级覆盖 (User Override specific block)
+        # 相同覆盖共享同一个已解析样式，不再逐块重新合并
+        active_style = MergerEngine.resolve_block_style(base_style, block.style_override)
+
+        # --- 执行渲染 ---
+        # 创建段落
+        p = doc.add_paragraph()
+        # 应用段落样式
+        if active_style:
+            self._apply_paragraph_format(p.paragraph_format, active_style)
+        
+        # 添加文字 Run
+        run = p.add_run(block.text)
+        # 应用文字样式
+        if active_style:
+            self._apply_run_format(run, active_style)
+
+    def _render_block(self, doc, block: ContentBlock, render_text: Callable[[Any, ContentBlock], None]):
+        """按块类型分发：文字块交给当前模式 (样式表 / 直接格式) 的 render_text，其余块类型两种模式共用"""
+        if block.type in TEXT_BLOCK_TYPES:
+            render_text(doc, block)
+
+        elif block.type == ContentType.IMAGE_HOOK:
+            self._render_image_hook(doc, block)
+
+        elif block.type == ContentType.TABLE_HOOK:
+            self._render_table_hook(doc, block)
+
+    def open_session(self, style_config: GlobalStyleConfig) -> "RenderSession":
+        """开启增量渲染会话：块可以边到达边写入"""
+        return RenderSession(self, style_config)
 
     def render(self, dsl: DocumentDSL, output_path: str) -> str:
         """
         渲染入口函数。
         """
-        doc = Document()
-
-        # 遍历 DSL 中的每一个内容块
-        for block in dsl.content_blocks:
-            
-            # --- 确定当前块使用的样式 ---
-            # 逻辑：Global Style < Override Style
-            
-            # 1. 获取该类型的全局默认样式
-            base_style = getattr(dsl.style_config, block.type.value, None)
-            
-            # 2. 检查是否有块级覆盖 (User Override specific block)
-            active_style = base_style
-            if block.style_override:
-                # 这里做一个简单的属性覆盖合并 (浅层)
-                # 实际生产中可以使用 MergerEngine._deep_update
-                if active_style:
-                    # 复制一份以免修改全局配置
-                    active_style = active_style.model_copy(update=block.style_override.model_dump(exclude_unset=True))
-                else:
-                    active_style = block.style_override
-
-            # --- 执行渲染 ---
-            if block.type in [ContentType.HEADING_1, ContentType.HEADING_2, ContentType.HEADING_3, ContentType.BODY_TEXT, ContentType.CAPTION]:
-                # 创建段落
-                p = doc.add_paragraph()
-                # 应用段落样式
-                if active_style:
-                    self._apply_paragraph_format(p, active_style)
-                
-                # 添加文字 Run
-                run = p.add_run(block.text)
-                # 应用文字样式
-                if active_style:
-                    self._apply_run_format(run, active_style)
-            
-            elif block.type == ContentType.IMAGE_HOOK:
-                # 简单处理图片占位符
-                p = doc.add_paragraph()
-                p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                run = p.add_run(f"[图片占位符: {block.source_data}]")
-                run.font.color.rgb = RGBColor(255, 0, 0)
-            
-            # TODO: 实现 Table Hook
+        session = self.open_session(dsl.style_config)
+        session.add_blocks(dsl.content_blocks)
 
         # 保存文件
-        doc.save(output_path)
+        return session.save(output_path)
+
+    def render_to_buffer(self, dsl: DocumentDSL) -> Tuple[tempfile.SpooledTemporaryFile, int]:
+        """
+        内存渲染：写入 SpooledTemporaryFile (超过 RENDER_SPOOL_MAX_BYTES 才溢出到临时文件)。
+        返回 (已 seek 到开头的缓冲区, 字节数)，调用方负责关闭。
+        """
+        session = self.open_session(dsl.style_config)
+        session.add_blocks(dsl.content_blocks)
+        return session.to_buffer()
+
+
+class RenderSession:
+    """
+    增量渲染会话：持有一个正在构建的 Document。
+    流水线模式下 B-Model 每闭合一个块就调用 add_block，文档随生成进度同步成形。
+    """
+
+    def __init__(self, renderer: DocxRenderer, style_config: GlobalStyleConfig):
+        self.renderer = renderer
+        self.style_config = style_config
+        self.doc = Document()
+        self.block_count = 0
+        if settings.RENDER_NAMED_STYLES:
+            style_sheet = renderer._build_style_sheet(self.doc, style_config)
+            self._render_text = partial(renderer._render_text_named, style_sheet=style_sheet, style_config=style_config)
+        else:
+            self._render_text = partial(renderer._render_text_direct, style_config=style_config)
+
+    def add_block(self, block: ContentBlock):
+        self.renderer._render_block(self.doc, block, self._render_text)
+        self.block_count += 1
+
+    def add_blocks(self, blocks: List[ContentBlock]):
+        for block in blocks:
+            self.add_block(block)
+
+    def save(self, output_path: str) -> str:
+        self.doc.save(output_path)
         return output_path
 
+    def to_buffer(self) -> Tuple[tempfile.SpooledTemporaryFile, int]:
+        buffer = tempfile.SpooledTemporaryFile(max_size=settings.RENDER_SPOOL_MAX_BYTES)
+        self.doc.save(buffer)
+        size = buffer.tell()
+        buffer.seek(0)
+        return buffer, size
+
 # 单例导出
 renderer = DocxRenderer() 
@@ -0,0 +1,166 @@
+import logging
+import tempfile
+import zipfile
+from typing import Dict, Optional, Tuple
+
+from docx import Document
+from docx.opc.exceptions import PackageNotFoundError
+from docx.oxml.ns import qn
+from lxml import etree
+
+from app.core.config import settings
+from app.core.merger import MergerEngine
+from app.engine.renderer import DocxRenderer, renderer
+from app.engine.segmenter import structural_segmenter
+from app.engine.source_loader import InvalidDocxError, classify_paragraph, paragraph_text, parse_styles
+from app.models.schema import ContentType, FontStyle, GlobalStyleConfig
+
+logger = logging.getLogger(__name__)
+
+# 与命名样式冲突、需要清除的段落直接格式 (对齐、行距/段距)；编号、缩进、分节符等保持不变
+_PARAGRAPH_OVERRIDES = (qn('w:jc'), qn('w:spacing'))
+# 命名样式设置的字体槽位 (font.name 写 ascii/hAnsi，另写 eastAsia)；主题字体优先级更高，一并清除。
+# 只清与目标样式冲突的槽位，复杂文种 (cs) 等其余属性保持不变
+_FONT_SLOTS = (
+    (qn('w:ascii'), qn('w:asciiTheme')),
+    (qn('w:hAnsi'), qn('w:hAnsiTheme')),
+    (qn('w:eastAsia'), qn('w:eastAsiaTheme')),
+)
+_SIZE_OVERRIDES = (qn('w:sz'), qn('w:szCs'))
+# 符号、公式、代码字体承载内容本身，重排时保留
+_PRESERVED_FONTS = {
+    "symbol", "wingdings", "wingdings 2", "wingdings 3", "webdings", "mt extra", "cambria math",
+    "consolas", "courier", "courier new", "lucida console", "menlo", "monaco", "source code pro",
+    "dejavu sans mono",
+}
+# 标题 / 题注整段由样式决定粗斜体；正文中的局部加粗、斜体属于内容，保留
+_EMPHASIS_OVERRIDES = (qn('w:b'), qn('w:bCs'), qn('w:i'), qn('w:iCs'))
+# 这些样式的段落由 Word 自动生成或有专门排版 (目录等)，不参与重排
+_SKIPPED_STYLE_PREFIXES = ("toc", "目录")
+
+
+class DocxRestyler:
+    """
+    原地重排：打开已写好的 .docx，识别每个正文段落的块类型，改挂学校规范对应的命名样式。
+    只改 styles.xml 与段落 / Run 的格式属性，文字、表格、图片、脚注、分节设置原样保留，不调用内容模型。
+    """
+
+    def __init__(self, renderer: DocxRenderer):
+        self.renderer = renderer
+
+    def _classify(self, paragraph, styles) -> Optional[ContentType]:
+        """样式 / 大纲级别优先，其次按文字做启发式识别；低置信一律按正文处理"""
+        content_type = classify_paragraph(paragraph, styles)
+        if content_type is not None:
+            return content_type
+        classified = structural_segmenter.classify_line(paragraph_text(paragraph))
+        if classified and classified[1] >= structural_segmenter.min_confidence:
+            return classified[0]
+        return ContentType.BODY_TEXT
+
+    def _is_skipped(self, paragraph, styles) -> bool:
+        style = paragraph.find(f"{qn('w:pPr')}/{qn('w:pStyle')}")
+        if style is None:
+            return False
+        info = styles.get(style.get(qn('w:val')))
+        return info is not None and info.name.strip().lower().startswith(_SKIPPED_STYLE_PREFIXES)
+
+    @staticmethod
+    def _is_preserved_run(rpr) -> bool:
+        """公式 (m:r)、插入符号 (w:sym) 与符号 / 代码字体的 Run 原样保留"""
+        run = rpr.getparent()
+        if run.tag == qn('m:r') or run.find(qn('w:sym')) is not None:
+            return True
+        fonts = rpr.find(qn('w:rFonts'))
+        return fonts is not None and any(
+            (fonts.get(slot) or "").strip().lower() in _PRESERVED_FONTS for slot, _ in _FONT_SLOTS
+        )
+
+    @staticmethod
+    def _clear_fonts(rpr, fonts):
+        for slot, theme_slot in _FONT_SLOTS:
+            fonts.attrib.pop(slot, None)
+            fonts.attrib.pop(theme_slot, None)
+        # 只剩 w:hint 或已无属性时整个节点移除
+        if not set(fonts.attrib) - {qn('w:hint')}:
+            rpr.remove(fonts)
+
+    def _clear_overrides(self, paragraph, content_type: ContentType, target: Optional[FontStyle]):
+        """
+        清除与目标样式冲突的直接格式：段落对齐 / 行距始终清除；
+        Run 的字体、字号、颜色仅在目标样式 (含 Normal 继承) 设置了对应属性时清除。
+        """
+        ppr = paragraph.pPr
+        if ppr is not None:
+            for child in ppr.findall("*"):
+                if child.tag in _PARAGRAPH_OVERRIDES:
+                    ppr.remove(child)
+        target = target or FontStyle()
+        run_overrides = ()
+        if target.size:
+            run_overrides += _SIZE_OVERRIDES
+        if target.color:
+            run_overrides += (qn('w:color'),)
+        if content_type != ContentType.BODY_TEXT:
+            run_overrides += _EMPHASIS_OVERRIDES
+        # 包括超链接、修订等容器内的 Run，以及段落标记自身的 rPr
+        for rpr in paragraph.iter(qn('w:rPr')):
+            if rpr.getparent().tag != qn('w:pPr') and self._is_preserved_run(rpr):
+                continue
+            for child in rpr.findall("*"):
+                if child.tag == qn('w:rFonts') and target.family:
+                    self._clear_fonts(rpr, child)
+                elif child.tag in run_overrides:
+                    rpr.remove(child)
+
+    def restyle(self, source_path: str, style_config: GlobalStyleConfig):
+        """
+        返回 (重排后的 Document, 按块类型统计的段落数)。
+        只处理正文顶层段落：表格内容随 Normal (global_default) 变化，其余不动；
+        空段落与纯图片段落跳过，保留其原有对齐。
+        """
+        doc = Document(source_path)
+        # 先记下原样式表用于分类，再写入命名样式
+        styles = parse_styles(doc.styles.element)
+        style_sheet = self.renderer._build_style_sheet(doc, style_config)
+
+        targets = {
+            content_type: MergerEngine.resolve_block_style(
+                style_config.global_default, getattr(style_config, content_type.value, None)
+            )
+            for content_type in style_sheet
+        }
+        stats: Dict[str, int] = {content_type.value: 0 for content_type in style_sheet}
+        stats["skipped"] = 0
+        for paragraph in doc.element.body.iterchildren(qn('w:p')):
+            if not paragraph_text(paragraph) or self._is_skipped(paragraph, styles):
+                stats["skipped"] += 1
+                continue
+            content_type = self._classify(paragraph, styles)
+            outline = paragraph.find(f"{qn('w:pPr')}/{qn('w:outlineLvl')}")
+            if outline is not None:
+                # 大纲级别改由命名样式提供，避免正文段落残留标题级别
+                outline.getparent().remove(outline)
+            paragraph.style = style_sheet[content_type]
+            self._clear_overrides(paragraph, content_type, targets[content_type])
+            stats[content_type.value] += 1
+        return doc, stats
+
+    def restyle_to_buffer(self, source_path: str, style_config: GlobalStyleConfig) -> Tuple[tempfile.SpooledTemporaryFile, int, Dict[str, int]]:
+        """
+        重排并写入 SpooledTemporaryFile。返回 (已 seek 到开头的缓冲区, 字节数, 段落统计)，调用方负责关闭。
+        源文件不是合法 .docx 时抛出 InvalidDocxError。
+        """
+        try:
+            doc, stats = self.restyle(source_path, style_config)
+        except (PackageNotFoundError, zipfile.BadZipFile, KeyError, etree.XMLSyntaxError) as e:
+            raise InvalidDocxError("Not a valid .docx file") from e
+        buffer = tempfile.SpooledTemporaryFile(max_size=settings.RENDER_SPOOL_MAX_BYTES)
+        doc.save(buffer)
+        size = buffer.tell()
+        buffer.seek(0)
+        return buffer, size, stats
+
+
+# 单例导出
+restyler = DocxRestyler(renderer)
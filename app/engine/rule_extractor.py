@@ -0,0 +1,153 @@
+import math
+import re
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.engine.text_splitter import is_heading_line
+
+# 手册中常见的条款标题："（一）字体"、"3.2.1 正文"、"1、页边距"
+_RULE_HEADING_PATTERN = re.compile(r"^\s*(（[一二三四五六七八九十]+）|\d+(\.\d+)+\s*\S|\d+[、.．]\s*\S)")
+
+# 词法检索的词项：中文按字二元组，其余按单词
+_CJK_RUN_PATTERN = re.compile(r"[一-鿿]+")
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9]+")
+
+
+class RuleChunk(BaseModel):
+    """排版手册切片：按章节边界切分，带所在章节与页码范围"""
+    text: str
+    section: str = ""
+    page_start: int
+    page_end: int
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """
+    提取 [start, end) 页的文本。
+    模块级函数，可直接提交到进程池 (子进程只需导入本模块和 PyPDF2)。
+    """
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def extract_pages(file_path: str, pool: Optional[Executor] = None, pages_per_task: int = 16) -> List[str]:
+    """
+    逐页提取 PDF 文本。页数超过 pages_per_task 且提供了进程池时按页段并行提取，
+    结果按页序拼回。
+    """
+    from PyPDF2 import PdfReader
+
+    page_count = len(PdfReader(file_path).pages)
+    if pool is None or page_count <= pages_per_task:
+        return extract_page_range(file_path, 0, page_count)
+
+    futures = [
+        pool.submit(extract_page_range, file_path, start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+    pages: List[str] = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def _is_rule_heading(line: str) -> bool:
+    return is_heading_line(line) or (len(line) <= 40 and bool(_RULE_HEADING_PATTERN.match(line)))
+
+
+def chunk_pages(pages: List[str], max_chars: int = 800, overlap: int = 120) -> List[RuleChunk]:
+    """
+    结构感知切片：
+    - 遇到章节/条款标题即断开，切片不跨章节；
+    - 章节内按行累积到 max_chars，相邻切片保留约 overlap 字符的重叠行；
+    - 每个切片以所属标题开头，并记录起止页码 (从 1 开始)。
+    """
+    chunks: List[RuleChunk] = []
+    section = ""
+    lines: List[Tuple[str, int]] = []
+
+    def flush(keep_overlap: bool):
+        nonlocal lines
+        if not lines:
+            return
+        body = "\n".join(text for text, _ in lines)
+        chunks.append(RuleChunk(
+            text=f"{section}\n{body}" if section else body,
+            section=section,
+            page_start=lines[0][1],
+            page_end=lines[-1][1]
+        ))
+        tail: List[Tuple[str, int]] = []
+        if keep_overlap:
+            size = 0
+            for text, page in reversed(lines):
+                size += len(text)
+                if size > overlap:
+                    break
+                tail.insert(0, (text, page))
+        lines = tail
+
+    size = 0
+    for page_no, page_text in enumerate(pages, start=1):
+        for raw_line in page_text.splitlines():
+            line = raw_line.strip()
+            if not line:
+                continue
+            if _is_rule_heading(line):
+                flush(keep_overlap=False)
+                section, size = line, 0
+                continue
+            # 单行超长时硬切
+            for start in range(0, len(line), max_chars):
+                piece = line[start:start + max_chars]
+                if size + len(piece) > max_chars and lines:
+                    flush(keep_overlap=True)
+                    size = sum(len(text) for text, _ in lines)
+                lines.append((piece, page_no))
+                size += len(piece)
+    flush(keep_overlap=False)
+    return chunks
+
+
+def _terms(text: str) -> List[str]:
+    terms = [word.lower() for word in _WORD_PATTERN.findall(text)]
+    for run in _CJK_RUN_PATTERN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def rank_chunks(query: str, chunks: List[RuleChunk], k: int = 4) -> List[RuleChunk]:
+    """
+    本地词法检索 (BM25 风格打分)，用于向量入库完成之前直接在内存切片上取上下文。
+    """
+    query_terms = set(_terms(query))
+    if not query_terms or not chunks:
+        return []
+
+    term_counts = [Counter(_terms(chunk.text)) for chunk in chunks]
+    doc_freq: Dict[str, int] = {
+        term: sum(1 for counts in term_counts if term in counts) for term in query_terms
+    }
+    avg_len = sum(sum(counts.values()) for counts in term_counts) / len(chunks) or 1
+
+    def score(counts: Counter) -> float:
+        length_norm = 0.25 + 0.75 * sum(counts.values()) / avg_len
+        total = 0.0
+        for term in query_terms:
+            tf = counts.get(term, 0)
+            if tf:
+                idf = math.log(1 + (len(chunks) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                total += idf * tf * 2.2 / (tf + 1.2 * length_norm)
+        return total
+
+    scored = [(score(counts), i) for i, counts in enumerate(term_counts)]
+    scored = [item for item in scored if item[0] > 0]
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [chunks[i] for _, i in scored[:k]]
@@ -0,0 +1,179 @@
+import re
+from typing import List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.models.schema import ContentBlock, ContentType
+
+_CN_NUM = "一二三四五六七八九十百零〇"
+# 编号后可不留空格直接接中文 ("1.1研究背景")；但 "3.5倍"、"2.1万" 这类数量表达不算标题
+_CJK_TITLE = r"(?![倍万亿元年月日个次])[\u4e00-\u9fff]"
+
+# (正则, 块类型, 置信度)；按顺序匹配，先命中者生效
+HEADING_RULES: List[Tuple["re.Pattern", ContentType, float]] = [
+    (re.compile(rf"^第[{_CN_NUM}\d]+章\s*\S*"), ContentType.HEADING_1, 0.95),
+    (re.compile(rf"^第[{_CN_NUM}\d]+节\s*\S*"), ContentType.HEADING_2, 0.9),
+    (re.compile(rf"^\d+\.\d+\.\d+\.?(\s+\S|{_CJK_TITLE})"), ContentType.HEADING_3, 0.9),
+    (re.compile(rf"^\d+\.\d+\.?(\s+\S|{_CJK_TITLE})"), ContentType.HEADING_2, 0.9),
+    (re.compile(r"^(摘\s*要|Abstract|ABSTRACT|目\s*录|引\s*言|绪\s*论|结\s*论|参考文献|致\s*谢|附\s*录)$"), ContentType.HEADING_1, 0.9),
+    # 以下编号形式与列表项容易混淆，置信度较低
+    (re.compile(rf"^[{_CN_NUM}]+、\s*\S"), ContentType.HEADING_2, 0.7),
+    (re.compile(rf"^[（(][{_CN_NUM}]+[)）]\s*\S"), ContentType.HEADING_3, 0.65),
+    (re.compile(r"^\d+\s+\S"), ContentType.HEADING_1, 0.6),
+]
+
+CAPTION_PATTERN = re.compile(r"^(图|表)\s*\d+([.．\-－—]\d+)*\s*\S|^(Figure|Fig\.|Table)\s*\d+", re.IGNORECASE)
+MARKDOWN_HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.+?)\s*#*$")
+MARKDOWN_IMAGE_PATTERN = re.compile(r"^!\[([^\]]*)\]\(([^)\s]+)[^)]*\)$")
+MARKDOWN_LIST_PATTERN = re.compile(r"^([-*+]|\d+[.)])\s+\S")
+
+SENTENCE_END = tuple("。！？；.!?;…”\"）)")
+# 行尾是句中标点说明句子未完，属于软换行
+CLAUSE_END = tuple("，、：,:-—（(“")
+# 标题/题注的最大长度，超过则更像正文
+MAX_HEADING_LENGTH = 40
+
+
+class Segment(BaseModel):
+    """本地分段结果：一个候选块及其置信度，raw 为原始行文本 (低置信时交给 B-Model)"""
+    block: ContentBlock
+    confidence: float
+    raw: str
+
+
+def _is_cjk(char: str) -> bool:
+    return "　" <= char <= "鿿" or "＀" <= char <= "￯"
+
+
+class StructuralSegmenter:
+    """
+    启发式结构分段器：识别 Markdown "#" 标题、"第一章"/"1.1" 编号、"图1-1" 题注等已有结构，
+    为每个块给出置信度。只有低置信片段需要交给 B-Model。
+    """
+
+    def __init__(self, min_confidence: float):
+        self.min_confidence = min_confidence
+
+    def classify_line(self, line: str) -> Optional[Tuple[ContentType, float, str]]:
+        """对单行做标题/题注判定；非结构行返回 None"""
+        match = MARKDOWN_HEADING_PATTERN.match(line)
+        if match:
+            level = min(len(match.group(1)), 3)
+            return ContentType(f"heading_{level}"), 0.99, match.group(2)
+
+        if len(line) > MAX_HEADING_LENGTH or line.endswith(("。", "；", ";")):
+            return None
+
+        if CAPTION_PATTERN.match(line):
+            return ContentType.CAPTION, 0.92, line
+        for pattern, content_type, confidence in HEADING_RULES:
+            if pattern.match(line):
+                return content_type, confidence, line
+        return None
+
+    def segment(self, raw_text: str) -> List[Segment]:
+        segments: List[Segment] = []
+        body_lines: List[str] = []
+
+        def flush_body():
+            if not body_lines:
+                return
+            text = body_lines[0]
+            for line in body_lines[1:]:
+                # 软换行：中文直接拼接，西文补空格
+                text += line if _is_cjk(text[-1]) else " " + line
+            ends_sentence = text.endswith(SENTENCE_END)
+            confidence = 0.9 if ends_sentence or len(text) > MAX_HEADING_LENGTH else 0.5
+            segments.append(Segment(
+                block=ContentBlock(type=ContentType.BODY_TEXT, text=text),
+                confidence=confidence,
+                raw="\n".join(body_lines)
+            ))
+            body_lines.clear()
+
+        for line in raw_text.splitlines():
+            stripped = line.strip()
+            if not stripped:
+                flush_body()
+                continue
+
+            image = MARKDOWN_IMAGE_PATTERN.match(stripped)
+            if image:
+                flush_body()
+                segments.append(Segment(
+                    block=ContentBlock(type=ContentType.IMAGE_HOOK, text=image.group(1), source_data=image.group(2)),
+                    confidence=0.95,
+                    raw=stripped
+                ))
+                continue
+
+            list_item = MARKDOWN_LIST_PATTERN.match(stripped)
+            if list_item and not CAPTION_PATTERN.match(stripped):
+                flush_body()
+                # "1. 绪论" 这类不带句末标点的短编号行也可能是标题，交给 B-Model 判定
+                ambiguous = (
+                    list_item.group(1)[0].isdigit()
+                    and len(stripped) <= MAX_HEADING_LENGTH
+                    and not stripped.endswith(SENTENCE_END)
+                )
+                segments.append(Segment(
+                    block=ContentBlock(type=ContentType.BODY_TEXT, text=stripped),
+                    confidence=0.5 if ambiguous else 0.85,
+                    raw=stripped
+                ))
+                continue
+
+            classified = self.classify_line(stripped)
+            if classified:
+                flush_body()
+                content_type, confidence, text = classified
+                segments.append(Segment(
+                    block=ContentBlock(type=content_type, text=text),
+                    confidence=confidence,
+                    raw=stripped
+                ))
+                continue
+
+            previous = body_lines[-1] if body_lines else ""
+            if previous and len(previous) <= MAX_HEADING_LENGTH and not previous.endswith(SENTENCE_END + CLAUSE_END):
+                # 无句末标点的短行可能是未编号的标题，不与下一段合并，单独作为低置信片段
+                flush_body()
+            body_lines.append(stripped)
+            # 中文草稿常见 "一行一段"：行尾是句末标点即视为段落结束
+            if stripped.endswith(SENTENCE_END):
+                flush_body()
+        flush_body()
+        return segments
+
+    def plan(self, segments: List[Segment], max_gap: int = 2) -> List[Union[ContentBlock, str]]:
+        """
+        生成处理计划：高置信片段直接输出 ContentBlock，低置信片段合并为待润色文本 (str)。
+        相距不超过 max_gap 个高置信块的低置信片段合并为一段，减少零碎的模型调用。
+        """
+        low = [i for i, seg in enumerate(segments) if seg.confidence < self.min_confidence]
+        if not low:
+            return [seg.block for seg in segments]
+
+        spans: List[Tuple[int, int]] = []
+        start = end = low[0]
+        for index in low[1:]:
+            if index - end - 1 <= max_gap:
+                end = index
+            else:
+                spans.append((start, end))
+                start = end = index
+        spans.append((start, end))
+
+        plan: List[Union[ContentBlock, str]] = []
+        cursor = 0
+        for start, end in spans:
+            plan.extend(seg.block for seg in segments[cursor:start])
+            plan.append("\n\n".join(seg.raw for seg in segments[start:end + 1]))
+            cursor = end + 1
+        plan.extend(seg.block for seg in segments[cursor:])
+        return plan
+
+
+# 单例导出
+structural_segmenter = StructuralSegmenter(min_confidence=settings.SEGMENTER_MIN_CONFIDENCE)
@@ -0,0 +1,218 @@
+import logging
+import re
+import zipfile
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from lxml import etree
+from pydantic import BaseModel
+
+from app.models.schema import ContentBlock, ContentType
+
+logger = logging.getLogger(__name__)
+
+# WordprocessingML 命名空间
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W = f"{{{W_NS}}}"
+
+# 样式名 (styles.xml 中 w:name，英文/中文界面) -> 块类型；Heading 4 及更深统一按三级标题处理
+_HEADING_NAME_PATTERN = re.compile(r"^(heading|标题)\s*(\d)$", re.IGNORECASE)
+_TITLE_NAMES = {"title", "标题"}
+_CAPTION_NAMES = {"caption", "题注"}
+_HEADING_TYPES = (ContentType.HEADING_1, ContentType.HEADING_2, ContentType.HEADING_3)
+# 其内部段落不单独产出的容器：表格、文本框
+_NESTED_CONTAINERS = {f"{_W}tbl", f"{_W}txbxContent"}
+
+
+class InvalidDocxError(ValueError):
+    """上传的文件无法作为 .docx 打开"""
+
+
+class SourceDocument(BaseModel):
+    """
+    加载后的草稿：parts 中 ContentBlock 为已确定类型的块 (直接渲染)，
+    str 为需要结构识别 / 润色的文本片段。
+    structured=True 表示文本片段可能带有结构标记 (Markdown 标题、章节编号等)，可先走本地分段。
+    """
+    parts: List[Union[ContentBlock, str]]
+    structured: bool = True
+
+    @property
+    def chars(self) -> int:
+        return sum(len(part) if isinstance(part, str) else len(part.text) for part in self.parts)
+
+    @property
+    def preclassified(self) -> int:
+        return sum(1 for part in self.parts if not isinstance(part, str))
+
+
+def load_text(path: str, structured: bool = True) -> SourceDocument:
+    """纯文本 / Markdown：整篇作为一个待处理片段"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return SourceDocument(parts=[f.read()], structured=structured)
+
+
+class _StyleInfo(BaseModel):
+    name: str = ""
+    outline_level: Optional[int] = None
+    based_on: Optional[str] = None
+
+
+def _read_styles(archive: zipfile.ZipFile) -> Dict[str, _StyleInfo]:
+    """styles.xml 体积很小，整体解析"""
+    try:
+        return parse_styles(etree.fromstring(archive.read("word/styles.xml")))
+    except KeyError:
+        return {}
+
+
+def parse_styles(root: etree._Element) -> Dict[str, _StyleInfo]:
+    """styles.xml 根节点 -> {styleId: (样式名, 大纲级别, 基准样式)}，只收集段落样式"""
+    styles: Dict[str, _StyleInfo] = {}
+    for style in root.iter(f"{_W}style"):
+        if style.get(f"{_W}type") != "paragraph":
+            continue
+        name = style.find(f"{_W}name")
+        outline = style.find(f"{_W}pPr/{_W}outlineLvl")
+        based_on = style.find(f"{_W}basedOn")
+        styles[style.get(f"{_W}styleId")] = _StyleInfo(
+            name=name.get(f"{_W}val", "") if name is not None else "",
+            outline_level=int(outline.get(f"{_W}val")) if outline is not None else None,
+            based_on=based_on.get(f"{_W}val") if based_on is not None else None
+        )
+    return styles
+
+
+def _classify_style(style_id: Optional[str], styles: Dict[str, _StyleInfo]) -> Optional[ContentType]:
+    """按样式名识别标题 / 题注；样式名不明确时沿 basedOn 链查找大纲级别"""
+    seen = set()
+    while style_id and style_id not in seen:
+        seen.add(style_id)
+        info = styles.get(style_id)
+        if info is None:
+            return None
+        name = info.name.strip().lower()
+        match = _HEADING_NAME_PATTERN.match(name)
+        if match:
+            return _HEADING_TYPES[min(int(match.group(2)), 3) - 1]
+        if name in _TITLE_NAMES:
+            return ContentType.HEADING_1
+        if name in _CAPTION_NAMES or name.endswith(" caption"):
+            return ContentType.CAPTION
+        if info.outline_level is not None and info.outline_level < 9:
+            return _HEADING_TYPES[min(info.outline_level, 2)]
+        style_id = info.based_on
+    return None
+
+
+def paragraph_text(paragraph: etree._Element) -> str:
+    parts = []
+    for node in paragraph.iter(f"{_W}t", f"{_W}tab", f"{_W}br"):
+        if node.tag == f"{_W}t":
+            parts.append(node.text or "")
+        elif node.tag == f"{_W}tab":
+            parts.append("\t")
+        else:
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def classify_paragraph(paragraph: etree._Element, styles: Dict[str, _StyleInfo]) -> Optional[ContentType]:
+    """按段落自身的大纲级别 (优先) 或样式确定块类型；无法确定时返回 None"""
+    outline = paragraph.find(f"{_W}pPr/{_W}outlineLvl")
+    if outline is not None:
+        level = int(outline.get(f"{_W}val"))
+        if level < 9:
+            return _HEADING_TYPES[min(level, 2)]
+    style = paragraph.find(f"{_W}pPr/{_W}pStyle")
+    return _classify_style(style.get(f"{_W}val") if style is not None else None, styles)
+
+
+def _table_text(table: etree._Element) -> str:
+    """表格按行输出 (单元格以 | 分隔)，作为待处理文本交给润色"""
+    rows = []
+    for row in table.iter(f"{_W}tr"):
+        cells = [
+            " ".join(filter(None, (paragraph_text(p) for p in cell.iter(f"{_W}p"))))
+            for cell in row.iter(f"{_W}tc")
+        ]
+        if any(cells):
+            rows.append(" | ".join(cells))
+    return "\n".join(rows)
+
+
+def iter_docx_paragraphs(path: str) -> Iterator[Tuple[Optional[ContentType], str]]:
+    """
+    流式遍历 document.xml 的正文顶层元素，产出 (块类型或 None, 文本)：
+    段落按样式 / 大纲级别分类，表格整体作为无样式文本。
+    iterparse 逐元素解析，处理完即清除，内存占用与文档长度无关。
+    """
+    with zipfile.ZipFile(path) as archive:
+        styles = _read_styles(archive)
+        with archive.open("word/document.xml") as stream:
+            for _, element in etree.iterparse(stream, events=("end",), tag=(f"{_W}p", f"{_W}tbl")):
+                if any(ancestor.tag in _NESTED_CONTAINERS for ancestor in element.iterancestors()):
+                    # 表格 / 文本框内的段落随外层元素一起处理
+                    continue
+                if element.tag == f"{_W}tbl":
+                    item = (None, _table_text(element))
+                else:
+                    item = (classify_paragraph(element, styles), paragraph_text(element))
+                # 释放已处理的元素；位于 body 顶层时连同之前的兄弟节点一起删除
+                element.clear()
+                parent = element.getparent()
+                if parent is not None and parent.tag == f"{_W}body":
+                    while element.getprevious() is not None:
+                        del parent[0]
+                if item[1]:
+                    yield item
+
+
+def load_docx(path: str) -> SourceDocument:
+    """
+    .docx 草稿：标题 / 题注样式与大纲级别直接映射为 ContentBlock，
+    连续的无样式段落合并为一个待处理片段 (仍可能含 "第一章" 之类的编号，交给本地分段识别)。
+    文件损坏 / 不是 .docx 时抛出 InvalidDocxError。
+    """
+    parts: List[Union[ContentBlock, str]] = []
+    pending: List[str] = []
+    try:
+        for block_type, text in iter_docx_paragraphs(path):
+            if block_type is None:
+                pending.append(text)
+                continue
+            if pending:
+                parts.append("\n\n".join(pending))
+                pending = []
+            parts.append(ContentBlock(type=block_type, text=text))
+    except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError) as e:
+        raise InvalidDocxError("Not a valid .docx file") from e
+    if pending:
+        parts.append("\n\n".join(pending))
+    return SourceDocument(parts=parts)
+
+
+def check_docx(path: str):
+    """快速校验 (不解析正文)：是合法 ZIP 且包含 word/document.xml，否则抛出 InvalidDocxError"""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            archive.getinfo("word/document.xml")
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise InvalidDocxError("Not a valid .docx file") from e
+
+
+# 文件类型 -> 加载器；未登记的类型按纯文本读取
+SourceLoader = Callable[[str], SourceDocument]
+SOURCE_LOADERS: Dict[str, SourceLoader] = {
+    "md": load_text,
+    "txt": load_text,
+    "docx": load_docx,
+}
+
+
+def load_source(path: str, source_ext: str) -> SourceDocument:
+    """按扩展名选择加载器 (阻塞，需放入线程池执行)"""
+    loader = SOURCE_LOADERS.get(source_ext.lower())
+    if loader is None:
+        logger.warning(f"No loader for .{source_ext} drafts, reading as plain text")
+        return load_text(path, structured=False)
+    return loader(path)
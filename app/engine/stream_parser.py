@@ -0,0 +1,67 @@
+import json
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalBlockParser:
+    """
+    B-Model 输出的增量 JSON 解析器。
+    逐段喂入 token 流，每当数组中的一个 {"type", "text"} 对象闭合就立即吐出，
+    无需等待完整响应；兼容 {"blocks": [...]} 与裸数组两种形态，忽略代码围栏等外围字符。
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        # 容器栈：'{' 或 '['
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        # 当前正在收集的块对象在栈中的深度 (None 表示未在收集)
+        self._capture_depth = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """喂入一段文本，返回本段内闭合的块对象"""
+        completed: List[Dict[str, Any]] = []
+        for char in chunk:
+            if self._capture_depth is not None:
+                self._buffer.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                # 数组的直接子对象即为一个块
+                if char == "{" and self._capture_depth is None and self._stack and self._stack[-1] == "[":
+                    self._capture_depth = len(self._stack)
+                    self._buffer = ["{"]
+                self._stack.append(char)
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if char == "}" and self._capture_depth is not None and len(self._stack) == self._capture_depth:
+                    block = self._decode("".join(self._buffer))
+                    if block is not None:
+                        completed.append(block)
+                    self._capture_depth = None
+                    self._buffer = []
+        return completed
+
+    @staticmethod
+    def _decode(text: str):
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Skipping malformed streamed block: {e}")
+            return None
+        return value if isinstance(value, dict) else None
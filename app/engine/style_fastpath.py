@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 与 LLMEngine 读取同一份映射表: data/font_config.json
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FONT_CONFIG_PATH = os.path.join(_PROJECT_ROOT, "data", "font_config.json")
+
+ALL_SECTIONS = ["global_default", "heading_1", "heading_2", "heading_3", "body_text", "caption"]
+
+# 作用对象词表 (长词优先匹配，"一级标题" 不会被 "标题" 截断)
+TARGET_VOCAB = {
+    "全文": ALL_SECTIONS,
+    "正文": ["body_text"],
+    "一级标题": ["heading_1"], "章标题": ["heading_1"], "大标题": ["heading_1"], "标题": ["heading_1"],
+    "二级标题": ["heading_2"], "节标题": ["heading_2"],
+    "三级标题": ["heading_3"],
+    "题注": ["caption"], "图注": ["caption"], "表注": ["caption"],
+    "图题": ["caption"], "表题": ["caption"], "图表标题": ["caption"],
+}
+
+ALIGN_VOCAB = {
+    "居中": "CENTER", "居左": "LEFT", "左对齐": "LEFT",
+    "居右": "RIGHT", "右对齐": "RIGHT", "两端对齐": "JUSTIFY",
+}
+
+BOLD_VOCAB = {"加粗": True, "粗体": True, "不加粗": False, "取消加粗": False}
+ITALIC_VOCAB = {"斜体": True, "不倾斜": False}
+
+COLOR_VOCAB = {
+    "黑色": "000000", "红色": "FF0000", "蓝色": "0000FF",
+    "绿色": "008000", "灰色": "808080",
+}
+
+LINE_SPACING_VOCAB = {"单倍行距": 1.0, "双倍行距": 2.0}
+
+# 行距 / 段距属于版面整体设置：前文已分别描述多类对象后，未指明对象的此类子句作用于全文
+DOCUMENT_ATTRS = {"line_spacing", "space_before", "space_after"}
+
+# 无语义的连接词/虚词，剩余文本只由它们组成时视为完全解析
+FILLER_PATTERN = re.compile(
+    r"请|把|将|所有|全部|都|统一|一律|的|用|使用|采用|改为|改成|设为|设置为|设置成|设置|改|为|是|要|"
+    r"字体|字号|大小|颜色|对齐方式|对齐|格式|和|与|及|并且|并|且|也|[\s，,；;。、：:！!]"
+)
+
+CLAUSE_SPLIT_PATTERN = re.compile(r"[，,；;。\n]")
+
+# 数值型模式
+_NUM = r"(\d+(?:\.\d+)?)"
+NUMERIC_PATTERNS = {
+    "line_spacing": [rf"(?:行间距|行距)(?:为|设为|设置为|是)?{_NUM}倍", rf"{_NUM}倍(?:行间距|行距)"],
+    "size_pt": [rf"{_NUM}\s*(?:pt|磅)"],
+    "space_before": [rf"段前(?:间距)?(?:为|设为)?{_NUM}\s*(?:pt|磅)"],
+    "space_after": [rf"段后(?:间距)?(?:为|设为)?{_NUM}\s*(?:pt|磅)"],
+}
+
+
+class FastPathResult:
+    """本地解析结果：config 为合并器 (Merger) 的字典格式，unresolved 为未能识别的片段"""
+
+    def __init__(self, config: Dict[str, Dict[str, Any]], unresolved: List[str]):
+        self.config = config
+        self.unresolved = unresolved
+
+    @property
+    def resolved(self) -> bool:
+        return bool(self.config) and not self.unresolved
+
+
+class LocalStyleParser:
+    """
+    样式指令的确定性快速通道。
+    把字体/字号/对齐/行距词表预编译成一个多模式正则，一次扫描完成匹配；
+    只有整条指令都被词表覆盖时才视为命中，否则交给 C-Model。
+    """
+
+    def __init__(self, font_map_cn: Dict[str, str], font_map_en: Dict[str, str], size_map: Dict[str, float]):
+        self._handlers: Dict[str, Tuple[str, Any]] = {}
+        alternatives: List[Tuple[str, str]] = []
+
+        def add_literals(kind: str, vocab: Dict[str, Any]):
+            for term, value in vocab.items():
+                alternatives.append((re.escape(term), (kind, value)))
+
+        # 中文字体同时接受中文名与系统名 (如 "宋体" / "SimSun")
+        add_literals("font_cn", font_map_cn)
+        add_literals("font_cn", {v: v for v in font_map_cn.values()})
+        add_literals("font_en", font_map_en)
+        add_literals("size", size_map)
+        # "小四" 与 "小四号" 两种写法都接受
+        add_literals("size", {f"{term}号": value for term, value in size_map.items() if not term.endswith("号")})
+        add_literals("target", TARGET_VOCAB)
+        add_literals("align", ALIGN_VOCAB)
+        add_literals("bold", BOLD_VOCAB)
+        add_literals("italic", ITALIC_VOCAB)
+        add_literals("color", COLOR_VOCAB)
+        add_literals("line_spacing", LINE_SPACING_VOCAB)
+        for kind, patterns in NUMERIC_PATTERNS.items():
+            for pattern in patterns:
+                alternatives.append((pattern, (kind, None)))
+
+        # 长模式优先，保证 "不加粗" 先于 "加粗"、"一级标题" 先于 "标题"
+        alternatives.sort(key=lambda item: len(item[0]), reverse=True)
+        parts = []
+        for index, (pattern, handler) in enumerate(alternatives):
+            group = f"g{index}"
+            self._handlers[group] = handler
+            parts.append(f"(?P<{group}>{pattern})")
+        self._matcher = re.compile("|".join(parts), re.IGNORECASE)
+
+        self.total = 0
+        self.fast_path_hits = 0
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_font_config_file(cls, path: str = FONT_CONFIG_PATH) -> "LocalStyleParser":
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Font config unavailable for fast path ({e}); only built-in vocabularies are used.")
+            data = {}
+        return cls(data.get("font_map_cn", {}), data.get("font_map_en", {}), data.get("size_map", {}))
+
+    def _parse_clause(
+        self,
+        clause: str,
+        inherited: Optional[List[str]],
+        named: List[str],
+        config: Dict[str, Dict[str, Any]],
+        unresolved: List[str]
+    ) -> Optional[List[str]]:
+        """
+        解析单个子句，返回其作用对象 (供后续未指明对象的子句沿用)。
+        inherited 为前一子句的作用对象；首个子句传入 ALL_SECTIONS，作用对象未知时为 None。
+        named 累计前文显式提到的对象，用于判断 "行距1.5倍" 这类尾随子句是否作用于全文。
+        """
+        targets: List[str] = []
+        attrs: Dict[str, Any] = {}
+        en_family: Optional[str] = None
+        leftover: List[str] = []
+        cursor = 0
+
+        for match in self._matcher.finditer(clause):
+            leftover.append(clause[cursor:match.start()])
+            cursor = match.end()
+            kind, value = self._handlers[match.lastgroup]
+
+            if kind == "target":
+                targets.extend(t for t in value if t not in targets)
+            elif kind == "font_cn":
+                attrs["family"] = value
+            elif kind == "font_en":
+                en_family = value
+            elif kind == "size":
+                attrs["size"] = float(value)
+            elif kind == "size_pt":
+                attrs["size"] = float(self._number(match))
+            elif kind == "align":
+                attrs["align"] = value
+            elif kind == "bold":
+                attrs["bold"] = value
+            elif kind == "italic":
+                attrs["italic"] = value
+            elif kind == "color":
+                attrs["color"] = value
+            elif kind == "line_spacing":
+                attrs["line_spacing"] = float(value if value is not None else self._number(match))
+            elif kind in ("space_before", "space_after"):
+                attrs[kind] = float(self._number(match))
+        leftover.append(clause[cursor:])
+
+        if en_family:
+            if "family" in attrs:
+                # 中西文分体目前无法用单个 family 表达，交给 C-Model
+                unresolved.append(clause)
+                return targets or None
+            attrs["family"] = en_family
+
+        # 未指明作用对象的子句沿用前一子句的对象 ("正文宋体，字号小四")，只含对象的子句 ("正文，宋体") 为后续子句指定对象；
+        # 只有首个子句 (如 "行距1.5倍，...")、显式 "全文"，或前文已描述多类对象后的行距/段距子句才作用于全部块类型。
+        # 前一子句未能解析时对象不明，交给 C-Model
+        remainder = FILLER_PATTERN.sub("", "".join(leftover))
+        if remainder:
+            unresolved.append(clause)
+            return targets or None
+        if targets:
+            named.extend(t for t in targets if t not in named)
+        elif len(named) > 1 and attrs.keys() & DOCUMENT_ATTRS:
+            # "正文小四宋体，标题三号黑体居中，行距1.5倍"：行距不只属于标题；与字符属性混写时意图不明
+            if not attrs.keys() <= DOCUMENT_ATTRS:
+                unresolved.append(clause)
+                return None
+            targets = ALL_SECTIONS
+        targets = targets or inherited
+        if attrs and targets is None:
+            unresolved.append(clause)
+            return None
+
+        for section in targets if attrs else []:
+            config.setdefault(section, {}).update(attrs)
+        return targets
+
+    @staticmethod
+    def _number(match: "re.Match") -> str:
+        return next(g for g in match.groups() if g is not None and re.fullmatch(_NUM, g))
+
+    def parse(self, user_prompt: str) -> FastPathResult:
+        """本地解析用户样式指令；无网络调用"""
+        config: Dict[str, Dict[str, Any]] = {}
+        unresolved: List[str] = []
+        targets: Optional[List[str]] = ALL_SECTIONS
+        named: List[str] = []
+        for clause in CLAUSE_SPLIT_PATTERN.split(user_prompt):
+            if clause.strip():
+                targets = self._parse_clause(clause.strip(), targets, named, config, unresolved)
+
+        result = FastPathResult(config, unresolved)
+        with self._stats_lock:
+            self.total += 1
+            if result.resolved:
+                self.fast_path_hits += 1
+        metrics.record_cache("style_fastpath", hits=int(result.resolved), misses=int(not result.resolved))
+        logger.debug(f"Style fast path {'hit' if result.resolved else 'miss'}: unresolved={unresolved}")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.total,
+            "fast_path": self.fast_path_hits,
+            "fast_path_share": round(self.fast_path_hits / self.total, 4) if self.total else 0.0,
+        }
+
+
+# 单例导出
+style_fastpath = LocalStyleParser.from_font_config_file()
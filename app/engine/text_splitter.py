@@ -0,0 +1,105 @@
+import re
+from typing import List
+
+# 标题行特征：Markdown "#"、"第一章"、"1.1 xxx"、"一、xxx"
+HEADING_LINE_PATTERN = re.compile(
+    r"^\s*(#{1,6}\s|第[一二三四五六七八九十百零\d]+[章节篇部]|\d+(\.\d+)*\s+\S|[一二三四五六七八九十]+、)"
+)
+
+# 中日韩字符及全角符号，粗略按 1 字 1 token 计
+_CJK_PATTERN = re.compile(r"[　-〿㐀-鿿＀-￯]")
+
+# 句末标点，用于切分超长段落
+_SENTENCE_END_PATTERN = re.compile(r"(?<=[。！？；.!?;])")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文 1 字 ≈ 1 token，其余 4 字符 ≈ 1 token"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def is_heading_line(line: str) -> bool:
+    """短行且命中标题特征时视为标题"""
+    return len(line) <= 60 and bool(HEADING_LINE_PATTERN.match(line))
+
+
+def split_paragraphs(raw_text: str) -> List[str]:
+    """按空行切段；标题行总是单独成段"""
+    paragraphs: List[str] = []
+    current: List[str] = []
+
+    def flush():
+        if current:
+            paragraphs.append("\n".join(current))
+            current.clear()
+
+    for line in raw_text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            flush()
+        elif is_heading_line(stripped):
+            flush()
+            paragraphs.append(stripped)
+        else:
+            current.append(stripped)
+    flush()
+    return paragraphs
+
+
+def _split_oversized(paragraph: str, max_tokens: int) -> List[str]:
+    """超出预算的段落先按句切，单句仍超长时按字符硬切"""
+    pieces: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END_PATTERN.split(paragraph):
+        if not sentence:
+            continue
+        if estimate_tokens(current + sentence) <= max_tokens:
+            current += sentence
+            continue
+        if current:
+            pieces.append(current)
+        while estimate_tokens(sentence) > max_tokens:
+            # 按当前文本的字符/token 密度换算切点
+            cut = max(1, max_tokens * len(sentence) // estimate_tokens(sentence))
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        current = sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_windows(raw_text: str, max_tokens: int) -> List[str]:
+    """
+    将草稿切成不超过 max_tokens 的窗口，切点落在段落/标题边界上。
+    窗口已过半时遇到标题就提前收尾，让章节尽量完整地落在同一窗口里。
+    """
+    windows: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current_tokens
+        if current:
+            windows.append("\n\n".join(current))
+            current.clear()
+            current_tokens = 0
+
+    units: List[str] = []
+    for paragraph in split_paragraphs(raw_text):
+        if estimate_tokens(paragraph) > max_tokens:
+            units.extend(_split_oversized(paragraph, max_tokens))
+        else:
+            units.append(paragraph)
+
+    for paragraph in units:
+        tokens = estimate_tokens(paragraph)
+        if current_tokens + tokens > max_tokens:
+            flush()
+        elif is_heading_line(paragraph) and current_tokens >= max_tokens // 2:
+            flush()
+        current.append(paragraph)
+        current_tokens += tokens
+    flush()
+    return windows
@@ -1,12 +1,43 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from app.core.config import settings
+from app.core.executor import run_blocking, shutdown_process_pool
+from app.core.http_client import http_pool
+from app.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from app.core.preset_registry import preset_registry
+from app.engine.llm_engine import llm_engine
+from app.engine.rag_engine import rag_engine
+from app.services.job_runner import job_runner
 from app.api.endpoints import router as api_router
+from app.api.websocket import router as ws_router
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: 预加载 data/rules 并开启热加载
+    preset_registry.start_watching()
+    # 可选预热：并行初始化引擎，避免首个请求承担冷启动
+    if settings.PREWARM_ENGINES:
+        await asyncio.gather(
+            run_blocking(llm_engine.get_instance),
+            run_blocking(rag_engine.get_instance)
+        )
+    # 启动异步任务池 (并恢复上次中断的任务)
+    await job_runner.start()
+    yield
+    # Shutdown
+    await job_runner.stop()
+    preset_registry.stop_watching()
+    shutdown_process_pool()
+    await http_pool.aclose()
 
 app = FastAPI(
     title="AI-PaperFormatter (APF)",
     description="Automated Academic Paper Formatting Engine powered by RAG + LLM",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -21,11 +52,19 @@ if settings.BACKEND_CORS_ORIGINS:
 
 # Register Routes
 app.include_router(api_router, prefix="/api/v1")
+app.include_router(ws_router, prefix="/api/v1")
 
 @app.get("/health")
 def health_check():
     return {"status": "ok", "engine": "APF-Zhipu-Edition"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    # Prometheus 抓取端点：模型调用耗时 / token / 重试 / 降级 / 缓存命中
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
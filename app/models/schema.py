@@ -1,7 +1,7 @@
 import uuid
 from typing import Optional, List, Dict, Any
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 # --- Enums ---
 class ContentType(str, Enum):
@@ -22,7 +22,9 @@ class Alignment(str, Enum):
 
 # --- Style Definitions ---
 class FontStyle(BaseModel):
-    """原子样式定义"""
+    """原子样式定义 (不可变，可哈希，便于缓存与驻留)"""
+    model_config = ConfigDict(frozen=True)
+
     family: Optional[str] = None      # 字体族 (e.g., "SimSun")
     size: Optional[float] = None      # 字号 (e.g., 12.0)
     bold: Optional[bool] = None
@@ -36,7 +38,9 @@ class FontStyle(BaseModel):
     space_after: Optional[float] = None
 
 class GlobalStyleConfig(BaseModel):
-    """全文档样式配置表"""
+    """全文档样式配置表 (不可变，由 MergerEngine 编译后跨请求共享)"""
+    model_config = ConfigDict(frozen=True)
+
     global_default: Optional[FontStyle] = Field(default_factory=FontStyle)
     heading_1: Optional[FontStyle] = Field(default_factory=FontStyle)
     heading_2: Optional[FontStyle] = Field(default_factory=FontStyle)
@@ -69,4 +73,41 @@ class DocumentDSL(BaseModel):
     style_config: GlobalStyleConfig
     
     # 有序内容列表
-    content_blocks: List[ContentBlock] 
+    content_blocks: List[ContentBlock]
+
+# --- Async Jobs ---
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class JobRecord(BaseModel):
+    """异步排版任务 (持久化于 JobStore)"""
+    id: str
+    status: JobStatus = JobStatus.QUEUED
+    # 最近一次上报的流水线阶段
+    stage: str = "queued"
+    school_id: str
+    user_prompt: str = ""
+    bypass_cache: bool = False
+    source_path: str
+    source_ext: str
+    rule_path: Optional[str] = None
+    result_path: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+    # 持有该任务的 runner 实例及其租约到期时间；租约过期 (实例崩溃) 后可被其他实例接管
+    owner: Optional[str] = None
+    lease_expires_at: Optional[float] = None
+
+# --- Rule Ingestion ---
+class RuleManifest(BaseModel):
+    """某学校当前入库的排版手册 (每个 school_id 只保留一个版本)"""
+    school_id: str
+    # PDF 原始字节的 sha256
+    file_hash: str
+    # 向量库中的切片 ID (school_id:chunk_hash)
+    chunk_ids: List[str]
+    ingested_at: float
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import zipfile
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.executor import run_blocking
+from app.engine.source_loader import SOURCE_LOADERS
+from app.models.schema import GlobalStyleConfig
+from app.services.pipeline import run_pipeline
+
+logger = logging.getLogger(__name__)
+
+# 批量接口接受的草稿类型 (与 /generate 一致：有专用加载器的类型)
+SUPPORTED_SOURCE_EXTS = tuple(SOURCE_LOADERS)
+MANIFEST_NAME = "manifest.json"
+
+
+class BatchSource(BaseModel):
+    """批量请求中的一份草稿：原始文件名 + 落盘路径"""
+    name: str
+    path: str
+    ext: str
+
+
+def source_ext_of(filename: str) -> str:
+    return filename.rsplit('.', 1)[-1].lower() if '.' in filename else ""
+
+
+def _member_name(info: zipfile.ZipInfo) -> str:
+    """ZIP 成员名：未声明 UTF-8 的条目多为 Windows 打包的 GBK 文件名，尽量还原"""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def extract_zip_sources(zip_path: str, batch_id: str, start_index: int = 0) -> List[BatchSource]:
+    """
+    解包上传的 ZIP (阻塞，需放入线程池执行)。
+    只取支持的草稿类型；落盘路径由我们生成，不使用成员路径 (避免 zip-slip)。
+    """
+    sources = []
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            name = _member_name(info)
+            if info.is_dir() or name.startswith("__MACOSX/"):
+                continue
+            ext = source_ext_of(name)
+            if ext not in SUPPORTED_SOURCE_EXTS:
+                continue
+            index = start_index + len(sources)
+            path = os.path.join(settings.UPLOAD_DIR, f"{batch_id}_{index}_source.{ext}")
+            with archive.open(info) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            sources.append(BatchSource(name=name.replace("\\", "/").rsplit("/", 1)[-1], path=path, ext=ext))
+    return sources
+
+
+def _output_names(sources: List[BatchSource]) -> List[str]:
+    """结果文件名：草稿名换成 .docx，重名时追加序号"""
+    names, seen = [], set()
+    for source in sources:
+        stem = source.name.rsplit('.', 1)[0] or "paper"
+        name, n = f"{stem}.docx", 1
+        while name in seen:
+            n += 1
+            name = f"{stem}_{n}.docx"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+class _ZipSink:
+    """只写的字节接收端：zipfile 以流式模式 (data descriptor) 写入，写完一项即可取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _write_entry(archive: zipfile.ZipFile, name: str, buffer, size: int):
+    """把渲染缓冲区写入 ZIP (阻塞，需放入线程池执行)；.docx 本身已压缩，直接存储"""
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    info.file_size = size
+    try:
+        with archive.open(info, "w") as dest:
+            shutil.copyfileobj(buffer, dest)
+    finally:
+        buffer.close()
+
+
+def _remove_sources(sources: List[BatchSource]):
+    for source in sources:
+        if os.path.exists(source.path):
+            os.remove(source.path)
+
+
+async def stream_batch(
+    batch_id: str,
+    sources: List[BatchSource],
+    school_id: str,
+    style_config: GlobalStyleConfig
+) -> AsyncIterator[bytes]:
+    """
+    批量生成：所有草稿共用一份已解析的 GlobalStyleConfig，
+    以 BATCH_CONCURRENCY 为上限并发润色/渲染，按完成顺序写入 ZIP 并立即推送给客户端。
+    最后写入 manifest.json 记录每份草稿的状态。结束 (或客户端断开) 时清理草稿文件。
+    """
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    output_names = _output_names(sources)
+
+    async def process(index: int, source: BatchSource) -> Tuple[int, Optional[Any], int, Dict[str, Any]]:
+        entry: Dict[str, Any] = {"source": source.name, "output": output_names[index]}
+        rendered: Dict[str, Any] = {}
+
+        async def progress(stage: str, **details: Any):
+            if stage == "rendered":
+                rendered.update(details)
+
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                buffer, size = await run_pipeline(
+                    task_id=f"{batch_id}-{index}",
+                    source_path=source.path,
+                    source_ext=source.ext,
+                    school_id=school_id,
+                    progress=progress,
+                    style_config=style_config
+                )
+            except Exception as e:
+                logger.error(f"Batch {batch_id}: {source.name} failed: {e}")
+                entry.update(status="failed", output=None, error=str(e))
+                buffer, size = None, 0
+            else:
+                entry.update(status="succeeded", blocks=rendered.get("blocks"), bytes=size)
+            entry["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return index, buffer, size, entry
+
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, "w")
+    manifest: List[Optional[Dict[str, Any]]] = [None] * len(sources)
+    tasks = [asyncio.create_task(process(i, s)) for i, s in enumerate(sources)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            index, buffer, size, entry = await finished
+            if buffer is not None:
+                await run_blocking(_write_entry, archive, output_names[index], buffer, size)
+            manifest[index] = entry
+            if data := sink.drain():
+                yield data
+
+        succeeded = sum(1 for entry in manifest if entry["status"] == "succeeded")
+        archive.writestr(
+            MANIFEST_NAME,
+            json.dumps({
+                "batch_id": batch_id,
+                "school_id": school_id,
+                "total": len(manifest),
+                "succeeded": succeeded,
+                "failed": len(manifest) - succeeded,
+                "files": manifest
+            }, ensure_ascii=False, indent=2),
+            compress_type=zipfile.ZIP_DEFLATED
+        )
+        archive.close()
+        yield sink.drain()
+    finally:
+        for task in tasks:
+            task.cancel()
+        # 客户端中途断开时，已渲染但未写入的缓冲区需要释放
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                buffer = task.result()[1]
+                if buffer is not None and not buffer.closed:
+                    buffer.close()
+        await run_blocking(_remove_sources, sources)
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import time
+import uuid
+from typing import Any, List, Optional
+
+from app.core.config import settings
+from app.core.executor import run_blocking
+from app.core.tracing import span, trace_request
+from app.models.schema import JobRecord, JobStatus
+from app.services.pipeline import run_pipeline
+from app.services.progress import ProgressHub, progress_hub
+from app.services.storage import JobStore, job_store
+
+logger = logging.getLogger(__name__)
+
+
+def _remove_file(path: Optional[str]):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def _write_result(buffer, path: str):
+    """将渲染缓冲区写入结果文件 (阻塞，需放入线程池执行)"""
+    try:
+        with open(path, "wb") as f:
+            shutil.copyfileobj(buffer, f)
+    finally:
+        buffer.close()
+
+
+class JobRunner:
+    """
+    本地异步任务池：固定数量的 worker 协程从队列取任务执行完整流水线。
+    任务状态写入 JobStore，阶段事件推送到 ProgressHub。
+    多 worker 进程 (uvicorn --workers) 共用 JobStore：每个实例只执行自己持有租约的任务，
+    维护协程定期续约、接管租约过期 (实例崩溃遗留) 的任务，并清理超过保留期的已完成任务。
+    """
+
+    def __init__(self, store: JobStore, workers: int, hub: ProgressHub):
+        self.store = store
+        self.workers = workers
+        self.hub = hub
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.owner: Optional[str] = None
+
+    async def start(self):
+        # 每次启动使用新的实例标识，同一进程内 lifespan 重启也不会误认旧实例的任务
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue = asyncio.Queue()
+        await run_blocking(self._purge_expired)
+        for job in await run_blocking(self._recover):
+            self._queue.put_nowait(job.id)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"apf-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._maintain(), name="apf-job-maintenance"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.owner is not None:
+            released = await run_blocking(self.store.release, self.owner)
+            if released:
+                logger.info(f"Released {released} unfinished job(s) for the next runner")
+
+    def _lease_until(self) -> float:
+        return time.time() + settings.JOB_LEASE_SECONDS
+
+    def _recover(self) -> List[JobRecord]:
+        """接管租约过期的未完成任务：源文件仍在的重新排队，否则标记失败"""
+        resumable = []
+        now = time.time()
+        for job in self.store.list_stale(now):
+            if job.owner == self.owner:
+                # 自己的任务 (续约被事件循环阻塞延误)，下一轮续约即可
+                continue
+            if not self.store.acquire(job.id, self.owner, self._lease_until(), now):
+                # 其他实例抢先接管
+                continue
+            if os.path.exists(job.source_path):
+                resumable.append(job)
+                logger.info(f"Resuming job {job.id} abandoned by {job.owner or 'a previous run'}")
+            else:
+                self.store.update(job.id, status=JobStatus.FAILED, error="Interrupted by restart; source file is gone")
+                logger.warning(f"Job {job.id} interrupted by restart cannot be resumed")
+        return resumable
+
+    async def _maintain(self):
+        """续约自己的任务、接管崩溃实例遗留的任务，并按 JOB_PURGE_INTERVAL_SECONDS 清理过期任务"""
+        interval = max(1.0, settings.JOB_LEASE_SECONDS / 3)
+        last_purge = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_blocking(self.store.renew_leases, self.owner, self._lease_until())
+                for job in await run_blocking(self._recover):
+                    self._queue.put_nowait(job.id)
+                if time.monotonic() - last_purge >= settings.JOB_PURGE_INTERVAL_SECONDS:
+                    await run_blocking(self._purge_expired)
+                    last_purge = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job maintenance failed: {e}")
+
+    def _purge_expired(self):
+        """清理超过保留期的已完成任务及其结果文件"""
+        for job in self.store.list_finished_before(time.time() - settings.JOB_RETENTION_SECONDS):
+            _remove_file(job.result_path)
+            self.store.delete(job.id)
+
+    def _publish(self, job: JobRecord, stage: str, **details: Any):
+        self.hub.publish(job.id, {
+            "job_id": job.id,
+            "stage": stage,
+            "elapsed_ms": round((time.time() - job.created_at) * 1000, 1),
+            **details
+        })
+
+    async def submit(self, job: JobRecord) -> JobRecord:
+        if self._queue is None:
+            raise RuntimeError("JobRunner is not started")
+        job.owner = self.owner
+        job.lease_expires_at = self._lease_until()
+        await run_blocking(self.store.create, job)
+        self._publish(job, "upload_saved", has_rules=job.rule_path is not None)
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = await run_blocking(self.store.get, job_id)
+        if job is None or not await run_blocking(self.store.mark_running, job.id, self.owner):
+            # 已完成，或租约已被其他实例接管
+            return
+
+        self._publish(job, "running")
+        started = time.perf_counter()
+
+        async def progress(stage: str, **details: Any):
+            self._publish(job, stage, **details)
+            await run_blocking(self.store.update, job.id, stage=stage)
+
+        try:
+            with trace_request(job.id, "job"):
+                buffer, _ = await run_pipeline(
+                    task_id=job.id,
+                    source_path=job.source_path,
+                    source_ext=job.source_ext,
+                    school_id=job.school_id,
+                    user_prompt=job.user_prompt,
+                    rule_path=job.rule_path,
+                    bypass_cache=job.bypass_cache,
+                    progress=progress
+                )
+                result_path = os.path.join(settings.RESULT_DIR, f"{job.id}.docx")
+                with span("result_saved"):
+                    await run_blocking(_write_result, buffer, result_path)
+            await run_blocking(
+                self.store.update, job.id,
+                status=JobStatus.SUCCEEDED, stage="done", result_path=result_path
+            )
+            self._publish(job, "done", duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        except asyncio.CancelledError:
+            # 进程退出：保留源文件，stop() 交还租约后由下一个实例重新排队
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            await run_blocking(self.store.update, job.id, status=JobStatus.FAILED, error=str(e))
+            self._publish(job, "failed", duration_ms=round((time.perf_counter() - started) * 1000, 1), error=str(e))
+
+        await run_blocking(_remove_file, job.source_path)
+        await run_blocking(_remove_file, job.rule_path)
+
+
+# 单例导出
+job_runner = JobRunner(job_store, settings.JOB_WORKERS, progress_hub)
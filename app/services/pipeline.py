@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import tempfile
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.executor import run_blocking, spawn_background
+from app.core.merger import MergerEngine
+from app.core.metrics import metrics
+from app.core import tracing
+from app.core.preset_registry import PresetEntry, preset_registry
+from app.core.template_loader import template_loader
+from app.engine.llm_engine import llm_engine
+from app.engine.rag_engine import rag_engine
+from app.engine.renderer import renderer
+from app.engine.restyler import restyler
+from app.engine.rule_extractor import RuleChunk, rank_chunks
+from app.engine.source_loader import SourceDocument, check_docx, load_source
+from app.engine.style_fastpath import style_fastpath
+from app.models.schema import ContentBlock, DocumentDSL, GlobalStyleConfig
+from app.services.storage import rule_manifest_store
+
+logger = logging.getLogger(__name__)
+
+# 阶段回调：await progress(stage, **details)，details 含 duration_ms 等计时/计数信息
+ProgressCallback = Callable[..., Awaitable[None]]
+
+# 构造一个通用的 query 来把所有格式要点查出来
+RULE_QUERY = "字体 字号 行距 标题格式 页边距"
+
+
+async def _report(progress: Optional[ProgressCallback], stage: str, **details: Any):
+    """阶段完成：带 duration_ms 的阶段同时记入当前请求的 Trace"""
+    if "duration_ms" in details:
+        attrs = {key: value for key, value in details.items() if key != "duration_ms"}
+        tracing.record_span(stage, details["duration_ms"], **attrs)
+    if progress is not None:
+        await progress(stage, **details)
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _window_reporter(progress: Optional[ProgressCallback]):
+    """把 B-Model 的窗口完成回调转成 chunk_polished 阶段事件"""
+    if progress is None:
+        return None
+
+    async def on_window_done(**details: Any):
+        await progress("chunk_polished", **details)
+
+    return on_window_done
+
+
+def _profile_fingerprint() -> str:
+    """编译档案指纹：C-Model 或字体映射变化后，旧档案不再可信"""
+    return f"{llm_engine.parse_model_label}:{llm_engine.font_config_version}"
+
+
+def _is_current_profile(entry: PresetEntry, file_hash: Optional[str]) -> bool:
+    if entry.fingerprint != _profile_fingerprint():
+        return False
+    # 本次上传了手册时，档案必须来自同一份手册
+    return file_hash is None or entry.source_hash == file_hash
+
+
+async def compile_profile(
+    school_id: str,
+    rag_context: str,
+    source_hash: Optional[str],
+    bypass_cache: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    把排版手册上下文单独交给 C-Model 抽取 (不混入用户指令)，校验后保存为该学校的编译档案。
+    返回抽取出的规则字典；抽取失败或结果无法通过校验时返回 None。
+    """
+    config = await llm_engine.aparse_layout_config(rag_context, "", use_cache=not bypass_cache)
+    if not config:
+        return None
+    try:
+        MergerEngine.merge(json_preset_dict=config)
+    except Exception as e:
+        logger.warning(f"Compiled profile for {school_id} failed validation: {e}")
+        return None
+
+    if source_hash is None:
+        manifest = await run_blocking(rule_manifest_store.get, school_id)
+        source_hash = manifest.file_hash if manifest else None
+    try:
+        await run_blocking(preset_registry.save_compiled, school_id, config, source_hash, _profile_fingerprint())
+    except Exception as e:
+        logger.error(f"Failed to save compiled profile for {school_id}: {e}")
+    return config
+
+
+async def resolve_style(
+    school_id: str,
+    user_prompt: str = "",
+    rule_path: Optional[str] = None,
+    bypass_cache: bool = False,
+    progress: Optional[ProgressCallback] = None
+) -> GlobalStyleConfig:
+    """
+    样式解析链路：规则提取/入库 -> L3 预设 -> L2 检索 -> 快速通道 / C-Model -> 四级合并。
+    """
+    metrics.bind_school(school_id)
+    # Ingest to RAG (Level 2 Source)
+    has_custom_rules = False
+    rule_chunks: List[RuleChunk] = []
+    file_hash: Optional[str] = None
+    if rule_path:
+        started = time.perf_counter()
+        file_hash, ingested = await run_blocking(template_loader.check_rule_file, rule_path, school_id)
+        if not ingested:
+            # 新手册：本次请求只做提取切片，向量化入库不阻塞请求
+            rule_chunks = await run_blocking(template_loader.extract_rule_chunks, rule_path)
+            if rule_chunks:
+                ingest = run_blocking(template_loader.ingest_chunks, rule_chunks, school_id, file_hash)
+                if settings.RULE_INGEST_BACKGROUND:
+                    spawn_background(ingest, name=f"apf-ingest-{school_id}")
+                else:
+                    await ingest
+        # 提取不出任何切片 (损坏 / 扫描版 PDF) 的手册视为未上传：不能以它的 hash 编译、保存档案
+        has_custom_rules = ingested or bool(rule_chunks)
+        if not has_custom_rules:
+            logger.warning(f"No rules extracted from uploaded manual for {school_id}; falling back to stored rules")
+            file_hash = None
+        await _report(
+            progress, "rules_extracted",
+            duration_ms=_elapsed_ms(started), chunks=len(rule_chunks), already_ingested=ingested
+        )
+
+    # --- Knowledge Retrieval (The Hybrid Loader) ---
+    # L3: 手写 JSON 预设，其次为排版手册编译档案 (过期档案视为不存在)
+    preset_entry = template_loader.get_preset_entry(school_id)
+    if preset_entry is not None and preset_entry.compiled and not _is_current_profile(preset_entry, file_hash):
+        preset_entry = None
+    json_preset = preset_entry.rules if preset_entry else None
+
+    # L2: RAG Context
+    rag_context = ""
+    if preset_entry is None or (has_custom_rules and not preset_entry.compiled):
+        # 如果有上传新规 (且没有现成的编译档案)，或者没找到任何 L3，就去查向量库
+        started = time.perf_counter()
+        if rule_chunks:
+            # 向量可能仍在后台入库，直接在本次提取的切片上做本地词法检索；无命中时取手册开头的切片
+            ranked = rank_chunks(RULE_QUERY, rule_chunks) or rule_chunks[:4]
+            rag_context = "\n\n".join(chunk.text for chunk in ranked)
+        else:
+            rag_context = await rag_engine.asearch_rules(RULE_QUERY, school_id)
+        await _report(progress, "rag_retrieved", duration_ms=_elapsed_ms(started), chars=len(rag_context))
+
+    # 没有任何 L3 时，把手册上下文编译成档案持久复用；之后的请求只需为用户指令调用 C-Model
+    if preset_entry is None and rag_context and settings.PROFILE_COMPILE_ENABLED:
+        started = time.perf_counter()
+        profile = await compile_profile(school_id, rag_context, file_hash, bypass_cache)
+        if profile:
+            json_preset = profile
+            rag_context = ""
+        await _report(progress, "profile_compiled", duration_ms=_elapsed_ms(started), compiled=profile is not None)
+
+    # Fast Path: 用户指令完全落在字体/字号/对齐/行距词表内时本地解析，作为 Level 1 直接参与合并
+    user_prompt_dict = None
+    llm_user_prompt = user_prompt
+    if user_prompt:
+        fast_result = style_fastpath.parse(user_prompt)
+        if fast_result.resolved:
+            user_prompt_dict = fast_result.config
+            llm_user_prompt = ""
+
+    # C-Model: 如果有 RAG 上下文或未被快速通道消化的用户指令，才需要调用解析模型
+    started = time.perf_counter()
+    rag_extracted_config = {}
+    if rag_context or llm_user_prompt:
+        rag_extracted_config = await llm_engine.aparse_layout_config(
+            rag_context, llm_user_prompt, use_cache=not bypass_cache
+        )
+    await _report(
+        progress, "style_parsed",
+        duration_ms=_elapsed_ms(started), fast_path=user_prompt_dict is not None
+    )
+
+    # --- The Merger (Logic Core) ---
+    # 执行四级合并：UserPrompt > RAG > JSON > Default
+    # 注意：快速通道未命中时，LLM Parser 已经把 user_prompt 和 rag_context 融合在 rag_extracted_config 里了
+    # 此时我们把 LLM 解析出的结果视为 Level 2 + Level 1 的混合体
+    with tracing.span("merged"):
+        return MergerEngine.merge(
+            user_prompt_dict=user_prompt_dict, # 快速通道命中时为本地解析结果，否则为 None
+            rag_extracted_dict=rag_extracted_config,
+            json_preset_dict=json_preset
+        )
+
+
+async def _polish_text(text: str, structured: bool, on_window_done) -> List[ContentBlock]:
+    if structured and settings.SEGMENTER_ENABLED:
+        # 已带结构标记的文本先本地分段，只把低置信片段交给 B-Model
+        return await llm_engine.astructure_content(text, on_window_done)
+    if settings.POLISH_CHUNKED:
+        return await llm_engine.apolish_content_chunked(text, on_window_done)
+    return [ContentBlock(**block) for block in await llm_engine.apolish_content(text)]
+
+
+async def build_content_blocks(
+    source: SourceDocument,
+    progress: Optional[ProgressCallback] = None
+) -> List[ContentBlock]:
+    """
+    B-Model: 润色内容 (Polisher 只负责结构化与润色，不接收样式指令)。
+    加载阶段已确定类型的块 (如 docx 的标题 / 题注样式段落) 原样保留，只有待处理文本片段走分段 / 润色。
+    """
+    on_window_done = _window_reporter(progress)
+    spans = [part for part in source.parts if isinstance(part, str)]
+    polished = iter(await asyncio.gather(*(_polish_text(span, source.structured, on_window_done) for span in spans)))
+    blocks: List[ContentBlock] = []
+    for part in source.parts:
+        if isinstance(part, str):
+            blocks.extend(next(polished))
+        else:
+            blocks.append(part)
+    return blocks
+
+
+async def stream_content_blocks(
+    source: SourceDocument,
+    progress: Optional[ProgressCallback] = None
+) -> AsyncIterator[ContentBlock]:
+    """B-Model (流式): 块闭合即产出；已确定类型的块按原位置直接产出"""
+    on_window_done = _window_reporter(progress)
+    for part in source.parts:
+        if not isinstance(part, str):
+            yield part
+        elif source.structured and settings.SEGMENTER_ENABLED:
+            async for block in llm_engine.astream_structured_content(part, on_window_done):
+                yield block
+        else:
+            async for block in llm_engine.astream_content_blocks(part, on_window_done):
+                yield block
+
+
+async def run_pipeline(
+    task_id: str,
+    source_path: str,
+    source_ext: str,
+    school_id: str,
+    user_prompt: str = "",
+    rule_path: Optional[str] = None,
+    bypass_cache: bool = False,
+    progress: Optional[ProgressCallback] = None,
+    style_config: Optional[GlobalStyleConfig] = None
+) -> Tuple[tempfile.SpooledTemporaryFile, int]:
+    """
+    完整生成流水线，返回 (渲染好的 .docx 缓冲区, 字节数)。
+    样式解析 (检索 + C-Model) 与内容润色 (B-Model) 互不依赖，并发执行。
+    传入已解析的 style_config 时 (批量场景) 跳过样式解析链路。
+    """
+    metrics.bind_school(school_id)
+    if style_config is not None:
+        style_task = asyncio.get_running_loop().create_future()
+        style_task.set_result(style_config)
+    else:
+        style_task = asyncio.create_task(
+            resolve_style(school_id, user_prompt, rule_path, bypass_cache, progress)
+        )
+    try:
+        started = time.perf_counter()
+        source = await run_blocking(load_source, source_path, source_ext)
+        await _report(
+            progress, "source_loaded",
+            duration_ms=_elapsed_ms(started), chars=source.chars, preclassified=source.preclassified
+        )
+
+        started = time.perf_counter()
+
+        if settings.POLISH_STREAMING:
+            # 流水线模式：样式就绪前到达的块先暂存，之后按批写入渲染会话
+            session = None
+            pending: List[ContentBlock] = []
+            async for block in stream_content_blocks(source, progress):
+                pending.append(block)
+                if session is None and style_task.done():
+                    session = renderer.open_session(style_task.result())
+                if session is not None and len(pending) >= settings.RENDER_STREAM_BATCH:
+                    await run_blocking(session.add_blocks, pending)
+                    pending = []
+
+            if session is None:
+                session = renderer.open_session(await style_task)
+            if pending:
+                await run_blocking(session.add_blocks, pending)
+            await _report(progress, "content_polished", duration_ms=_elapsed_ms(started), blocks=session.block_count)
+            started = time.perf_counter()
+            buffer, size = await run_blocking(session.to_buffer)
+            block_count = session.block_count
+        else:
+            content_blocks = await build_content_blocks(source, progress)
+            await _report(progress, "content_polished", duration_ms=_elapsed_ms(started), blocks=len(content_blocks))
+
+            dsl = DocumentDSL(
+                meta={"task_id": task_id, "school_id": school_id},
+                style_config=await style_task,
+                content_blocks=content_blocks
+            )
+            # 内存渲染，不落盘
+            started = time.perf_counter()
+            buffer, size = await run_blocking(renderer.render_to_buffer, dsl)
+            block_count = len(content_blocks)
+    finally:
+        if not style_task.done():
+            style_task.cancel()
+
+    await _report(progress, "rendered", duration_ms=_elapsed_ms(started), blocks=block_count, bytes=size)
+    return buffer, size
+
+
+async def run_restyle(
+    source_path: str,
+    school_id: str,
+    user_prompt: str = "",
+    rule_path: Optional[str] = None,
+    bypass_cache: bool = False,
+    progress: Optional[ProgressCallback] = None
+) -> Tuple[tempfile.SpooledTemporaryFile, int]:
+    """
+    原地重排流水线：只走样式解析链路，已写好的 .docx 保留全部内容，仅改挂学校规范样式。
+    不调用 B-Model；源文件不是合法 .docx 时抛出 InvalidDocxError。
+    """
+    metrics.bind_school(school_id)
+    # 先校验源文件，损坏的上传不触发 RAG / C-Model 调用，也不写入编译缓存
+    await run_blocking(check_docx, source_path)
+    style_config = await resolve_style(school_id, user_prompt, rule_path, bypass_cache, progress)
+
+    started = time.perf_counter()
+    buffer, size, stats = await run_blocking(restyler.restyle_to_buffer, source_path, style_config)
+    await _report(progress, "restyled", duration_ms=_elapsed_ms(started), bytes=size, **stats)
+    return buffer, size
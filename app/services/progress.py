@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 终止阶段：推送后订阅方即可断开
+TERMINAL_STAGES = ("done", "failed")
+
+
+class ProgressHub:
+    """
+    任务阶段事件的进程内广播中心。
+    每个任务保留完整事件历史 (供晚连接的订阅方回放)，并向当前订阅队列推送新事件。
+    历史按任务数做 LRU 截断，避免长时间运行后无限增长。
+    """
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._history: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def publish(self, job_id: str, event: Dict[str, Any]):
+        history = self._history.get(job_id)
+        if history is None:
+            history = self._history[job_id] = []
+            while len(self._history) > self.max_jobs:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(job_id)
+        history.append(event)
+
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait(event)
+
+    def history(self, job_id: str) -> List[Dict[str, Any]]:
+        return list(self._history.get(job_id, ()))
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """
+        注册订阅队列，并预先放入已有历史事件。
+        历史快照与注册在同一同步段内完成，不会漏掉或重复事件。
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self._history.get(job_id, ()):
+            queue.put_nowait(event)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: Optional[asyncio.Queue]):
+        queues = self._subscribers.get(job_id)
+        if queues is None or queue is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[job_id]
+
+
+# 单例导出
+progress_hub = ProgressHub()
@@ -1 +1,187 @@
- 
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Sequence
+
+from app.core.config import settings
+from app.models.schema import JobRecord, JobStatus, RuleManifest
+
+JOB_COLUMNS = [
+    "id", "status", "stage", "school_id", "user_prompt", "bypass_cache",
+    "source_path", "source_ext", "rule_path", "result_path", "error",
+    "created_at", "updated_at", "owner", "lease_expires_at",
+]
+
+# 旧版数据库缺少的列，启动时补齐
+_JOB_MIGRATIONS = {"owner": "TEXT", "lease_expires_at": "REAL"}
+
+_ACTIVE_STATUSES = (JobStatus.QUEUED.value, JobStatus.RUNNING.value)
+
+
+class JobStore:
+    """
+    异步任务状态存储 (SQLite)。
+    进程重启后依然可查询任务状态，并据此恢复或标记中断的任务。
+    多个 worker 进程共用同一个库：未完成的任务由持有租约的 runner 实例负责，租约的获取 / 接管均为条件 UPDATE (原子)。
+    """
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT NOT NULL,"
+            " school_id TEXT NOT NULL, user_prompt TEXT NOT NULL, bypass_cache INTEGER NOT NULL,"
+            " source_path TEXT NOT NULL, source_ext TEXT NOT NULL, rule_path TEXT,"
+            " result_path TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " owner TEXT, lease_expires_at REAL)"
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in _JOB_MIGRATIONS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+        self._conn.commit()
+
+    @staticmethod
+    def _to_record(row) -> JobRecord:
+        return JobRecord(**dict(zip(JOB_COLUMNS, row)))
+
+    def create(self, job: JobRecord) -> JobRecord:
+        data = job.model_dump(mode="json")
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(JOB_COLUMNS)}) VALUES ({', '.join('?' * len(JOB_COLUMNS))})",
+                [data[column] for column in JOB_COLUMNS]
+            )
+            self._conn.commit()
+        return job
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._to_record(row) if row else None
+
+    def update(self, job_id: str, **fields: Any):
+        """更新任务字段，自动刷新 updated_at"""
+        fields["updated_at"] = time.time()
+        if isinstance(fields.get("status"), JobStatus):
+            fields["status"] = fields["status"].value
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id]
+            )
+            self._conn.commit()
+
+    def list_by_status(self, *statuses: JobStatus) -> List[JobRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status IN ({', '.join('?' * len(statuses))})"
+                " ORDER BY created_at",
+                [status.value for status in statuses]
+            ).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def _execute_write(self, sql: str, params: Sequence[Any]) -> int:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+        return cursor.rowcount
+
+    def list_stale(self, now: float) -> List[JobRecord]:
+        """未完成且无人持有 (租约为空或已过期) 的任务"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status IN (?, ?)"
+                " AND (lease_expires_at IS NULL OR lease_expires_at < ?) ORDER BY created_at",
+                (*_ACTIVE_STATUSES, now)
+            ).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def acquire(self, job_id: str, owner: str, lease_expires_at: float, now: float) -> bool:
+        """接管租约已过期的未完成任务并重新排队；其他实例抢先接管时返回 False"""
+        return self._execute_write(
+            "UPDATE jobs SET status = ?, stage = ?, owner = ?, lease_expires_at = ?, updated_at = ?"
+            " WHERE id = ? AND status IN (?, ?) AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+            (JobStatus.QUEUED.value, "queued", owner, lease_expires_at, now, job_id, *_ACTIVE_STATUSES, now)
+        ) == 1
+
+    def mark_running(self, job_id: str, owner: str) -> bool:
+        """QUEUED -> RUNNING，仅当任务仍由 owner 持有"""
+        return self._execute_write(
+            "UPDATE jobs SET status = ?, stage = ?, updated_at = ? WHERE id = ? AND status = ? AND owner = ?",
+            (JobStatus.RUNNING.value, "running", time.time(), job_id, JobStatus.QUEUED.value, owner)
+        ) == 1
+
+    def renew_leases(self, owner: str, lease_expires_at: float) -> int:
+        return self._execute_write(
+            "UPDATE jobs SET lease_expires_at = ? WHERE owner = ? AND status IN (?, ?)",
+            (lease_expires_at, owner, *_ACTIVE_STATUSES)
+        )
+
+    def release(self, owner: str) -> int:
+        """正常停机：交还未完成任务 (重新排队、清空租约)，下次启动的实例可立即接管"""
+        return self._execute_write(
+            "UPDATE jobs SET status = ?, stage = ?, owner = NULL, lease_expires_at = NULL, updated_at = ?"
+            " WHERE owner = ? AND status IN (?, ?)",
+            (JobStatus.QUEUED.value, "queued", time.time(), owner, *_ACTIVE_STATUSES)
+        )
+
+    def list_finished_before(self, timestamp: float) -> List[JobRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JobStatus.SUCCEEDED.value, JobStatus.FAILED.value, timestamp)
+            ).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+
+
+class RuleManifestStore:
+    """
+    排版手册入库清单 (SQLite)。
+    记录每个 school_id 当前入库手册的文件哈希与切片 ID，用于跳过重复入库、替换旧版本。
+    """
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rule_manifests ("
+            " school_id TEXT PRIMARY KEY, file_hash TEXT NOT NULL,"
+            " chunk_ids TEXT NOT NULL, ingested_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, school_id: str) -> Optional[RuleManifest]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT school_id, file_hash, chunk_ids, ingested_at FROM rule_manifests WHERE school_id = ?",
+                (school_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return RuleManifest(school_id=row[0], file_hash=row[1], chunk_ids=json.loads(row[2]), ingested_at=row[3])
+
+    def put(self, manifest: RuleManifest):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rule_manifests (school_id, file_hash, chunk_ids, ingested_at) VALUES (?, ?, ?, ?)",
+                (manifest.school_id, manifest.file_hash, json.dumps(manifest.chunk_ids), manifest.ingested_at)
+            )
+            self._conn.commit()
+
+
+# 单例导出
+job_store = JobStore(settings.JOB_DB_PATH)
+rule_manifest_store = RuleManifestStore(settings.INGEST_DB_PATH)
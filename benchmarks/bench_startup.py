@@ -0,0 +1,83 @@
+"""
+启动耗时基准：每个场景在全新子进程中执行，取多次运行的最小值与中位数。
+
+  import        只导入应用 (引擎延迟初始化，默认模式)
+  import+init   导入后立即初始化 LLM / RAG 引擎 (等价于旧版导入即构造全部单例，或 PREWARM_ENGINES=true)
+
+用法: python benchmarks/bench_startup.py [--runs 5] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "import": (
+        "import time; t = time.perf_counter(); import app.main; "
+        "print(time.perf_counter() - t)"
+    ),
+    "import+init": (
+        "import time; t = time.perf_counter(); import app.main; "
+        "from app.engine.llm_engine import llm_engine; from app.engine.rag_engine import rag_engine; "
+        "llm_engine.get_instance(); rag_engine.get_instance(); "
+        "print(time.perf_counter() - t)"
+    ),
+}
+
+
+def run_once(code: str, env: dict) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    # 数据目录指向临时目录，不触碰 data/ 下的向量库与缓存；Key 只需非空 (不会发出请求)
+    scratch = tempfile.mkdtemp(prefix="apf-bench-")
+    env = dict(
+        os.environ,
+        ZHIPUAI_API_KEY=os.environ.get("ZHIPUAI_API_KEY") or "bench-placeholder",
+        CHROMA_PERSIST_DIRECTORY=os.path.join(scratch, "chroma"),
+        CACHE_DIR=os.path.join(scratch, "cache"),
+        UPLOAD_DIR=os.path.join(scratch, "uploads"),
+        RESULT_DIR=os.path.join(scratch, "results"),
+        JOB_DB_PATH=os.path.join(scratch, "jobs.sqlite3"),
+        INGEST_DB_PATH=os.path.join(scratch, "ingest.sqlite3"),
+        PREWARM_ENGINES="false",
+    )
+
+    results = {}
+    for name, code in SCENARIOS.items():
+        run_once(code, env)  # 预热文件系统缓存，不计入结果
+        samples = [run_once(code, env) for _ in range(args.runs)]
+        results[name] = {
+            "min_s": round(min(samples), 3),
+            "median_s": round(statistics.median(samples), 3),
+            "runs": args.runs,
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<14}{'min (s)':>10}{'median (s)':>12}")
+    for name, stats in results.items():
+        print(f"{name:<14}{stats['min_s']:>10.3f}{stats['median_s']:>12.3f}")
+    saved = results["import+init"]["median_s"] - results["import"]["median_s"]
+    print(f"\nLazy initialization saves ~{saved:.2f}s per worker start (engines initialize on first use).")
+
+
+if __name__ == "__main__":
+    main()
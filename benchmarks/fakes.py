@@ -0,0 +1,135 @@
+"""
+离线基准测试用的确定性假后端：
+  FakeChatModel   代替 ChatOpenAI，按 Prompt 类型返回固定的 C-Model 配置或由输入切出的 B-Model 块
+  FakeEmbeddings  代替智谱 embedding-3，本地哈希向量 + 每批固定延迟
+两者都支持配置延迟 (同步 sleep / 异步 await)，同一输入永远得到同一输出。
+"""
+import asyncio
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# B-Model Prompt 的特征句与输入位置 (见 app/engine/llm_engine.py 的 POLISH_PROMPT_TEMPLATE)
+POLISH_MARKER = "split the input text into logical blocks"
+_INPUT_PATTERN = re.compile(r"Input Text:\s*(.*)\Z", re.S)
+_HEADING_PATTERN = re.compile(r"^(第[一二三四五六七八九十\d]+章|\d+(\.\d+)*\s)")
+
+LAYOUT_REPLY = json.dumps({
+    "heading_1": {"family": "SimHei", "size": 16.0, "bold": True, "align": "CENTER"},
+    "body_text": {"family": "SimSun", "size": 12.0, "line_spacing": 1.5},
+}, ensure_ascii=False)
+
+STREAM_PIECE_CHARS = 24
+
+
+def polish_reply(prompt: str) -> str:
+    """把输入按空行切段：章节编号开头的短段视为标题，其余为正文"""
+    match = _INPUT_PATTERN.search(prompt)
+    text = match.group(1) if match else prompt
+    blocks = []
+    for paragraph in re.split(r"\n\s*\n", text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        is_heading = len(paragraph) <= 40 and bool(_HEADING_PATTERN.match(paragraph))
+        blocks.append({"type": "heading_1" if is_heading else "body_text", "text": paragraph})
+    return json.dumps({"blocks": blocks}, ensure_ascii=False)
+
+
+class FakeChatModel(BaseChatModel):
+    latency_ms: float = 0.0
+    model_name: str = "fake-glm"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @staticmethod
+    def _reply(messages: List[BaseMessage]) -> str:
+        prompt = str(messages[-1].content)
+        return polish_reply(prompt) if POLISH_MARKER in prompt else LAYOUT_REPLY
+
+    @staticmethod
+    def _usage(messages: List[BaseMessage], reply: str) -> dict:
+        # 粗略按 2 字符 / token 估算，保证指标链路有数据
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 2
+        completion_tokens = len(reply) // 2
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        reply = self._reply(messages)
+        message = AIMessage(content=reply, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._result(messages)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # 延迟计入首 token 之前
+        time.sleep(self.latency_ms / 1000)
+        reply = self._reply(messages)
+        for start in range(0, len(reply), STREAM_PIECE_CHARS):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=reply[start:start + STREAM_PIECE_CHARS]))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        reply = self._reply(messages)
+        for start in range(0, len(reply), STREAM_PIECE_CHARS):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=reply[start:start + STREAM_PIECE_CHARS]))
+
+
+class FakeEmbeddings(Embeddings):
+    """本地哈希向量 + 每次请求 (一批) latency_ms 的延迟"""
+
+    def __init__(self, dim: int = 256, latency_ms: float = 0.0):
+        from app.engine.embeddings import LocalHashEmbeddings
+
+        self._local = LocalHashEmbeddings(dim)
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency_ms / 1000)
+        return self._local.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._local.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+def install_fakes(llm_latency_ms: float = 0.0, embed_latency_ms: float = 0.0):
+    """
+    把应用单例的模型后端替换为假后端 (需在设置好 ZHIPUAI_API_KEY 等环境变量之后调用)。
+    LLMEngine 的 C / B 两个模型都替换并重新组装 Chain；RAGEngine 保留缓存层，只替换其下的 Embedding 后端。
+    """
+    from app.core.config import settings
+    from app.engine.llm_engine import llm_engine
+    from app.engine.rag_engine import rag_engine
+
+    llm_engine.parse_llm = FakeChatModel(latency_ms=llm_latency_ms)
+    llm_engine.polish_llm = FakeChatModel(latency_ms=llm_latency_ms)
+    rag_engine.embedding_function.backend = FakeEmbeddings(settings.LOCAL_EMBED_DIM, embed_latency_ms)
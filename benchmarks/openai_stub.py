@@ -0,0 +1,152 @@
+"""
+本地 OpenAI 兼容桩服务：模拟智谱 /chat/completions (含 SSE 流式) 与 /embeddings，
+可注入延迟、长尾与 429 / 503 故障，用于验证共享 HTTP 客户端的连接池、重试与对冲。
+
+用法:
+  python benchmarks/openai_stub.py --port 8900 --latency-ms 50 --fail-rate 0.2 --retry-after 1
+  OPENAI_BASE_URL=http://127.0.0.1:8900/v1/ ZHIPUAI_API_KEY=stub uvicorn app.main:app
+
+统计: GET /stats 返回请求数、注入的故障数与观察到的 TCP 连接数 (可据此确认 keep-alive 复用)。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_REPLY = json.dumps({"blocks": [{"type": "body_text", "text": "stub reply"}]}, ensure_ascii=False)
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="OpenAI-compatible stub")
+    counters: Counter = Counter()
+    connections = set()
+    rng = random.Random(args.seed)
+
+    async def simulate(request: Request):
+        """注入延迟与故障；返回 None 表示正常处理"""
+        counters["requests"] += 1
+        client = request.scope.get("client")
+        if client:
+            connections.add(tuple(client))
+        delay = args.latency_ms + rng.uniform(0, args.jitter_ms)
+        if rng.random() < args.slow_rate:
+            counters["slow"] += 1
+            delay += args.slow_ms
+        await asyncio.sleep(delay / 1000)
+        if rng.random() < args.fail_rate:
+            counters["failed"] += 1
+            if rng.random() < 0.5:
+                return JSONResponse({"error": {"message": "rate limited"}}, status_code=429,
+                                    headers={"Retry-After": str(args.retry_after)})
+            return JSONResponse({"error": {"message": "unavailable"}}, status_code=503)
+        return None
+
+    def embed(text: str) -> list:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        vector = [(digest[i % len(digest)] - 127.5) / 127.5 for i in range(args.dim)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        failure = await simulate(request)
+        if failure is not None:
+            return failure
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "stub")
+        usage = {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20}
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": args.reply},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def events():
+            step = max(1, len(args.reply) // 8)
+            for start in range(0, len(args.reply), step):
+                delta = {"content": args.reply[start:start + step]}
+                if start == 0:
+                    delta["role"] = "assistant"
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta,
+                                 "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(args.stream_interval_ms / 1000)
+            final = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                # 与 OpenAI 一致：用量放在 choices 为空的最后一个分块中
+                usage_chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [], "usage": usage,
+                }
+                yield f"data: {json.dumps(usage_chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        failure = await simulate(request)
+        if failure is not None:
+            return failure
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        counters["embedded_texts"] += len(inputs)
+        return {
+            "object": "list",
+            "model": body.get("model", "stub"),
+            "data": [{"object": "embedding", "index": i, "embedding": embed(str(text))} for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {**counters, "connections": len(connections)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="每个请求的基础延迟")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="额外的均匀随机延迟上限")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="长尾请求比例 (验证对冲)")
+    parser.add_argument("--slow-ms", type=float, default=2000.0, help="长尾请求的额外延迟")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回 429 / 503 的比例 (验证重试)")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 响应的 Retry-After 秒数")
+    parser.add_argument("--stream-interval-ms", type=float, default=5.0, help="SSE 分片间隔")
+    parser.add_argument("--dim", type=int, default=256, help="Embedding 维度")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="Chat 回复内容")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
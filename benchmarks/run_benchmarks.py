@@ -0,0 +1,325 @@
+"""
+离线基准套件 (无需智谱 Key，模型与 Embedding 使用 benchmarks/fakes.py 中带延迟的假后端)：
+
+  merge    MergerEngine.merge：编译缓存命中 / 未命中
+  render   DocxRenderer.render_to_buffer：10 / 1k / 20k 块的 DocumentDSL
+  ingest   TemplateLoader.ingest_user_rule_file：合成的大页数手册 PDF (首次入库 / 未变化跳过)
+  e2e      /api/v1/generate 端到端吞吐 (FastAPI TestClient，多线程并发)
+
+用法:
+  python benchmarks/run_benchmarks.py [--only merge render] [--quick] [--output results.json]
+  python benchmarks/run_benchmarks.py --baseline [--quick] [--tolerance 0.25] [--fail-on-regression]
+  python benchmarks/run_benchmarks.py --save-baseline [--quick]
+
+基线与机器相关，不随仓库提交：先在基准提交上运行 --save-baseline 生成本机基线，改动后再用 --baseline 对比。
+不带路径时按是否 --quick 读写 benchmarks/.baselines/ 下的本地文件 (已加入 .gitignore)。
+对比取每个用例 N 轮中的最小值 (min_ms)：偶发的调度 / GC 抖动只会拉高个别轮次，最小值最稳定；
+多线程并发的 e2e 与落盘的 ingest 用例噪声更大，容差按 NOISY_CASES 放宽。
+
+数据目录全部指向临时目录，不触碰 data/ 下的向量库、缓存与编译档案。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCHMARKS = ("merge", "render", "ingest", "e2e")
+
+# 本机基线的默认位置 (按是否 --quick 区分规模)
+BASELINE_DIR = os.path.join(PROJECT_ROOT, "benchmarks", ".baselines")
+DEFAULT_BASELINES = {
+    False: os.path.join(BASELINE_DIR, "baseline.json"),
+    True: os.path.join(BASELINE_DIR, "baseline-quick.json"),
+}
+
+# 用例名前缀 -> 容差倍数
+NOISY_CASES = {"e2e_": 2.0, "ingest_": 1.5}
+
+
+def prepare_environment(scratch: str, args: argparse.Namespace):
+    """必须在导入 app 之前调用：Settings 在导入时读取环境变量"""
+    rules_dir = os.path.join(scratch, "rules")
+    shutil.copytree(
+        os.path.join(PROJECT_ROOT, "data", "rules"), rules_dir,
+        ignore=shutil.ignore_patterns("_compiled")
+    )
+    os.environ.update(
+        ZHIPUAI_API_KEY=os.environ.get("ZHIPUAI_API_KEY") or "bench-placeholder",
+        EMBED_BACKEND="local",
+        RULES_DIR=rules_dir,
+        CHROMA_PERSIST_DIRECTORY=os.path.join(scratch, "chroma"),
+        CACHE_DIR=os.path.join(scratch, "cache"),
+        UPLOAD_DIR=os.path.join(scratch, "uploads"),
+        RESULT_DIR=os.path.join(scratch, "results"),
+        JOB_DB_PATH=os.path.join(scratch, "jobs.sqlite3"),
+        INGEST_DB_PATH=os.path.join(scratch, "ingest.sqlite3"),
+        TRACE_PROFILE_DIR=os.path.join(scratch, "profiles"),
+        PRESET_RELOAD_INTERVAL="0",
+        PREWARM_ENGINES="false",
+        # 基准测量的是同步入库耗时
+        RULE_INGEST_BACKGROUND="false",
+    )
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+
+    from benchmarks.fakes import install_fakes
+
+    install_fakes(llm_latency_ms=args.llm_latency_ms, embed_latency_ms=args.embed_latency_ms)
+
+
+def summarize(samples_ms: List[float], **extra: Any) -> Dict[str, Any]:
+    return {
+        "median_ms": round(statistics.median(samples_ms), 3),
+        "min_ms": round(min(samples_ms), 3),
+        "max_ms": round(max(samples_ms), 3),
+        "runs": len(samples_ms),
+        **extra,
+    }
+
+
+def measure(func: Callable[[], Any], runs: int, warmup: int = 1, number: int = 1, setup: Optional[Callable[[], Any]] = None) -> List[float]:
+    """每轮调用 func number 次，返回每次调用的平均耗时 (ms) 列表；setup 在每轮计时前执行"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    samples = []
+    for _ in range(runs):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) * 1000 / number)
+    return samples
+
+
+def bench_merge(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.core.merger import MergerEngine, style_compiler
+    from app.core.template_loader import template_loader
+
+    preset = template_loader.get_preset_rules("default") or {}
+    rag = {"body_text": {"family": "KaiTi", "size": 12.0}, "heading_1": {"size": 18.0, "bold": True}}
+    user = {"body_text": {"line_spacing": 2.0}, "caption": {"align": "CENTER"}}
+    number = 200 if args.quick else 2000
+
+    def merge():
+        MergerEngine.merge(user_prompt_dict=user, rag_extracted_dict=rag, json_preset_dict=preset)
+
+    return {
+        "merge_cached": summarize(measure(merge, runs=args.runs, number=number)),
+        "merge_uncached": summarize(measure(
+            lambda: MergerEngine._merge_uncached(user, rag, preset), runs=args.runs, number=number // 10
+        )),
+        "merge_cold_cache": summarize(measure(merge, runs=args.runs, setup=style_compiler.clear)),
+    }
+
+
+def bench_render(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.engine.renderer import renderer
+    from benchmarks.synthetic import make_dsl
+
+    results = {}
+    for block_count, runs in ((10, args.runs * 4), (1000, args.runs), (20000, 1 if args.quick else max(1, args.runs // 2))):
+        dsl = make_dsl(block_count)
+        sizes = []
+
+        def render():
+            buffer, size = renderer.render_to_buffer(dsl)
+            buffer.close()
+            sizes.append(size)
+
+        samples = measure(render, runs=runs, warmup=0 if block_count >= 20000 else 1)
+        results[f"render_{block_count}_blocks"] = summarize(
+            samples, blocks=block_count, bytes=sizes[-1],
+            blocks_per_s=round(block_count / (statistics.median(samples) / 1000), 1)
+        )
+    return results
+
+
+def bench_ingest(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.core.template_loader import template_loader
+    from benchmarks.synthetic import rule_manual_pages, write_pdf
+
+    scratch = tempfile.mkdtemp(prefix="apf-bench-pdf-")
+    results = {}
+    page_counts = (20, 100) if args.quick else (20, 200)
+    try:
+        for page_count in page_counts:
+            samples, chunks = [], 0
+            for run in range(args.runs):
+                # 每轮使用不同内容与学校，测量的是完整的 提取 -> 切片 -> 向量化 -> 入库
+                path = os.path.join(scratch, f"manual-{page_count}-{run}.pdf")
+                write_pdf(path, rule_manual_pages(page_count, salt=f"r{run}"))
+                school_id = f"bench_{page_count}_{run}"
+                started = time.perf_counter()
+                if not template_loader.ingest_user_rule_file(path, school_id):
+                    raise RuntimeError(f"Ingestion failed for {path}")
+                samples.append((time.perf_counter() - started) * 1000)
+                chunks = len(template_loader.extract_rule_chunks(path))
+            results[f"ingest_{page_count}_pages"] = summarize(samples, pages=page_count, chunks=chunks)
+
+            # 同一文件再次上传：哈希与清单一致，直接跳过
+            results[f"ingest_{page_count}_pages_unchanged"] = summarize(measure(
+                lambda: template_loader.ingest_user_rule_file(path, school_id), runs=args.runs, warmup=0
+            ))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def bench_e2e(args: argparse.Namespace) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from benchmarks.synthetic import draft_text
+
+    draft = draft_text(chapters=3, paragraphs_per_chapter=4).encode("utf-8")
+    requests = 16 if args.quick else args.e2e_requests
+    results = {}
+
+    with TestClient(app) as client:
+        def generate(user_prompt: str) -> float:
+            started = time.perf_counter()
+            response = client.post(
+                "/api/v1/generate",
+                files={"source_file": ("draft.md", draft, "text/markdown")},
+                data={"school_id": "default", "user_prompt": user_prompt}
+            )
+            response.raise_for_status()
+            return (time.perf_counter() - started) * 1000
+
+        # 快速通道命中 (无 C-Model) 与需要 C-Model 的指令 (首次之后命中响应缓存)
+        for case, user_prompt in (("fastpath", "正文宋体小四，行距1.5倍"), ("c_model", "正文使用一种庄重的风格")):
+            generate(user_prompt)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.e2e_concurrency) as pool:
+                latencies = list(pool.map(lambda _: generate(user_prompt), range(requests)))
+            elapsed = time.perf_counter() - started
+            latencies.sort()
+            results[f"e2e_generate_{case}"] = summarize(
+                latencies,
+                p95_ms=round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                throughput_rps=round(requests / elapsed, 2),
+                concurrency=args.e2e_concurrency
+            )
+    return results
+
+
+def case_tolerance(case: str, tolerance: float) -> float:
+    return tolerance * next((factor for prefix, factor in NOISY_CASES.items() if case.startswith(prefix)), 1.0)
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float = 0.0) -> List[str]:
+    """
+    按 min_ms 与基线对比，打印对比表，返回退化的用例名。
+    变慢比例超过该用例的容差且绝对差值不小于 min_delta_ms 才计为退化。
+    """
+    regressions = []
+    print(f"\n{'case':<36}{'baseline ms':>14}{'current ms':>14}{'change':>10}{'limit':>8}")
+    for case, current in results.items():
+        base = baseline.get(case)
+        if base is None:
+            print(f"{case:<36}{'-':>14}{current['min_ms']:>14.3f}{'new':>10}")
+            continue
+        limit = case_tolerance(case, tolerance)
+        change = current["min_ms"] / base["min_ms"] - 1 if base["min_ms"] else 0.0
+        flag = ""
+        if change > limit and current["min_ms"] - base["min_ms"] >= min_delta_ms:
+            flag = "  REGRESSION"
+            regressions.append(case)
+        print(f"{case:<36}{base['min_ms']:>14.3f}{current['min_ms']:>14.3f}{change:>+10.1%}{limit:>8.0%}{flag}")
+    return regressions
+
+
+def load_baseline(path: str, quick: bool) -> Dict[str, Any]:
+    """读取基线结果；文件不存在或规模 (--quick) 不一致时直接退出并提示如何生成"""
+    hint = f"create it with: python benchmarks/run_benchmarks.py --save-baseline {path}{' --quick' if quick else ''}"
+    if not os.path.exists(path):
+        sys.exit(f"Baseline {path} not found; {hint}")
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    if report.get("meta", {}).get("quick", False) != quick:
+        sys.exit(f"Baseline {path} was recorded {'without' if quick else 'with'} --quick and is not comparable; {hint}")
+    return report["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="只运行指定的基准")
+    parser.add_argument("--runs", type=int, default=7, help="每个用例的计时轮数 (对比取最小值，轮数越多越稳定)")
+    parser.add_argument("--quick", action="store_true", help="缩小规模 (CI 冒烟)")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="假模型每次调用的延迟")
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0, help="假 Embedding 每批的延迟")
+    parser.add_argument("--e2e-requests", type=int, default=64)
+    parser.add_argument("--e2e-concurrency", type=int, default=8)
+    parser.add_argument("--output", help="结果 JSON 写入路径 (默认只打印)")
+    parser.add_argument("--baseline", nargs="?", const="", help="与该基线 JSON 对比 (不带路径时使用本机基线)")
+    parser.add_argument("--save-baseline", nargs="?", const="", help="把本次结果保存为基线 (不带路径时写入本机基线)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="min 变慢超过该比例视为退化 (噪声较大的用例按 NOISY_CASES 放宽)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="min 变慢不足该毫秒数时不计为退化 (亚毫秒用例的计时噪声)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="存在退化时以非零状态退出")
+    args = parser.parse_args()
+    for option in ("baseline", "save_baseline"):
+        if getattr(args, option) == "":
+            setattr(args, option, DEFAULT_BASELINES[args.quick])
+
+    # 先检查基线再跑基准，避免跑完才发现无从对比
+    baseline = None
+    if args.baseline:
+        baseline = load_baseline(args.baseline, args.quick)
+
+    scratch = tempfile.mkdtemp(prefix="apf-bench-")
+    try:
+        prepare_environment(scratch, args)
+        runners = {"merge": bench_merge, "render": bench_render, "ingest": bench_ingest, "e2e": bench_e2e}
+        results: Dict[str, Any] = {}
+        for name in args.only or BENCHMARKS:
+            started = time.perf_counter()
+            results.update(runners[name](args))
+            print(f"[{name}] done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        from app.core.executor import shutdown_process_pool
+
+        shutdown_process_pool()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "llm_latency_ms": args.llm_latency_ms,
+            "embed_latency_ms": args.embed_latency_ms,
+            "runs": args.runs,
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    for path in filter(None, (args.output, args.save_baseline)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than baseline beyond tolerance: {', '.join(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
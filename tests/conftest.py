@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+
+# 在导入 app 之前把数据目录指向临时目录，避免测试写入 ./data
+_DATA_DIR = tempfile.mkdtemp(prefix="thesis-tests-")
+for _name, _value in {
+    "CHROMA_PERSIST_DIRECTORY": "chroma_db",
+    "UPLOAD_DIR": "uploads",
+    "RULES_DIR": "rules",
+    "TEMPLATE_SOURCE_DIR": "templates_source",
+    "CACHE_DIR": "cache",
+    "RESULT_DIR": "results",
+    "JOB_DB_PATH": "jobs.sqlite3",
+    "INGEST_DB_PATH": "ingest.sqlite3",
+    "TRACE_PROFILE_DIR": "profiles",
+}.items():
+    os.environ.setdefault(_name, os.path.join(_DATA_DIR, _value))
+os.environ.setdefault("ZHIPUAI_API_KEY", "test")
+os.environ.setdefault("PRESET_RELOAD_INTERVAL", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import argparse
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def stub_engine(monkeypatch):
+    """
+    工厂：构造真实的 LLMEngine，HTTP 请求经 ASGITransport 交给进程内的 OpenAI 兼容桩服务
+    (benchmarks/openai_stub.py)。返回 (engine, 桩服务的 /stats 读取函数)。
+    """
+    from app.core.config import settings
+    from app.engine import llm_engine as llm_module
+    from benchmarks.openai_stub import DEFAULT_REPLY, create_app
+
+    def build(reply: str = DEFAULT_REPLY, layout_cache: bool = False):
+        stub_args = argparse.Namespace(
+            latency_ms=0.0, jitter_ms=0.0, slow_rate=0.0, slow_ms=0.0, fail_rate=0.0,
+            retry_after=1, stream_interval_ms=0.0, dim=8, reply=reply, seed=0
+        )
+        stub = create_app(stub_args)
+        transport = httpx.ASGITransport(app=stub)
+        monkeypatch.setattr(settings, "OPENAI_BASE_URL", "http://stub/v1/")
+        monkeypatch.setattr(settings, "LAYOUT_CACHE_ENABLED", layout_cache)
+        monkeypatch.setattr(llm_module.http_pool, "get_client", lambda: httpx.Client())
+        monkeypatch.setattr(llm_module.http_pool, "get_async_client", lambda: httpx.AsyncClient(transport=transport))
+
+        async def stats():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=stub), base_url="http://stub") as client:
+                return (await client.get("/stats")).json()
+
+        return llm_module.LLMEngine(), stats
+
+    return build
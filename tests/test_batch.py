@@ -0,0 +1,72 @@
+import asyncio
+import io
+import json
+import os
+import zipfile
+
+from app.core.config import settings
+from app.models.schema import GlobalStyleConfig
+from app.services import batch
+from app.services.batch import BatchSource, extract_zip_sources
+
+
+def _zip(path, members):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+
+
+def test_extract_keeps_supported_drafts_only(tmp_path):
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    zip_path = tmp_path / "drafts.zip"
+    _zip(zip_path, [
+        ("../../escape/chapter1.md", "# 第一章"),
+        ("notes/readme.exe", b"MZ"),
+        ("__MACOSX/._chapter1.md", b""),
+        ("chapter2.TXT", "正文"),
+    ])
+    sources = extract_zip_sources(str(zip_path), "b1", start_index=3)
+    assert [(s.name, s.ext) for s in sources] == [("chapter1.md", "md"), ("chapter2.TXT", "txt")]
+    # 落盘路径由批次号生成，成员路径中的 .. 不生效
+    assert [os.path.basename(s.path) for s in sources] == ["b1_3_source.md", "b1_4_source.txt"]
+    assert all(os.path.dirname(s.path) == settings.UPLOAD_DIR for s in sources)
+
+
+def test_output_names_are_unique():
+    sources = [BatchSource(name=name, path="", ext="md") for name in ("a.md", "a.txt", "a.md", ".md")]
+    assert batch._output_names(sources) == ["a.docx", "a_2.docx", "a_3.docx", "paper.docx"]
+
+
+def test_stream_batch_shares_style_and_writes_manifest(monkeypatch, tmp_path):
+    style = GlobalStyleConfig()
+    seen_styles = []
+    sources = []
+    for name in ("ok.md", "bad.md"):
+        path = tmp_path / name
+        path.write_text("正文", encoding="utf-8")
+        sources.append(BatchSource(name=name, path=str(path), ext="md"))
+
+    async def run_pipeline(task_id, source_path, source_ext, school_id, progress, style_config):
+        seen_styles.append(style_config)
+        if source_path.endswith("bad.md"):
+            raise ValueError("broken draft")
+        await progress("rendered", blocks=3)
+        return io.BytesIO(b"docx-bytes"), len(b"docx-bytes")
+
+    monkeypatch.setattr(batch, "run_pipeline", run_pipeline)
+
+    async def collect():
+        return b"".join([chunk async for chunk in batch.stream_batch("b2", sources, "demo", style)])
+
+    with zipfile.ZipFile(io.BytesIO(asyncio.run(collect()))) as archive:
+        assert archive.read("ok.docx") == b"docx-bytes"
+        assert "bad.docx" not in archive.namelist()
+        manifest = json.loads(archive.read(batch.MANIFEST_NAME))
+
+    assert all(s is style for s in seen_styles) and len(seen_styles) == 2
+    assert (manifest["succeeded"], manifest["failed"]) == (1, 1)
+    ok, bad = manifest["files"]
+    assert ok["status"] == "succeeded" and ok["blocks"] == 3
+    assert bad["status"] == "failed" and bad["error"] == "broken draft" and bad["output"] is None
+    # 草稿文件在结束时清理
+    assert not any(os.path.exists(s.path) for s in sources)
@@ -0,0 +1,25 @@
+from benchmarks.run_benchmarks import case_tolerance, compare
+
+
+def _case(min_ms, median_ms=None):
+    return {"min_ms": min_ms, "median_ms": median_ms or min_ms * 2, "max_ms": min_ms * 3, "runs": 7}
+
+
+def test_compare_uses_min_of_runs():
+    baseline = {"render_1000_blocks": _case(200.0, median_ms=210.0)}
+    # median 抖动翻倍，但最小值不变：不算退化
+    assert compare({"render_1000_blocks": _case(205.0, median_ms=420.0)}, baseline, 0.25) == []
+    assert compare({"render_1000_blocks": _case(300.0)}, baseline, 0.25) == ["render_1000_blocks"]
+
+
+def test_noisy_cases_get_wider_tolerance():
+    assert case_tolerance("e2e_generate_preset", 0.25) == 0.5
+    assert case_tolerance("merge_cached", 0.25) == 0.25
+    baseline = {"e2e_generate_preset": _case(100.0), "merge_uncached": _case(100.0)}
+    results = {"e2e_generate_preset": _case(140.0), "merge_uncached": _case(140.0)}
+    assert compare(results, baseline, 0.25) == ["merge_uncached"]
+
+
+def test_sub_threshold_deltas_are_noise():
+    baseline = {"merge_cached": _case(0.02)}
+    assert compare({"merge_cached": _case(0.05)}, baseline, 0.25, min_delta_ms=1.0) == []
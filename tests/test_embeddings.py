@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.engine.embeddings import CachedEmbeddings, EmbeddingCache, LocalHashEmbeddings
+
+
+class CountingEmbeddings(LocalHashEmbeddings):
+    """记录每次发往后端的批次"""
+
+    def __init__(self):
+        super().__init__(dim=8)
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), max_entries=100)
+
+
+def _client(cache, batch_size=2, concurrency=2):
+    backend = CountingEmbeddings()
+    return CachedEmbeddings(backend, "test-model", cache, batch_size=batch_size, concurrency=concurrency), backend
+
+
+def test_local_embeddings_are_deterministic_and_normalized():
+    embeddings = LocalHashEmbeddings(dim=16)
+    vector = embeddings.embed_query("正文小四号宋体")
+    assert vector == embeddings.embed_documents(["正文小四号宋体"])[0]
+    assert sum(v * v for v in vector) == pytest.approx(1.0)
+
+
+def test_cache_keys_include_model_name():
+    assert EmbeddingCache.make_key("a", "text") != EmbeddingCache.make_key("b", "text")
+
+
+def test_only_missing_unique_texts_reach_backend(cache):
+    client, backend = _client(cache)
+    texts = ["甲", "乙", "甲", "丙", "丁"]
+    first = client.embed_documents(texts)
+    assert sorted(len(b) for b in backend.batches) == [2, 2]
+    assert first[0] == first[2]
+
+    backend.batches.clear()
+    second = client.embed_documents(["乙", "戊"])
+    assert backend.batches == [["戊"]]
+    assert second[0] == pytest.approx(first[1], abs=1e-6)
+    assert (cache.hits, cache.misses) == (1, 5)
+
+
+def test_async_path_matches_sync(cache):
+    client, backend = _client(cache, batch_size=1, concurrency=3)
+    vectors = asyncio.run(client.aembed_documents(["甲", "乙", "丙"]))
+    assert len(backend.batches) == 3
+    backend.batches.clear()
+    cached = client.embed_documents(["甲", "乙", "丙"])
+    assert all(a == pytest.approx(b, abs=1e-6) for a, b in zip(cached, vectors))
+    assert backend.batches == []
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "small.sqlite3"), max_entries=2)
+    cache.put_many({"a": [1.0]})
+    cache.put_many({"b": [2.0]})
+    cache.get_many(["a"])
+    cache.put_many({"c": [3.0]})
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache.stats()["entries"] == 2
+
+
+def test_without_cache_still_batches():
+    client, backend = _client(None, batch_size=3)
+    client.embed_documents(["1", "2", "3", "4"])
+    assert sorted(len(b) for b in backend.batches) == [1, 3]
+    assert client.stats() is None
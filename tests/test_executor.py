@@ -0,0 +1,47 @@
+import asyncio
+import contextvars
+
+from app.core.config import settings
+from app.core.executor import get_llm_limiter, run_blocking
+
+
+async def _peak_concurrency(calls: int) -> int:
+    active = peak = 0
+
+    async def call():
+        nonlocal active, peak
+        async with get_llm_limiter():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*(call() for _ in range(calls)))
+    return peak
+
+
+def test_limiter_bounds_concurrency():
+    assert asyncio.run(_peak_concurrency(settings.LLM_MAX_CONCURRENCY * 2)) == settings.LLM_MAX_CONCURRENCY
+
+
+def test_limiter_works_across_event_loops():
+    # 每次 asyncio.run 都是新循环 (等同于多次 lifespan)，不能复用绑定在旧循环上的 Semaphore
+    for _ in range(2):
+        asyncio.run(_peak_concurrency(settings.LLM_MAX_CONCURRENCY + 1))
+
+
+def test_limiter_is_shared_within_a_loop():
+    async def pair():
+        return get_llm_limiter() is get_llm_limiter()
+
+    assert asyncio.run(pair())
+
+
+def test_run_blocking_carries_context():
+    school = contextvars.ContextVar("school", default=None)
+
+    async def main():
+        school.set("demo")
+        return await run_blocking(school.get)
+
+    assert asyncio.run(main()) == "demo"
@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.http_client import AsyncRetryTransport, HTTPClientPool, RetryPolicy, RetryTransport
+
+
+def _policy(max_retries=2):
+    return RetryPolicy(max_retries=max_retries, base_delay=0.0, max_delay=0.0)
+
+
+def _replies(*statuses):
+    """按顺序返回给定状态码的 MockTransport 处理函数，并记录调用次数"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1])
+
+    return handler, calls
+
+
+def test_retry_after_seconds_and_cap():
+    policy = RetryPolicy(max_retries=3, base_delay=0.5, max_delay=5.0)
+    assert policy.delay(0, httpx.Response(429, headers={"Retry-After": "2"})) == 2.0
+    assert policy.delay(0, httpx.Response(429, headers={"Retry-After": "60"})) == 5.0
+    assert 0.25 <= policy.delay(0) <= 0.5
+
+
+def test_sync_transport_retries_retryable_status():
+    handler, calls = _replies(503, 429, 200)
+    transport = RetryTransport(httpx.MockTransport(handler), _policy())
+    with httpx.Client(transport=transport) as client:
+        assert client.post("http://model/v1/chat", json={"q": 1}).status_code == 200
+    assert len(calls) == 3
+    assert transport.policy.retries == 2
+
+
+def test_sync_transport_gives_up_after_max_retries():
+    handler, calls = _replies(500)
+    with httpx.Client(transport=RetryTransport(httpx.MockTransport(handler), _policy(1))) as client:
+        assert client.post("http://model/v1/chat", json={}).status_code == 500
+    assert len(calls) == 2
+
+
+def test_non_retryable_status_returns_immediately():
+    handler, calls = _replies(400)
+    with httpx.Client(transport=RetryTransport(httpx.MockTransport(handler), _policy())) as client:
+        assert client.post("http://model/v1/chat", json={}).status_code == 400
+    assert len(calls) == 1
+
+
+def test_async_transport_retries_connect_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200)
+
+    async def main():
+        transport = AsyncRetryTransport(httpx.MockTransport(handler), _policy())
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.post("http://model/v1/chat", json={})
+
+    assert asyncio.run(main()).status_code == 200
+    assert len(calls) == 2
+
+
+def test_hedge_takes_faster_response():
+    delays = [0.5, 0.0]
+
+    async def handler(request):
+        await asyncio.sleep(delays.pop(0))
+        return httpx.Response(200)
+
+    async def main():
+        transport = AsyncRetryTransport(httpx.MockTransport(handler), _policy(0), hedge_delay=0.05)
+        async with httpx.AsyncClient(transport=transport) as client:
+            started = asyncio.get_running_loop().time()
+            response = await client.post("http://model/v1/chat", json={})
+            return transport, response, asyncio.get_running_loop().time() - started
+
+    transport, response, elapsed = asyncio.run(main())
+    assert response.status_code == 200
+    assert (transport.hedges, transport.hedge_wins) == (1, 1)
+    assert elapsed < 0.4
+
+
+@pytest.mark.parametrize("closes", [1, 2])
+def test_pool_clients_survive_aclose(closes):
+    pool = HTTPClientPool()
+    client = pool.get_async_client()
+    for _ in range(closes):
+        asyncio.run(pool.aclose())
+    assert pool.get_async_client() is client
+    assert not client.is_closed
@@ -0,0 +1,92 @@
+import sqlite3
+import time
+import uuid
+
+import pytest
+
+from app.models.schema import JobRecord, JobStatus
+from app.services.job_runner import JobRunner
+from app.services.progress import ProgressHub
+from app.services.storage import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def _job(store, source_path, **fields) -> JobRecord:
+    now = time.time()
+    return store.create(JobRecord(
+        id=uuid.uuid4().hex, school_id="demo", source_path=source_path, source_ext="md",
+        created_at=now, updated_at=now, **fields
+    ))
+
+
+def _runner(store, owner) -> JobRunner:
+    runner = JobRunner(store, workers=1, hub=ProgressHub())
+    runner.owner = owner
+    return runner
+
+
+def test_live_lease_is_not_taken_over(store, tmp_path):
+    source = tmp_path / "draft.md"
+    source.write_text("正文", encoding="utf-8")
+    job = _job(store, str(source), status=JobStatus.RUNNING, owner="a", lease_expires_at=time.time() + 60)
+    assert _runner(store, "b")._recover() == []
+    assert store.get(job.id).owner == "a"
+
+
+def test_expired_lease_is_taken_over_once(store, tmp_path):
+    source = tmp_path / "draft.md"
+    source.write_text("正文", encoding="utf-8")
+    job = _job(store, str(source), status=JobStatus.RUNNING, owner="a", lease_expires_at=time.time() - 1)
+    assert [j.id for j in _runner(store, "b")._recover()] == [job.id]
+    # 另一个实例随后扫描时租约已被 b 持有
+    assert _runner(store, "c")._recover() == []
+    record = store.get(job.id)
+    assert (record.status, record.owner) == (JobStatus.QUEUED, "b")
+    assert not store.mark_running(job.id, "a")
+    assert store.mark_running(job.id, "b")
+
+
+def test_job_without_source_fails_on_takeover(store):
+    job = _job(store, "/nonexistent/draft.md", status=JobStatus.RUNNING, owner="a", lease_expires_at=0.0)
+    assert _runner(store, "b")._recover() == []
+    assert store.get(job.id).status == JobStatus.FAILED
+
+
+def test_release_requeues_for_immediate_takeover(store, tmp_path):
+    source = tmp_path / "draft.md"
+    source.write_text("正文", encoding="utf-8")
+    job = _job(store, str(source), status=JobStatus.RUNNING, owner="a", lease_expires_at=time.time() + 60)
+    assert store.release("a") == 1
+    assert [j.id for j in _runner(store, "b")._recover()] == [job.id]
+
+
+def test_renew_extends_only_own_active_jobs(store):
+    mine = _job(store, "/tmp/a.md", status=JobStatus.RUNNING, owner="a", lease_expires_at=1.0)
+    done = _job(store, "/tmp/b.md", status=JobStatus.SUCCEEDED, owner="a", lease_expires_at=1.0)
+    other = _job(store, "/tmp/c.md", status=JobStatus.RUNNING, owner="b", lease_expires_at=1.0)
+    assert store.renew_leases("a", 100.0) == 1
+    assert [store.get(j.id).lease_expires_at for j in (mine, done, other)] == [100.0, 1.0, 1.0]
+
+
+def test_legacy_database_is_migrated(tmp_path):
+    path = str(tmp_path / "legacy.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT NOT NULL,"
+        " school_id TEXT NOT NULL, user_prompt TEXT NOT NULL, bypass_cache INTEGER NOT NULL,"
+        " source_path TEXT NOT NULL, source_ext TEXT NOT NULL, rule_path TEXT,"
+        " result_path TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO jobs VALUES ('old', 'running', 'running', 'demo', '', 0, '/tmp/x.md', 'md', NULL, NULL, NULL, 1, 1)"
+    )
+    conn.commit()
+    conn.close()
+    store = JobStore(path)
+    assert store.get("old").owner is None
+    # 旧库中的未完成任务没有租约，视为可接管
+    assert [job.id for job in store.list_stale(time.time())] == ["old"]
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from app.engine.llm_cache import LayoutResponseCache
+
+VALID_REPLY = json.dumps({"body_text": {"family": "SimSun", "size": 12.0}})
+INVALID_REPLY = json.dumps({"body_text": {"size": "very large"}})
+
+
+def test_cache_round_trip_and_lru(tmp_path):
+    cache = LayoutResponseCache(str(tmp_path / "layout.sqlite3"), max_entries=2, ttl_seconds=0)
+    for key in ("a", "b"):
+        cache.put(key, {"key": key})
+    assert cache.get("a") == {"key": "a"}
+    cache.put("c", {"key": "c"})
+    # b 最久未访问，被淘汰
+    assert cache.get("b") is None
+    assert cache.get("a") == {"key": "a"}
+
+
+def test_expired_entries_miss(tmp_path, monkeypatch):
+    cache = LayoutResponseCache(str(tmp_path / "layout.sqlite3"), max_entries=10, ttl_seconds=60)
+    cache.put("k", {"v": 1})
+    real_time = __import__("time").time
+    monkeypatch.setattr("app.engine.llm_cache.time.time", lambda: real_time() + 120)
+    assert cache.get("k") is None
+
+
+def test_key_depends_on_model_and_font_config():
+    key = LayoutResponseCache.make_key("prompt", "glm-4-flash", "v1")
+    assert key == LayoutResponseCache.make_key("prompt", "glm-4-flash", "v1")
+    assert key != LayoutResponseCache.make_key("prompt", "glm-4-plus", "v1")
+    assert key != LayoutResponseCache.make_key("prompt", "glm-4-flash", "v2")
+
+
+def test_valid_reply_is_served_from_cache(stub_engine):
+    engine, stats = stub_engine(reply=VALID_REPLY, layout_cache=True)
+    engine.layout_cache.clear()
+    first = asyncio.run(engine.aparse_layout_config("正文小四宋体", ""))
+    second = asyncio.run(engine.aparse_layout_config("正文小四宋体", ""))
+    assert first == second == json.loads(VALID_REPLY)
+    assert asyncio.run(stats())["requests"] == 1
+
+
+def test_invalid_reply_is_not_cached(stub_engine):
+    engine, stats = stub_engine(reply=INVALID_REPLY, layout_cache=True)
+    engine.layout_cache.clear()
+    assert asyncio.run(engine.aparse_layout_config("正文小四宋体", "")) == {}
+    assert asyncio.run(engine.aparse_layout_config("正文小四宋体", "")) == {}
+    assert asyncio.run(stats())["requests"] == 2
+    assert engine.layout_cache.stats()["entries"] == 0
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from app.core.lazy import LazySingleton
+
+
+class Engine:
+    def __init__(self):
+        self.value = 1
+
+    def ping(self):
+        return "pong"
+
+
+def test_factory_runs_on_first_attribute_access():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return Engine()
+
+    proxy = LazySingleton(factory, "engine")
+    assert not proxy.is_initialized
+    assert "pending" in repr(proxy)
+    assert calls == []
+
+    assert proxy.ping() == "pong"
+    assert proxy.is_initialized and calls == [1]
+    assert proxy.get_instance() is proxy.get_instance()
+
+
+def test_setattr_is_forwarded_to_instance():
+    proxy = LazySingleton(Engine, "engine")
+    proxy.value = 5
+    assert proxy.get_instance().value == 5
+
+
+def test_concurrent_first_access_builds_once():
+    calls = []
+
+    def slow_factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return Engine()
+
+    proxy = LazySingleton(slow_factory, "engine")
+    instances = []
+    threads = [threading.Thread(target=lambda: instances.append(proxy.get_instance())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert all(instance is instances[0] for instance in instances)
+
+
+def test_importing_app_does_not_build_engines():
+    # 在全新进程中导入，避免受本进程中其他测试已加载模块的影响
+    code = (
+        "import sys, app.main\n"
+        "from app.engine.llm_engine import llm_engine\n"
+        "from app.engine.rag_engine import rag_engine\n"
+        "assert not llm_engine.is_initialized and not rag_engine.is_initialized\n"
+        "heavy = [m for m in ('chromadb', 'langchain_openai', 'langchain_chroma') if m in sys.modules]\n"
+        "assert not heavy, heavy\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
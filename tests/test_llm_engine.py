@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.schema import ContentType
+
+
+@pytest.fixture
+def engine(stub_engine):
+    return stub_engine()[0]
+
+
+def _tokens(kind: str, model: str, direction: str) -> float:
+    return sum(
+        value for labels, value in metrics.model_tokens._values.items()
+        if labels[0] == kind and labels[1] == model and labels[3] == direction
+    )
+
+
+async def _collect(engine, text):
+    return [block async for block in engine.astream_content_blocks(text)]
+
+
+def test_streamed_polish_records_token_usage(engine):
+    model = engine.polish_model_label
+    before = _tokens("b_model", model, "completion")
+    blocks = asyncio.run(_collect(engine, "一段需要润色的正文。"))
+    assert [(block.type, block.text) for block in blocks] == [(ContentType.BODY_TEXT, "stub reply")]
+    assert _tokens("b_model", model, "completion") - before == 10
+    assert _tokens("b_model", model, "prompt") > 0
+
+
+def test_model_labels_follow_settings(engine):
+    assert engine.parse_model_label == settings.MODEL_PARSE
+    assert engine.polish_model_label == settings.MODEL_POLISH
@@ -0,0 +1,63 @@
+from app.core.merger import MergerEngine, StyleCompiler
+from app.models.schema import FontStyle
+
+
+def test_same_inputs_return_the_compiled_object():
+    compiler = StyleCompiler(max_entries=4)
+    first = compiler.compile({"body_text": {"size": 10.5}}, None, {"heading_1": {"family": "SimHei"}})
+    second = compiler.compile({"body_text": {"size": 10.5}}, None, {"heading_1": {"family": "SimHei"}})
+    assert first is second
+    assert (compiler.hits, compiler.misses) == (1, 1)
+    assert first.body_text.size == 10.5
+
+
+def test_fingerprint_ignores_key_order_but_not_layer():
+    a = StyleCompiler.fingerprint({"x": 1, "y": 2}, None, None)
+    b = StyleCompiler.fingerprint({"y": 2, "x": 1}, None, None)
+    assert a == b
+    assert a != StyleCompiler.fingerprint(None, {"x": 1, "y": 2}, None)
+
+
+def test_priority_user_over_rag_over_preset():
+    compiler = StyleCompiler(max_entries=4)
+    config = compiler.compile(
+        {"body_text": {"size": 14.0}},
+        {"body_text": {"size": 12.0, "family": "KaiTi"}},
+        {"body_text": {"size": 10.0, "family": "SimSun", "align": "left"}},
+    )
+    assert config.body_text.size == 14.0
+    assert config.body_text.family == "KaiTi"
+    assert config.body_text.align.value == "LEFT"
+
+
+def test_cache_is_bounded_lru():
+    compiler = StyleCompiler(max_entries=2)
+    first = compiler.compile({"body_text": {"size": 10.0}})
+    compiler.compile({"body_text": {"size": 11.0}})
+    # 访问 first 使其成为最近使用，随后插入的新条目淘汰 11.0
+    compiler.compile({"body_text": {"size": 10.0}})
+    compiler.compile({"body_text": {"size": 12.0}})
+    assert len(compiler._cache) == 2
+    assert compiler.compile({"body_text": {"size": 10.0}}) is first
+    misses = compiler.misses
+    compiler.compile({"body_text": {"size": 11.0}})
+    assert compiler.misses == misses + 1
+
+
+def test_merge_does_not_share_state_with_preset():
+    preset = {"heading_1": {"family": "SimHei"}}
+    MergerEngine._merge_uncached(json_preset_dict=preset)
+    assert preset == {"heading_1": {"family": "SimHei"}}
+
+
+def test_resolve_block_style_without_override_returns_base():
+    base = FontStyle(family="SimSun", size=12.0)
+    assert MergerEngine.resolve_block_style(base, None) is base
+
+
+def test_resolve_block_style_merges_and_interns():
+    base = FontStyle(family="SimSun", size=12.0, bold=False)
+    resolved = MergerEngine.resolve_block_style(base, FontStyle(bold=True))
+    assert resolved == FontStyle(family="SimSun", size=12.0, bold=True)
+    # 相等的 (base, override) 组合共享同一个解析结果
+    assert MergerEngine.resolve_block_style(FontStyle(family="SimSun", size=12.0, bold=False), FontStyle(bold=True)) is resolved
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from app.engine.rule_extractor import RuleChunk
+from app.services import pipeline
+
+RAG_CONFIG = {"body_text": {"family": "SimSun", "size": 12.0}}
+
+
+@pytest.fixture
+def saved(monkeypatch):
+    """隔离规则提取、检索、C-Model 与档案存储；返回 save_compiled 的调用记录"""
+    calls = []
+
+    async def parse_layout_config(rag_context, user_prompt, use_cache=True):
+        return dict(RAG_CONFIG)
+
+    async def search_rules(query, school_id):
+        return "stored manual: 正文小四宋体"
+
+    monkeypatch.setattr(pipeline.template_loader, "check_rule_file", lambda path, school_id: ("upload-hash", False))
+    monkeypatch.setattr(pipeline.template_loader, "get_preset_entry", lambda school_id: None)
+    monkeypatch.setattr(pipeline.template_loader, "ingest_chunks", lambda *args: None)
+    monkeypatch.setattr(pipeline.rag_engine, "asearch_rules", search_rules)
+    monkeypatch.setattr(pipeline.llm_engine, "aparse_layout_config", parse_layout_config)
+    monkeypatch.setattr(pipeline.rule_manifest_store, "get", lambda school_id: None)
+    monkeypatch.setattr(pipeline.preset_registry, "save_compiled", lambda *args: calls.append(args))
+    monkeypatch.setattr(pipeline.settings, "RULE_INGEST_BACKGROUND", False)
+    return calls
+
+
+def test_profile_is_compiled_from_uploaded_manual(saved, monkeypatch):
+    chunk = RuleChunk(text="正文采用小四号宋体", page_start=1, page_end=1)
+    monkeypatch.setattr(pipeline.template_loader, "extract_rule_chunks", lambda path: [chunk])
+    config = asyncio.run(pipeline.resolve_style("demo", rule_path="/tmp/manual.pdf"))
+    assert config.body_text.family == "SimSun"
+    assert [call[2] for call in saved] == ["upload-hash"]
+
+
+def test_unreadable_manual_is_not_recorded_as_profile_source(saved, monkeypatch):
+    monkeypatch.setattr(pipeline.template_loader, "extract_rule_chunks", lambda path: [])
+    asyncio.run(pipeline.resolve_style("demo", rule_path="/tmp/scanned.pdf"))
+    # 档案来自库中已有手册，不能挂在这份提取失败的上传文件名下
+    assert [call[2] for call in saved] == [None]
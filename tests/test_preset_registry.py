@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+from app.core.preset_registry import COMPILED_PROFILE_VERSION, PresetRegistry, normalize_school_id
+
+
+def _write(path, payload, mtime=None):
+    path.write_text(payload if isinstance(payload, str) else json.dumps(payload), encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return PresetRegistry(str(tmp_path), poll_interval=0)
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("  tsinghua ", "tsinghua"),
+    ("../etc/passwd", "etcpasswd"),
+    ("pku_2024-v2", "pku_2024-v2"),
+    ("清华大学", "清华大学"),
+])
+def test_normalize_school_id(raw, expected):
+    assert normalize_school_id(raw) == expected
+
+
+def test_lookup_is_normalized_and_case_insensitive(registry, tmp_path):
+    _write(tmp_path / "Tsinghua.json", {"body_text": {"size": 10.5}})
+    assert registry.get("Tsinghua") == {"body_text": {"size": 10.5}}
+    assert registry.get(" tsinghua ") == {"body_text": {"size": 10.5}}
+    assert registry.get_entry("TSINGHUA").style.body_text.size == 10.5
+    assert registry.get("pku") is None
+
+
+def test_invalid_preset_is_skipped_and_keeps_last_good_version(registry, tmp_path):
+    path = tmp_path / "pku.json"
+    _write(path, {"body_text": {"size": 12.0}}, mtime=1000)
+    _write(tmp_path / "broken.json", "[1, 2]")
+    registry.refresh()
+    assert registry.get("broken") is None
+
+    _write(path, "{not json", mtime=2000)
+    assert registry.refresh()
+    assert registry.get("pku") == {"body_text": {"size": 12.0}}
+
+
+def test_refresh_only_reports_changes(registry, tmp_path):
+    path = tmp_path / "pku.json"
+    _write(path, {"body_text": {"size": 12.0}}, mtime=1000)
+    assert registry.refresh()
+    assert not registry.refresh()
+
+    _write(path, {"body_text": {"size": 14.0}}, mtime=2000)
+    assert registry.refresh()
+    assert registry.get("pku") == {"body_text": {"size": 14.0}}
+
+    path.unlink()
+    assert registry.refresh()
+    assert registry.get("pku") is None
+
+
+def test_handwritten_preset_wins_over_compiled_profile(registry, tmp_path):
+    assert registry.save_compiled("pku", {"body_text": {"size": 11.0}}, "hash-1", "fp")
+    assert registry.get_entry("pku").compiled
+    _write(tmp_path / "pku.json", {"body_text": {"size": 12.0}})
+    registry.refresh()
+    assert registry.get("pku") == {"body_text": {"size": 12.0}}
+    assert [p["compiled"] for p in registry.list_presets()] == [False]
+
+
+def test_compiled_profile_invalidation(registry):
+    registry.save_compiled("pku", {"body_text": {"size": 11.0}}, "hash-1", "fp")
+    registry.invalidate_compiled("pku", "hash-1")
+    assert registry.get("pku") is not None
+    registry.invalidate_compiled("pku", "hash-2")
+    assert registry.get("pku") is None
+
+
+def test_outdated_or_unsafe_compiled_profiles_are_ignored(registry, tmp_path):
+    assert not registry.save_compiled("../evil", {}, None, "fp")
+    os.makedirs(registry.compiled_dir)
+    _write(tmp_path / "_compiled" / "old.json", {
+        "_compiled": {"format_version": COMPILED_PROFILE_VERSION - 1}, "rules": {}
+    })
+    registry.refresh()
+    assert registry.get("old") is None
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.engine.rag_engine import RAGEngine
+from app.models.schema import RuleManifest
+from app.services.storage import rule_manifest_store
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(settings, "EMBED_BACKEND", "local")
+    return RAGEngine()
+
+
+def _ingest(engine, school_id, text):
+    """模拟另一个 worker 进程入库：直接写向量库与共享清单，不经过本进程的版本号"""
+    engine.vector_store.add_documents([Document(page_content=text, metadata={"school_id": school_id})])
+    rule_manifest_store.put(RuleManifest(school_id=school_id, file_hash=text, chunk_ids=[], ingested_at=time.time()))
+
+
+def test_repeated_search_hits_cache(engine):
+    engine.add_documents([Document(page_content="正文小四宋体")], "cache-hit")
+    first = asyncio.run(engine.asearch_rules("正文字体", "cache-hit"))
+    second = asyncio.run(engine.asearch_rules("正文字体", "cache-hit"))
+    assert first == second == "正文小四宋体"
+    assert engine.retrieval_hits == 1
+
+
+def test_ingest_by_other_process_invalidates_cache(engine):
+    _ingest(engine, "shared", "正文小四宋体")
+    assert engine.search_rules("正文字体", "shared", k=4) == "正文小四宋体"
+    _ingest(engine, "shared", "标题三号黑体")
+    assert "标题三号黑体" in engine.search_rules("正文字体", "shared", k=4)
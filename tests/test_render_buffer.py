@@ -0,0 +1,67 @@
+import os
+
+from docx import Document
+
+from app.api.endpoints import _attachment_headers, _iter_buffer
+from app.core.config import settings
+from app.core.merger import MergerEngine
+from app.engine.renderer import renderer
+from app.models.schema import ContentBlock, ContentType, DocumentDSL
+
+STYLE_CONFIG = MergerEngine.merge()
+
+
+def _dsl(paragraphs):
+    blocks = [ContentBlock(type=ContentType.HEADING_1, text="第一章 绪论")]
+    blocks += [ContentBlock(type=ContentType.BODY_TEXT, text=f"第{i}段正文内容。") for i in range(paragraphs)]
+    return DocumentDSL(style_config=STYLE_CONFIG, content_blocks=blocks)
+
+
+def test_small_document_stays_in_memory():
+    results_before = set(os.listdir(settings.RESULT_DIR)) if os.path.isdir(settings.RESULT_DIR) else set()
+    buffer, size = renderer.render_to_buffer(_dsl(3))
+    with buffer:
+        assert buffer.tell() == 0
+        assert not buffer._rolled
+        data = buffer.read()
+    assert len(data) == size
+    # 渲染不在结果目录落盘
+    after = set(os.listdir(settings.RESULT_DIR)) if os.path.isdir(settings.RESULT_DIR) else set()
+    assert after == results_before
+
+
+def test_large_document_spills_to_disk(monkeypatch):
+    monkeypatch.setattr(settings, "RENDER_SPOOL_MAX_BYTES", 1024)
+    buffer, size = renderer.render_to_buffer(_dsl(50))
+    with buffer:
+        assert buffer._rolled
+        doc = Document(buffer)
+    assert size > 1024
+    assert doc.paragraphs[0].text == "第一章 绪论"
+    assert len(doc.paragraphs) == 51
+
+
+def test_iter_buffer_streams_and_closes():
+    buffer, size = renderer.render_to_buffer(_dsl(3))
+    chunks = list(_iter_buffer(buffer))
+    assert sum(len(chunk) for chunk in chunks) == size
+    assert buffer.closed
+
+
+def test_iter_buffer_closes_on_disconnect():
+    buffer, _ = renderer.render_to_buffer(_dsl(3))
+    stream = _iter_buffer(buffer)
+    next(stream)
+    # 客户端断开时 StreamingResponse 关闭生成器
+    stream.close()
+    assert buffer.closed
+
+
+def test_attachment_headers():
+    assert _attachment_headers("Paper_demo.docx", 10) == {
+        "Content-Disposition": 'attachment; filename="Paper_demo.docx"',
+        "Content-Length": "10",
+    }
+    headers = _attachment_headers("论文.docx")
+    assert headers["Content-Disposition"] == "attachment; filename*=utf-8''%E8%AE%BA%E6%96%87.docx"
+    assert "Content-Length" not in headers
@@ -0,0 +1,66 @@
+import pytest
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Pt
+
+from app.core.config import settings
+from app.core.merger import MergerEngine
+from app.engine.renderer import renderer
+from app.models.schema import ContentBlock, ContentType, DocumentDSL, FontStyle
+
+STYLE_CONFIG = MergerEngine.merge(json_preset_dict={
+    "heading_1": {"family": "SimHei", "size": 16, "bold": True, "align": "CENTER"},
+    "body_text": {"family": "SimSun", "size": 12, "line_spacing": 1.5},
+})
+
+
+def _render(monkeypatch, named, blocks):
+    monkeypatch.setattr(settings, "RENDER_NAMED_STYLES", named)
+    buffer, _ = renderer.render_to_buffer(DocumentDSL(style_config=STYLE_CONFIG, content_blocks=blocks))
+    with buffer:
+        return Document(buffer)
+
+
+def _effective(paragraph, attr):
+    """段落 / Run 的直接格式优先，否则沿样式链查找"""
+    run = paragraph.runs[0]
+    value = getattr(run.font, attr)
+    style = paragraph.style
+    while value is None and style is not None:
+        value = getattr(style.font, attr)
+        style = style.base_style
+    return value
+
+
+@pytest.mark.parametrize("named", [True, False])
+def test_override_resolves_identically_in_both_modes(monkeypatch, named):
+    block = ContentBlock(type=ContentType.BODY_TEXT, text="强调段落", style_override=FontStyle(size=14, bold=True))
+    paragraph = _render(monkeypatch, named, [block]).paragraphs[0]
+    assert _effective(paragraph, "size") == Pt(14)
+    assert _effective(paragraph, "bold") is True
+    assert _effective(paragraph, "name") == "SimSun"
+
+
+def test_named_mode_writes_only_changed_fields(monkeypatch):
+    block = ContentBlock(type=ContentType.HEADING_1, text="第一章", style_override=FontStyle(family="SimHei", size=18))
+    paragraph = _render(monkeypatch, True, [block]).paragraphs[0]
+    run = paragraph.runs[0]
+    assert run.font.size == Pt(18)
+    # 与命名样式相同的字体不再重复写成直接格式
+    assert run.font.name is None
+    assert paragraph.paragraph_format.alignment is None
+    assert paragraph.style.paragraph_format.alignment == WD_ALIGN_PARAGRAPH.CENTER
+
+
+@pytest.mark.parametrize("named", [True, False])
+def test_table_hook_renders_table(monkeypatch, named):
+    block = ContentBlock(type=ContentType.TABLE_HOOK, text="| 指标 | 数值 |\n|---|---|\n| 准确率 | 0.95 |")
+    doc = _render(monkeypatch, named, [block])
+    assert [[cell.text for cell in row.cells] for row in doc.tables[0].rows] == [["指标", "数值"], ["准确率", "0.95"]]
+
+
+def test_empty_table_hook_leaves_placeholder(monkeypatch):
+    block = ContentBlock(type=ContentType.TABLE_HOOK, text="", source_data="table-1")
+    doc = _render(monkeypatch, True, [block])
+    assert not doc.tables
+    assert doc.paragraphs[0].text == "[表格占位符: table-1]"
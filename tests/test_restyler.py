@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+from app.core.merger import MergerEngine
+from app.engine.restyler import restyler
+from app.engine.source_loader import InvalidDocxError
+from app.services import pipeline
+
+STYLE_CONFIG = MergerEngine.merge(json_preset_dict={
+    "heading_1": {"family": "SimHei", "size": 16, "bold": True, "align": "CENTER"},
+    "body_text": {"family": "SimSun", "size": 12, "line_spacing": 1.5},
+})
+
+
+def _set_fonts(run, family):
+    fonts = run._element.get_or_add_rPr().get_or_add_rFonts()
+    for slot in ("w:ascii", "w:hAnsi", "w:eastAsia"):
+        fonts.set(qn(slot), family)
+
+
+@pytest.fixture
+def paper(tmp_path):
+    doc = Document()
+    doc.add_paragraph("第一章 绪论")
+    body = doc.add_paragraph()
+    plain = body.add_run("近年来，论文格式审查耗费了大量人工。")
+    _set_fonts(plain, "Arial")
+    plain.font.size = 200000
+    plain.bold = True
+    code = body.add_run("print()")
+    _set_fonts(code, "Consolas")
+    symbol = body.add_run()
+    sym = OxmlElement("w:sym")
+    sym.set(qn("w:font"), "Symbol")
+    sym.set(qn("w:char"), "F061")
+    symbol._element.append(sym)
+    _set_fonts(symbol, "Times New Roman")
+    path = tmp_path / "paper.docx"
+    doc.save(path)
+    return str(path)
+
+
+def test_restyle_assigns_named_styles(paper):
+    doc, stats = restyler.restyle(paper, STYLE_CONFIG)
+    heading, body = doc.paragraphs
+    assert heading.style.name != body.style.name
+    assert stats["heading_1"] == 1
+    assert stats["body_text"] == 1
+
+
+def test_restyle_clears_conflicting_fonts_only(paper):
+    doc, _ = restyler.restyle(paper, STYLE_CONFIG)
+    plain, code, symbol = doc.paragraphs[1].runs
+    assert plain._element.rPr.rFonts is None
+    assert plain.font.size is None
+    # 正文中的局部加粗属于内容
+    assert plain.bold is True
+    assert code._element.rPr.rFonts.get(qn("w:ascii")) == "Consolas"
+    assert symbol._element.rPr.rFonts.get(qn("w:ascii")) == "Times New Roman"
+
+
+def test_invalid_docx_is_rejected(tmp_path):
+    path = tmp_path / "broken.docx"
+    path.write_bytes(b"not a zip")
+    with pytest.raises(InvalidDocxError):
+        restyler.restyle_to_buffer(str(path), STYLE_CONFIG)
+
+
+def test_run_restyle_validates_before_resolving_style(tmp_path, monkeypatch):
+    path = tmp_path / "broken.docx"
+    path.write_bytes(b"not a zip")
+
+    async def fail_resolve(*args, **kwargs):
+        raise AssertionError("resolve_style must not run for an invalid upload")
+
+    monkeypatch.setattr(pipeline, "resolve_style", fail_resolve)
+    with pytest.raises(InvalidDocxError):
+        asyncio.run(pipeline.run_restyle(str(path), "demo"))
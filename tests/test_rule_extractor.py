@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from PyPDF2 import PdfWriter
+
+from app.engine import rule_extractor
+from app.engine.rule_extractor import RuleChunk, chunk_pages, extract_pages, rank_chunks
+
+
+def test_chunks_break_at_clause_headings_and_keep_pages():
+    pages = [
+        "（一）字体\n正文采用小四号宋体。\n英文采用 Times New Roman。",
+        "（二）页边距\n上下 2.5 厘米，左右 3 厘米。",
+    ]
+    chunks = chunk_pages(pages, max_chars=800, overlap=0)
+    assert [c.section for c in chunks] == ["（一）字体", "（二）页边距"]
+    assert chunks[0].text.startswith("（一）字体\n正文采用")
+    assert (chunks[1].page_start, chunks[1].page_end) == (2, 2)
+
+
+def test_chunk_spanning_pages_records_range():
+    chunks = chunk_pages(["3.1 正文\n正文小四号宋体，", "行距 1.5 倍。"], max_chars=800)
+    assert len(chunks) == 1
+    assert (chunks[0].page_start, chunks[0].page_end) == (1, 2)
+
+
+def test_long_sections_split_with_overlap():
+    lines = [f"第{i}条规定内容较长需要切分" for i in range(10)]
+    chunks = chunk_pages(["1.1 格式\n" + "\n".join(lines)], max_chars=40, overlap=15)
+    assert len(chunks) > 1
+    assert all(c.section == "1.1 格式" for c in chunks)
+    # 相邻切片首尾重叠一行
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert prev.text.splitlines()[-1] == cur.text.splitlines()[1]
+    assert all(len(c.text) <= 40 + len("1.1 格式\n") + 1 for c in chunks)
+
+
+def test_overlong_line_is_hard_split():
+    chunks = chunk_pages(["甲" * 25], max_chars=10, overlap=0)
+    assert [len(c.text) for c in chunks] == [10, 10, 5]
+
+
+def test_rank_chunks_prefers_matching_terms():
+    chunks = [
+        RuleChunk(text="页边距上下 2.5 厘米", page_start=1, page_end=1),
+        RuleChunk(text="正文采用小四号宋体", page_start=2, page_end=2),
+        RuleChunk(text="参考文献采用五号宋体", page_start=3, page_end=3),
+    ]
+    ranked = rank_chunks("正文字体", chunks, k=2)
+    assert ranked[0].page_start == 2
+    assert rank_chunks("abc", chunks) == []
+    assert rank_chunks("", chunks) == []
+
+
+def test_parallel_extraction_keeps_page_order(tmp_path, monkeypatch):
+    writer = PdfWriter()
+    for _ in range(5):
+        writer.add_blank_page(width=72, height=72)
+    path = tmp_path / "manual.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+
+    ranges = []
+
+    def fake_range(file_path, start, end):
+        ranges.append((start, end))
+        return [f"page {i + 1}" for i in range(start, end)]
+
+    monkeypatch.setattr(rule_extractor, "extract_page_range", fake_range)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        pages = extract_pages(str(path), pool, pages_per_task=2)
+    assert pages == [f"page {i}" for i in range(1, 6)]
+    assert sorted(ranges) == [(0, 2), (2, 4), (4, 5)]
+
+    ranges.clear()
+    extract_pages(str(path), None, pages_per_task=2)
+    assert ranges == [(0, 5)]
@@ -0,0 +1,58 @@
+import pytest
+
+from app.engine.segmenter import StructuralSegmenter
+from app.models.schema import ContentType
+
+segmenter = StructuralSegmenter(min_confidence=0.8)
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("第一章 绪论", ContentType.HEADING_1),
+    ("1.1 研究背景", ContentType.HEADING_2),
+    ("1.1研究背景", ContentType.HEADING_2),
+    ("2.3.1实验设置", ContentType.HEADING_3),
+    ("## 相关工作", ContentType.HEADING_2),
+    ("图3-1 系统架构", ContentType.CAPTION),
+])
+def test_classify_line_headings(line, expected):
+    content_type, confidence, _ = segmenter.classify_line(line)
+    assert content_type == expected
+    assert confidence >= segmenter.min_confidence
+
+
+@pytest.mark.parametrize("line", ["3.5倍的提升", "2.1万名学生", "这是一句正文。"])
+def test_classify_line_ignores_quantities_and_sentences(line):
+    assert segmenter.classify_line(line) is None
+
+
+def test_segment_merges_soft_wrapped_paragraph():
+    segments = segmenter.segment("本文研究了论文自动排版的问题，提出了一种基于规则检索的方法，\n并在多所学校的模板上进行了验证。")
+    assert len(segments) == 1
+    assert segments[0].block.type == ContentType.BODY_TEXT
+    assert segments[0].confidence >= segmenter.min_confidence
+
+
+def test_segment_keeps_short_unpunctuated_line_separate():
+    segments = segmenter.segment("研究背景\n近年来，论文格式审查耗费了大量人工。")
+    assert [seg.raw for seg in segments] == ["研究背景", "近年来，论文格式审查耗费了大量人工。"]
+    assert segments[0].confidence < segmenter.min_confidence
+    assert segments[1].confidence >= segmenter.min_confidence
+
+
+def test_numbered_short_line_is_not_a_confident_list_item():
+    segments = segmenter.segment("1. 绪论")
+    assert len(segments) == 1
+    assert segments[0].confidence < segmenter.min_confidence
+
+
+def test_list_items_with_sentences_stay_confident():
+    segments = segmenter.segment("- 第一条要求\n1. 正文采用小四号宋体。")
+    assert [seg.confidence for seg in segments] == [0.85, 0.85]
+
+
+def test_plan_sends_low_confidence_spans_to_model():
+    segments = segmenter.segment("第一章 绪论\n研究背景\n近年来，论文格式审查耗费了大量人工。")
+    plan = segmenter.plan(segments)
+    assert plan[0].type == ContentType.HEADING_1
+    assert plan[1] == "研究背景"
+    assert plan[2].type == ContentType.BODY_TEXT
@@ -0,0 +1,56 @@
+import zipfile
+
+import pytest
+from docx import Document
+
+from app.engine.source_loader import InvalidDocxError, check_docx, load_docx, load_source
+from app.models.schema import ContentBlock, ContentType
+
+
+@pytest.fixture
+def draft(tmp_path):
+    doc = Document()
+    doc.add_heading("绪论", level=1)
+    doc.add_paragraph("第一段正文。")
+    doc.add_paragraph("第二段正文。")
+    doc.add_heading("研究背景", level=2)
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "指标"
+    table.cell(0, 1).text = "数值"
+    table.cell(1, 0).text = "准确率"
+    table.cell(1, 1).text = "0.95"
+    doc.add_paragraph("图1-1 系统架构", style="Caption")
+    path = tmp_path / "draft.docx"
+    doc.save(path)
+    return str(path)
+
+
+def test_load_docx_maps_styles_and_merges_plain_paragraphs(draft):
+    parts = load_docx(draft).parts
+    assert parts[0] == ContentBlock(id=parts[0].id, type=ContentType.HEADING_1, text="绪论")
+    assert parts[1] == "第一段正文。\n\n第二段正文。"
+    assert parts[2].type == ContentType.HEADING_2
+    # 表格按行输出，单元格以 | 分隔
+    assert parts[3] == "指标 | 数值\n准确率 | 0.95"
+    assert parts[4].type == ContentType.CAPTION
+
+
+def test_load_source_dispatches_by_extension(draft, tmp_path):
+    assert load_source(draft, "DOCX").preclassified == 3
+    notes = tmp_path / "notes.rst"
+    notes.write_text("# 标题", encoding="utf-8")
+    assert load_source(str(notes), "rst").structured is False
+
+
+@pytest.mark.parametrize("content", [b"not a zip", None])
+def test_invalid_docx_is_rejected(tmp_path, content):
+    path = tmp_path / "bad.docx"
+    if content is None:
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("readme.txt", "no document part")
+    else:
+        path.write_bytes(content)
+    with pytest.raises(InvalidDocxError, match="Not a valid .docx file"):
+        check_docx(str(path))
+    with pytest.raises(InvalidDocxError):
+        load_docx(str(path))
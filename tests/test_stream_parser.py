@@ -0,0 +1,47 @@
+import json
+import random
+
+import pytest
+
+from app.engine.stream_parser import IncrementalBlockParser
+
+BLOCKS = [
+    {"type": "heading_1", "text": "第一章 绪论"},
+    {"type": "body_text", "text": "含有 \"引号\"、{花括号} 与 [方括号] 的正文\\n"},
+    {"type": "caption", "text": "图1-1 系统架构"},
+]
+
+
+def _feed_all(text, sizes):
+    parser = IncrementalBlockParser()
+    blocks, cursor = [], 0
+    for size in sizes:
+        blocks.extend(parser.feed(text[cursor:cursor + size]))
+        cursor += size
+    blocks.extend(parser.feed(text[cursor:]))
+    return blocks
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_blocks_survive_arbitrary_token_boundaries(seed):
+    text = json.dumps({"blocks": BLOCKS}, ensure_ascii=False)
+    rng = random.Random(seed)
+    assert _feed_all(text, [rng.randint(1, 7) for _ in range(len(text))]) == BLOCKS
+
+
+def test_each_block_is_emitted_as_soon_as_it_closes():
+    parser = IncrementalBlockParser()
+    text = json.dumps({"blocks": BLOCKS[:2]}, ensure_ascii=False)
+    first_end = text.index("}") + 1
+    assert parser.feed(text[:first_end]) == BLOCKS[:1]
+    assert parser.feed(text[first_end:]) == BLOCKS[1:2]
+
+
+def test_bare_array_inside_code_fence():
+    text = "```json\n" + json.dumps(BLOCKS, ensure_ascii=False) + "\n```"
+    assert _feed_all(text, [3] * len(text)) == BLOCKS
+
+
+def test_nested_objects_belong_to_their_block():
+    block = {"type": "body_text", "text": "x", "style_override": {"bold": True}}
+    assert _feed_all(json.dumps({"blocks": [block]}), [5] * 20) == [block]
@@ -0,0 +1,53 @@
+import pytest
+
+from app.engine.style_fastpath import ALL_SECTIONS, LocalStyleParser
+
+parser = LocalStyleParser(
+    font_map_cn={"宋体": "SimSun", "黑体": "SimHei"},
+    font_map_en={"Times New Roman": "Times New Roman"},
+    size_map={"三号": 16.0, "小四": 12.0},
+)
+
+
+def test_targets_carry_over_to_following_clauses():
+    result = parser.parse("正文宋体，字号小四号")
+    assert result.resolved
+    assert result.config == {"body_text": {"family": "SimSun", "size": 12.0}}
+
+
+def test_first_untargeted_clause_applies_to_all_sections():
+    result = parser.parse("行距1.5倍")
+    assert result.resolved
+    assert set(result.config) == set(ALL_SECTIONS)
+
+
+def test_trailing_spacing_clause_is_document_wide():
+    result = parser.parse("正文小四宋体，标题三号黑体居中，行距1.5倍")
+    assert result.resolved
+    assert result.config["heading_1"] == {"size": 16.0, "family": "SimHei", "align": "CENTER", "line_spacing": 1.5}
+    assert all(result.config[section]["line_spacing"] == 1.5 for section in ALL_SECTIONS)
+
+
+def test_spacing_after_single_target_stays_with_it():
+    result = parser.parse("正文宋体小四，行距1.5倍")
+    assert result.config == {"body_text": {"family": "SimSun", "size": 12.0, "line_spacing": 1.5}}
+
+
+def test_mixed_trailing_clause_is_unresolved():
+    result = parser.parse("正文宋体，标题黑体，加粗行距2倍")
+    assert not result.resolved
+    assert result.unresolved == ["加粗行距2倍"]
+
+
+@pytest.mark.parametrize("prompt", [
+    "正文用好看一点的字体",
+    "正文宋体和Times New Roman",
+])
+def test_unknown_or_split_fonts_fall_back_to_model(prompt):
+    assert not parser.parse(prompt).resolved
+
+
+def test_clause_after_unresolved_target_is_not_guessed():
+    result = parser.parse("页眉楷体，加粗")
+    assert not result.resolved
+    assert result.config == {}
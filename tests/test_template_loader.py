@@ -0,0 +1,91 @@
+import uuid
+
+import pytest
+
+from app.core import template_loader as loader_module
+from app.core.template_loader import TemplateLoader
+from app.engine.rule_extractor import RuleChunk
+from app.services.storage import rule_manifest_store
+
+
+class FakeVectorStore:
+    """记录嵌入 / 删除调用的内存向量库，替代 rag_engine"""
+
+    def __init__(self):
+        self.ids = set()
+        self.added = []
+        self.deleted = []
+
+    def get_ids(self, school_id):
+        return set(self.ids)
+
+    def add_documents(self, documents, school_id, ids):
+        self.added.append(list(ids))
+        self.ids.update(ids)
+
+    def delete_documents(self, ids):
+        self.deleted.append(list(ids))
+        self.ids.difference_update(ids)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    fake = FakeVectorStore()
+    monkeypatch.setattr(loader_module, "rag_engine", fake)
+    return fake
+
+
+@pytest.fixture
+def school_id():
+    return f"school-{uuid.uuid4().hex[:8]}"
+
+
+def _chunks(*texts):
+    return [RuleChunk(text=text, page_start=i + 1, page_end=i + 1) for i, text in enumerate(texts)]
+
+
+def test_chunk_ids_are_deterministic_per_school():
+    assert TemplateLoader._chunk_id("a", "正文") == TemplateLoader._chunk_id("a", "正文")
+    assert TemplateLoader._chunk_id("a", "正文") != TemplateLoader._chunk_id("b", "正文")
+
+
+def test_same_manual_is_ingested_once(store, school_id):
+    loader = TemplateLoader()
+    assert loader.ingest_chunks(_chunks("正文小四宋体", "标题三号黑体", "正文小四宋体"), school_id, "h1")
+    # 手册内重复切片只嵌入一次
+    assert [len(ids) for ids in store.added] == [2]
+    assert rule_manifest_store.get(school_id).file_hash == "h1"
+
+    assert loader.ingest_chunks(_chunks("正文小四宋体", "标题三号黑体"), school_id, "h1")
+    assert len(store.added) == 1
+
+
+def test_new_version_reuses_unchanged_chunks(store, school_id):
+    loader = TemplateLoader()
+    loader.ingest_chunks(_chunks("正文小四宋体", "标题三号黑体"), school_id, "h1")
+    old_heading = TemplateLoader._chunk_id(school_id, "标题三号黑体")
+
+    loader.ingest_chunks(_chunks("正文小四宋体", "标题小三黑体"), school_id, "h2")
+    assert store.added[-1] == [TemplateLoader._chunk_id(school_id, "标题小三黑体")]
+    assert store.deleted[-1] == [old_heading]
+    assert store.ids == set(rule_manifest_store.get(school_id).chunk_ids)
+
+
+def test_missing_vectors_trigger_reingestion(store, school_id):
+    loader = TemplateLoader()
+    loader.ingest_chunks(_chunks("正文小四宋体"), school_id, "h1")
+    # 向量库被单独清空：清单仍在，但切片已不存在
+    store.ids.clear()
+    loader.ingest_chunks(_chunks("正文小四宋体"), school_id, "h1")
+    assert len(store.added) == 2
+
+
+def test_check_rule_file_hashes_contents(store, school_id, tmp_path):
+    loader = TemplateLoader()
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(b"%PDF-1.4 manual")
+    file_hash, current = loader.check_rule_file(str(path), school_id)
+    assert not current
+
+    loader.ingest_chunks(_chunks("正文小四宋体"), school_id, file_hash)
+    assert loader.check_rule_file(str(path), school_id) == (file_hash, True)
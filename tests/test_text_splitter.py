@@ -0,0 +1,31 @@
+from app.engine.text_splitter import estimate_tokens, split_into_windows, split_paragraphs
+
+PARAGRAPH = "这是一段用于测试窗口切分的正文内容，长度适中。" * 4
+
+
+def test_headings_are_their_own_paragraphs():
+    assert split_paragraphs("第一章 绪论\n正文第一行\n正文第二行\n\n1.1 背景\n更多正文") == [
+        "第一章 绪论", "正文第一行\n正文第二行", "1.1 背景", "更多正文"
+    ]
+
+
+def test_windows_respect_budget_and_keep_all_text():
+    draft = "\n\n".join(["第一章 绪论"] + [PARAGRAPH] * 12 + ["第二章 方法"] + [PARAGRAPH] * 12)
+    windows = split_into_windows(draft, max_tokens=300)
+    assert len(windows) > 1
+    for window in windows:
+        assert sum(estimate_tokens(p) for p in window.split("\n\n")) <= 300
+    assert [p for window in windows for p in window.split("\n\n")] == split_paragraphs(draft)
+
+
+def test_window_breaks_before_heading_once_half_full():
+    draft = "\n\n".join([PARAGRAPH] * 3 + ["第二章 方法", PARAGRAPH])
+    windows = split_into_windows(draft, max_tokens=estimate_tokens(PARAGRAPH) * 5)
+    assert windows[1].startswith("第二章 方法")
+
+
+def test_oversized_paragraph_is_split_by_sentence():
+    windows = split_into_windows(PARAGRAPH * 10, max_tokens=100)
+    assert len(windows) > 1
+    assert "".join(windows) == PARAGRAPH * 10
+    assert all(estimate_tokens(window) <= 100 for window in windows)
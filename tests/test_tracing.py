@@ -0,0 +1,96 @@
+import asyncio
+import io
+import json
+import logging
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import endpoints
+from app.core import tracing
+from app.core.tracing import Trace, current_trace, record_span, span, trace_request
+
+
+def test_server_timing_sanitizes_names_and_adds_total():
+    trace = Trace("t1", "generate")
+    trace.add_span("style resolved", 12.5)
+    with trace.span("render", blocks=3) as attrs:
+        attrs["bytes"] = 10
+    header = trace.server_timing()
+    parts = header.split(", ")
+    assert parts[0] == "style_resolved;dur=12.5"
+    assert parts[1].startswith("render;dur=")
+    assert parts[-1].startswith("total;dur=")
+    assert trace.to_dict()["spans"][1]["bytes"] == 10
+
+
+def test_spans_without_trace_are_noops():
+    record_span("orphan", 1.0)
+    with span("orphan") as attrs:
+        attrs["x"] = 1
+    assert current_trace() is None
+
+
+def test_concurrent_requests_keep_separate_traces():
+    async def request(name):
+        with trace_request(name, "generate") as trace:
+            await asyncio.sleep(0)
+            with span(f"stage_{name}"):
+                await asyncio.sleep(0)
+            return [s.name for s in trace.spans]
+
+    async def main():
+        return await asyncio.gather(request("a"), request("b"))
+
+    assert asyncio.run(main()) == [["stage_a"], ["stage_b"]]
+
+
+def test_trace_request_logs_status(caplog):
+    with caplog.at_level(logging.INFO, logger="apf.trace"):
+        with pytest.raises(RuntimeError):
+            with trace_request("t2", "generate"):
+                record_span("retrieval", 3.0)
+                raise RuntimeError("boom")
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["task_id"] == "t2" and record["status"] == "failed"
+    assert [s["name"] for s in record["spans"]] == ["retrieval"]
+
+
+def test_disabled_tracing_yields_none(monkeypatch):
+    monkeypatch.setattr(tracing.settings, "TRACING_ENABLED", False)
+    with trace_request("t3", "generate") as trace:
+        assert trace is None
+        assert current_trace() is None
+
+
+def test_sampled_slow_request_saves_profile(monkeypatch, tmp_path):
+    monkeypatch.setattr(tracing.settings, "TRACE_PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing.settings, "TRACE_PROFILE_THRESHOLD_MS", 0.0)
+    monkeypatch.setattr(tracing.settings, "TRACE_PROFILE_DIR", str(tmp_path))
+    with trace_request("t4", "generate") as trace:
+        sum(range(1000))
+    if trace.profile_path is None:
+        pytest.skip("another profiler is active")
+    assert os.path.exists(trace.profile_path)
+
+
+def test_generate_returns_server_timing(monkeypatch):
+    async def run_pipeline(**kwargs):
+        with span("rendered"):
+            pass
+        return io.BytesIO(b"docx"), 4
+
+    monkeypatch.setattr(endpoints, "run_pipeline", run_pipeline)
+    from app.main import app
+
+    response = TestClient(app).post(
+        "/api/v1/generate",
+        files={"source_file": ("draft.md", "# 标题\n正文".encode("utf-8"), "text/markdown")},
+        data={"school_id": "demo"},
+    )
+    assert response.status_code == 200
+    assert response.content == b"docx"
+    names = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert names == ["upload_saved", "rendered", "total"]
+    assert response.headers["X-Task-Id"]
@@ -0,0 +1,49 @@
+import threading
+import time
+import uuid
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.websocket import router
+from app.core.config import settings
+from app.models.schema import JobRecord, JobStatus
+from app.services.storage import job_store
+
+app = FastAPI()
+app.include_router(router)
+
+
+def _create_job(**fields) -> JobRecord:
+    now = time.time()
+    job = JobRecord(
+        id=uuid.uuid4().hex, school_id="demo", source_path="/tmp/none.md", source_ext="md",
+        created_at=now, updated_at=now, **fields
+    )
+    return job_store.create(job)
+
+
+def test_job_on_other_instance_is_followed_through_store(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_WS_POLL_SECONDS", 0.05)
+    job = _create_job(status=JobStatus.RUNNING, stage="rag_retrieved", owner="other-host:1:abcd")
+
+    def finish():
+        job_store.update(job.id, stage="content_polished")
+        time.sleep(0.2)
+        job_store.update(job.id, status=JobStatus.SUCCEEDED, stage="done", result_path="/tmp/out.docx")
+
+    with TestClient(app).websocket_connect(f"/ws/jobs/{job.id}") as ws:
+        first = ws.receive_json()
+        threading.Timer(0.1, finish).start()
+        stages = [first["stage"]]
+        while stages[-1] not in ("done", "failed"):
+            stages.append(ws.receive_json()["stage"])
+    assert stages[0] == "rag_retrieved"
+    assert "content_polished" in stages
+    assert stages[-1] == "done"
+
+
+def test_finished_job_reports_final_state():
+    job = _create_job(status=JobStatus.FAILED, stage="failed", error="boom")
+    with TestClient(app).websocket_connect(f"/ws/jobs/{job.id}") as ws:
+        assert ws.receive_json() == {"job_id": job.id, "stage": "failed", "error": "boom"}
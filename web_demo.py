@@ -1,11 +1,39 @@
-﻿import streamlit as st
+﻿import json
+import streamlit as st
 import requests
-import time
+from websockets.sync.client import connect
 
 # --- 配置 ---
-BACKEND_URL = "http://127.0.0.1:8000/api/v1/generate"
+BACKEND_URL = "http://127.0.0.1:8000/api/v1"
+WS_URL = "ws://127.0.0.1:8000/api/v1"
 DEFAULT_SCHOOL = "shenyang_chem"
 
+# 后端阶段事件 -> (进度百分比, 提示文字)
+STAGE_PROGRESS = {
+    "upload_saved": (5, "文件已上传，排队中..."),
+    "running": (10, "AI 引擎已接手任务..."),
+    "source_loaded": (15, "草稿读取完成..."),
+    "rules_extracted": (25, "排版手册解析完成..."),
+    "rag_retrieved": (35, "已检索到相关格式规则..."),
+    "profile_compiled": (40, "学校样式档案编译完成..."),
+    "style_parsed": (45, "格式规则解析完成 (C-Model)..."),
+    "content_polished": (90, "内容润色完成，正在渲染..."),
+    "rendered": (98, "渲染完成，正在保存..."),
+    "done": (100, "排版完成！"),
+}
+CHUNK_PROGRESS_RANGE = (45, 90)
+
+def describe_event(event: dict) -> str:
+    """把阶段事件格式化成一行日志"""
+    line = f"`{event['elapsed_ms'] / 1000:6.1f}s`  **{event['stage']}**" if "elapsed_ms" in event else f"**{event['stage']}**"
+    if event.get("stage") == "chunk_polished":
+        line += f"  窗口 {event['index'] + 1}/{event['windows']}"
+    if "duration_ms" in event:
+        line += f"  耗时 {event['duration_ms']:.0f} ms"
+    if "blocks" in event:
+        line += f"  块数 {event['blocks']}"
+    return line
+
 # --- 页面设置 ---
 st.set_page_config(
     page_title="AI 论文排版助手",
@@ -65,26 +93,46 @@ if st.button("🚀 开始 AI 排版", type="primary", use_container_width=True):
             "user_prompt": user_prompt
         }
 
-        # 进度条模拟
-        progress_text = "正在连接 AI 引擎..."
-        my_bar = st.progress(0, text=progress_text)
+        my_bar = st.progress(0, text="正在提交任务...")
+        stage_log = st.empty()
+        log_lines = []
 
         try:
-            # 模拟进度 (为了演示效果)
-            for percent_complete in range(10):
-                time.sleep(0.05)
-                my_bar.progress(percent_complete + 10, text="正在解析文档结构...")
-
-            # 发送请求
-            with st.spinner('🤖 AI 正在疯狂排版中 (润色 + 渲染)...'):
-                response = requests.post(BACKEND_URL, files=files, data=data)
-
-            if response.status_code == 200:
-                my_bar.progress(100, text="排版完成！")
+            response = requests.post(f"{BACKEND_URL}/jobs", files=files, data=data)
+            if response.status_code != 202:
+                my_bar.empty()
+                st.error(f"❌ 提交失败: {response.text}")
+                st.stop()
+            job_id = response.json()["job_id"]
+
+            # 订阅真实阶段事件，直到 done / failed
+            final_event = None
+            chunks_done = 0
+            with connect(f"{WS_URL}/ws/jobs/{job_id}") as ws:
+                for message in ws:
+                    event = json.loads(message)
+                    stage = event["stage"]
+                    if stage == "chunk_polished":
+                        chunks_done += 1
+                        low, high = CHUNK_PROGRESS_RANGE
+                        percent = low + (high - low) * chunks_done // max(event["windows"], 1)
+                        my_bar.progress(min(percent, high), text=f"AI 正在润色内容 ({chunks_done}/{event['windows']})...")
+                    elif stage in STAGE_PROGRESS:
+                        percent, text = STAGE_PROGRESS[stage]
+                        my_bar.progress(percent, text=text)
+                    log_lines.append(describe_event(event))
+                    stage_log.markdown("  \n".join(log_lines))
+                    if stage in ("done", "failed"):
+                        final_event = event
+                        break
+
+            if final_event is not None and final_event["stage"] == "done":
+                result = requests.get(f"{BACKEND_URL}/jobs/{job_id}/result")
+                result.raise_for_status()
                 st.success("✅ 生成成功！请下载下方文件。")
-                
+
                 # 获取文件名
-                content_disposition = response.headers.get("content-disposition", "")
+                content_disposition = result.headers.get("content-disposition", "")
                 if "filename=" in content_disposition:
                     filename = content_disposition.split("filename=")[1].strip('"')
                 else:
@@ -93,14 +141,15 @@ if st.button("🚀 开始 AI 排版", type="primary", use_container_width=True):
                 # 下载按钮
                 st.download_button(
                     label="📥 下载排版好的 Word 文档",
-                    data=response.content,
+                    data=result.content,
                     file_name=filename,
                     mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
                     type="primary"
                 )
             else:
                 my_bar.empty()
-                st.error(f"❌ 生成失败: {response.text}")
+                error = final_event.get("error") if final_event else "连接中断"
+                st.error(f"❌ 生成失败: {error}")
 
         except requests.exceptions.ConnectionError:
             st.error("❌ 无法连接到后端服务。请检查 main.py 是否正在运行！")
\ No newline at end of file